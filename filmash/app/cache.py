@@ -0,0 +1,117 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, NamedTuple, Optional, Tuple
+
+from fastapi import Request, Response, status
+
+from app.metrics import TimedJSONResponse
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def evict(self, predicate: Callable[[Any, Any], bool]) -> None:
+        """Drop all entries for which `predicate(key, value)` is true."""
+        with self._lock:
+            for key in [
+                key for key, (_, value) in self._data.items() if predicate(key, value)
+            ]:
+                del self._data[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data)}
+
+
+class CachedResponse(NamedTuple):
+    content: Any
+    body: bytes
+    etag: str
+
+
+class ResponseCache:
+    """Read-through cache of rendered JSON responses with ETags.
+
+    Entries are dropped with `evict` as soon as the data behind them
+    changes. Responses rendered while an eviction happens are not stored,
+    so a slow read never puts back data older than the write.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.generation = 0
+
+    def evict(self, predicate: Callable[[Any, CachedResponse], bool]) -> None:
+        self.generation += 1
+        self.entries.evict(predicate)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self.entries.clear()
+
+    async def respond(
+        self,
+        request: Request,
+        key: Hashable,
+        render: Callable[[], Awaitable[Any]],
+    ) -> Response:
+        cached = self.entries.get(key)
+        if cached is None:
+            generation = self.generation
+            cached = make_cached_response(await render())
+            if generation == self.generation:
+                self.entries.set(key, cached)
+        return cached_response(request, cached)
+
+
+def make_cached_response(content: Any) -> CachedResponse:
+    body = TimedJSONResponse(content).body
+    return CachedResponse(content, body, f'"{hashlib.sha1(body).hexdigest()}"')
+
+
+def cached_response(request: Request, cached: CachedResponse) -> Response:
+    """Respond with `304 Not Modified` if the client already has the entity."""
+    headers = {'ETag': cached.etag}
+    if_none_match = request.headers.get('If-None-Match', '')
+    etags = {etag.strip().replace('W/', '', 1) for etag in if_none_match.split(',')}
+    if cached.etag in etags or '*' in etags:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(cached.body, media_type='application/json', headers=headers)
@@ -1,3 +1,90 @@
 import os
+from enum import Enum
+from typing import Optional
+
+
+class DBMode(str, Enum):
+    SYNC = 'sync'
+    ASYNC = 'async'
+
+
+def get_optional_int(name: str) -> Optional[int]:
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+
+def get_optional_float(name: str) -> Optional[float]:
+    value = os.environ.get(name)
+    return float(value) if value else None
+
+
+HOST = os.environ.get('HOST', '0.0.0.0')
+PORT = int(os.environ.get('PORT', 8000))
 
 PAGE_SIZE = os.environ.get('PAGE_SIZE', 10)
+# Maximum number of items in one batch of scores or comments
+BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', 100))
+
+DB_URL = os.environ.get('DB_URL', 'sqlite:///filmash.db')
+# `sync` runs queries on a regular engine in the threadpool, `async` uses the async engine
+DB_MODE = DBMode(os.environ.get('DB_MODE', DBMode.SYNC))
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+
+# `tuned` enables WAL, synchronous=NORMAL, a bigger page cache, mmap and a busy
+# timeout on SQLite connections, `default` keeps the SQLite defaults
+SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'tuned')
+SQLITE_CACHE_SIZE = get_optional_int('SQLITE_CACHE_SIZE')
+SQLITE_MMAP_SIZE = get_optional_int('SQLITE_MMAP_SIZE')
+SQLITE_BUSY_TIMEOUT = get_optional_int('SQLITE_BUSY_TIMEOUT')
+
+AUTH_CACHE_SIZE = int(os.environ.get('AUTH_CACHE_SIZE', 1024))
+AUTH_CACHE_TTL = float(os.environ.get('AUTH_CACHE_TTL', 60))
+
+# Lifetime in seconds of tokens issued by `POST /token`. Without TOKEN_SECRET
+# tokens are signed with a random key and are valid only in the same process
+TOKEN_TTL = int(os.environ.get('TOKEN_TTL', 900))
+TOKEN_SECRET = os.environ.get('TOKEN_SECRET')
+
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 1024))
+RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', 60))
+
+# Weighted rating of a film with v scores averaging R is (v * R + m * C) / (v + m),
+# where C is the mean of all scores and m is RATING_PRIOR_VOTES. C is recomputed
+# every RATING_INTERVAL seconds, and all films are rated again when it moves by
+# more than RATING_MEAN_TOLERANCE from the mean used
+RATING_PRIOR_VOTES = int(os.environ.get('RATING_PRIOR_VOTES', 5))
+RATING_MEAN_TOLERANCE = float(os.environ.get('RATING_MEAN_TOLERANCE', 0.01))
+RATING_INTERVAL = float(os.environ.get('RATING_INTERVAL', 60))
+
+# Cached numbers of films in paged listings, 0 counts them on every request
+COUNT_CACHE_SIZE = int(os.environ.get('COUNT_CACHE_SIZE', 1024))
+COUNT_CACHE_TTL = float(os.environ.get('COUNT_CACHE_TTL', 30))
+
+# Films with fewer scores are left out of the leaderboard serving top-N listings,
+# it is reloaded from the database every LEADERBOARD_TTL seconds
+LEADERBOARD_MIN_VOTES = int(os.environ.get('LEADERBOARD_MIN_VOTES', 1))
+LEADERBOARD_TTL = float(os.environ.get('LEADERBOARD_TTL', 60))
+
+# Number of most similar films stored for each film by `app.similarity`
+SIMILAR_FILMS = int(os.environ.get('SIMILAR_FILMS', 20))
+
+# Seconds between flushes of film counters changed by new reviews, which are
+# then kept in memory instead of updating the film row in every write.
+# Unset updates the counters in the same transaction as the review
+COUNTERS_FLUSH_INTERVAL = get_optional_float('COUNTERS_FLUSH_INTERVAL')
+
+# Token buckets limiting write requests of each client: RATE_LIMIT_BURST at once
+# and RATE_LIMIT_PER_SECOND more every second, unset disables the limit. With
+# RATE_LIMIT_REDIS_URL the buckets are kept in Redis and shared by all processes
+RATE_LIMIT_PER_SECOND = get_optional_float('RATE_LIMIT_PER_SECOND')
+RATE_LIMIT_BURST = int(os.environ.get('RATE_LIMIT_BURST', 10))
+RATE_LIMIT_REDIS_URL = os.environ.get('RATE_LIMIT_REDIS_URL')
+# Write requests handled by a process at once, unset does not limit them
+WRITE_CONCURRENCY_LIMIT = get_optional_int('WRITE_CONCURRENCY_LIMIT')
+
+# Queries running longer are logged as warnings, unset disables the warnings
+SLOW_QUERY_MS = get_optional_int('SLOW_QUERY_MS')
+
+# Number of processes hashing and verifying passwords, 0 runs bcrypt in the threadpool
+BCRYPT_WORKERS = int(os.environ.get('BCRYPT_WORKERS', 0))
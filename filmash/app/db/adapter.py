@@ -0,0 +1,92 @@
+import asyncio
+from typing import Any, AsyncIterator, Callable, List, Optional, TypeVar
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.engine import CursorResult, Result
+from sqlalchemy.orm import Session
+
+T = TypeVar('T')
+
+
+class SyncStreamResult:
+    """Streamed result of `SyncSessionAdapter`, fetched in the threadpool."""
+
+    def __init__(self, adapter: 'SyncSessionAdapter', result: Result) -> None:
+        self.adapter = adapter
+        self.result = result
+
+    async def partitions(self, size: int) -> AsyncIterator[List[Any]]:
+        while True:
+            rows = await self.adapter.run_in_threadpool(self.result.fetchmany, size)
+            if not rows:
+                return
+            yield rows
+
+
+class SyncSessionAdapter:  # pylint: disable=too-many-public-methods
+    """Exposes a regular `Session` through the `AsyncSession` interface.
+
+    Every call is run in the threadpool, so endpoints are written once
+    against the async API and work on top of both engines. With `slots`
+    the session takes one of them before its first query and keeps it
+    until it is closed, so requests wait for a pooled connection on the
+    event loop instead of blocking threadpool workers.
+    """
+
+    def __init__(
+        self, session: Session, slots: Optional[asyncio.Semaphore] = None
+    ) -> None:
+        self.sync_session = session
+        self.slots = slots
+        self.holds_slot = False
+
+    async def run_in_threadpool(self, fn: Callable[..., T], *args: Any) -> T:
+        if self.slots is not None and not self.holds_slot:
+            await self.slots.acquire()
+            self.holds_slot = True
+        return await run_in_threadpool(fn, *args)
+
+    def add(self, instance: Any) -> None:
+        self.sync_session.add(instance)
+
+    async def execute(self, statement: Any, params: Any = None) -> Any:
+        def execute() -> Any:
+            result = self.sync_session.execute(statement, params)
+            if isinstance(result, CursorResult) and not result.returns_rows:
+                return result
+            # Fetch rows right away so that the cursor is not used outside the threadpool
+            return result.freeze()()
+
+        return await self.run_in_threadpool(execute)
+
+    async def stream(self, statement: Any, params: Any = None) -> SyncStreamResult:
+        result = await self.run_in_threadpool(
+            self.sync_session.execute, statement, params, {'stream_results': True}
+        )
+        return SyncStreamResult(self, result)
+
+    async def get(self, entity: Any, ident: Any) -> Any:
+        return await self.run_in_threadpool(self.sync_session.get, entity, ident)
+
+    async def run_sync(self, fn: Callable[..., Any], *args: Any) -> Any:
+        return await self.run_in_threadpool(fn, self.sync_session, *args)
+
+    async def flush(self) -> None:
+        await self.run_in_threadpool(self.sync_session.flush)
+
+    async def refresh(self, instance: Any) -> None:
+        await self.run_in_threadpool(self.sync_session.refresh, instance)
+
+    async def commit(self) -> None:
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self) -> None:
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self) -> None:
+        try:
+            await run_in_threadpool(self.sync_session.close)
+        finally:
+            if self.slots is not None and self.holds_slot:
+                self.slots.release()
+                self.holds_slot = False
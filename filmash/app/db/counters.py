@@ -0,0 +1,265 @@
+"""Write-behind aggregation of film counters.
+
+With COUNTERS_FLUSH_INTERVAL set, posting a score or a comment commits only
+the review. The changes of the film's `sum_scores`, `total_scores` and
+`total_comments` are added to `buffer` once the transaction commits, and
+`flush_counters` applies them with one batched UPDATE every interval, so
+the counters lag the committed reviews by at most the interval plus the
+time of a flush. Changes still in memory are lost if the process dies;
+`reconcile_counters` recomputes all counters from `Review`.
+"""
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, ContextManager, Dict, List, NamedTuple, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import Float, bindparam, case, cast, event, func, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.config import COUNTERS_FLUSH_INTERVAL
+from app.db.engine import UPSERT_INSERTS
+from app.db.models import Film, Review
+from app.db.ratings import rate_all_films, rate_films_by_id
+
+logger = logging.getLogger(__name__)
+
+
+class CounterDeltas(NamedTuple):
+    sum_scores: int = 0
+    total_scores: int = 0
+    total_comments: int = 0
+
+    def plus(self, other: 'CounterDeltas') -> 'CounterDeltas':
+        return CounterDeltas(*(a + b for a, b in zip(self, other)))
+
+
+class CounterBuffer:
+    """Thread-safe changes of film counters waiting to be flushed."""
+
+    def __init__(self) -> None:
+        self.deltas: Dict[int, CounterDeltas] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.deltas)
+
+    def add(self, film_id: int, deltas: CounterDeltas) -> None:
+        with self._lock:
+            self.deltas[film_id] = self.deltas.get(film_id, CounterDeltas()).plus(
+                deltas
+            )
+
+    def take(self) -> Dict[int, CounterDeltas]:
+        with self._lock:
+            deltas, self.deltas = self.deltas, {}
+        return deltas
+
+    def restore(self, deltas: Dict[int, CounterDeltas]) -> None:
+        """Put back changes taken by a flush that failed."""
+        for film_id, film_deltas in deltas.items():
+            self.add(film_id, film_deltas)
+
+
+buffer: Optional[CounterBuffer] = (
+    CounterBuffer() if COUNTERS_FLUSH_INTERVAL is not None else None
+)
+flusher: Optional['asyncio.Task[None]'] = None
+
+
+@event.listens_for(Session, 'after_commit')
+def _buffer_committed_deltas(session: Session) -> None:
+    for film_id, deltas in session.info.pop('counter_deltas', []):
+        if buffer is not None:
+            buffer.add(film_id, deltas)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_rolled_back_deltas(session: Session) -> None:
+    session.info.pop('counter_deltas', None)
+
+
+def lock_review(session: Session, user_id: int, film_id: int) -> Any:
+    """Lock the user's review of the film, creating an empty one if needed.
+
+    Only reviews of the same user and film wait for each other. Returns the
+    previous score and comment.
+    """
+    insert = UPSERT_INSERTS[session.get_bind().dialect.name]
+    session.execute(
+        insert(Review)
+        .values(user_id=user_id, film_id=film_id)
+        .on_conflict_do_nothing(index_elements=[Review.user_id, Review.film_id])
+    )
+    return session.execute(
+        select(Review.score, Review.comment)
+        .where(Review.user_id == user_id, Review.film_id == film_id)
+        .with_for_update()
+    ).one()
+
+
+def save_review_later(
+    session: Session, user_id: int, film_id: int, **values: Any
+) -> Optional[Film]:
+    """Save the review and defer the change of film counters until commit.
+
+    Returns the film with counters as of the last flush, or None if it does
+    not exist.
+    """
+    film = session.get(Film, film_id)
+    if film is None:
+        return None
+    previous = lock_review(session, user_id, film_id)
+    session.execute(
+        update(Review)
+        .where(Review.user_id == user_id, Review.film_id == film_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    score, comment = values.get('score'), values.get('comment')
+    deltas = CounterDeltas(
+        sum_scores=score - (previous.score or 0) if score is not None else 0,
+        total_scores=int(score is not None and previous.score is None),
+        total_comments=int(comment is not None and previous.comment is None),
+    )
+    session.info.setdefault('counter_deltas', []).append((film_id, deltas))
+    return film
+
+
+def flush_counters(session: Session, counter_buffer: CounterBuffer) -> List[Film]:
+    """Apply buffered changes in one batched UPDATE and commit them.
+
+    Updates the weighted ratings of the films as well. Returns the updated
+    films. The changes are put back into the buffer if the flush fails.
+    """
+    deltas = counter_buffer.take()
+    if not deltas:
+        return []
+    columns = Film.__table__.c
+    total_scores = columns.total_scores + bindparam('d_total_scores')
+    sum_scores = columns.sum_scores + bindparam('d_sum_scores')
+    try:
+        session.connection().execute(
+            update(Film.__table__)
+            .where(columns.id == bindparam('film_id'))
+            .values(
+                sum_scores=sum_scores,
+                total_scores=total_scores,
+                avg_score=case(
+                    (total_scores > 0, cast(sum_scores, Float) / total_scores),
+                    else_=columns.avg_score,
+                ),
+                total_comments=columns.total_comments + bindparam('d_total_comments'),
+            ),
+            [
+                {
+                    'film_id': film_id,
+                    'd_sum_scores': film_deltas.sum_scores,
+                    'd_total_scores': film_deltas.total_scores,
+                    'd_total_comments': film_deltas.total_comments,
+                }
+                for film_id, film_deltas in deltas.items()
+            ],
+        )
+        scored = [
+            film_id
+            for film_id, film_deltas in deltas.items()
+            if film_deltas.sum_scores or film_deltas.total_scores
+        ]
+        if scored:
+            rate_films_by_id(session, scored)
+        films = (
+            session.execute(
+                select(Film)
+                .where(Film.id.in_(list(deltas)))
+                .execution_options(populate_existing=True)
+            )
+            .scalars()
+            .all()
+        )
+        session.commit()
+    except Exception:
+        session.rollback()
+        counter_buffer.restore(deltas)
+        raise
+    return films
+
+
+def flush_buffer(create_session: Callable[[], ContextManager[Session]]) -> List[Film]:
+    if buffer is None or not buffer:
+        return []
+    with create_session() as session:
+        return flush_counters(session, buffer)
+
+
+async def flush_periodically(
+    interval: float,
+    create_session: Callable[[], ContextManager[Session]],
+    on_flush: Callable[[List[Film]], None],
+) -> None:
+    """Flush `buffer` every `interval` seconds and pass the updated films on."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            films = await run_in_threadpool(flush_buffer, create_session)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('Failed to flush film counters')
+            continue
+        on_flush(films)
+
+
+def start_flusher(
+    create_session: Callable[[], ContextManager[Session]],
+    on_flush: Callable[[List[Film]], None],
+) -> None:
+    global flusher  # pylint: disable=global-statement
+    if buffer is not None and COUNTERS_FLUSH_INTERVAL is not None and flusher is None:
+        flusher = asyncio.get_running_loop().create_task(
+            flush_periodically(COUNTERS_FLUSH_INTERVAL, create_session, on_flush)
+        )
+
+
+async def stop_flusher(
+    create_session: Callable[[], ContextManager[Session]],
+    on_flush: Callable[[List[Film]], None],
+) -> None:
+    """Stop flushing periodically and flush the remaining changes."""
+    global flusher  # pylint: disable=global-statement
+    if flusher is not None:
+        flusher.cancel()
+        flusher = None
+    try:
+        films = await run_in_threadpool(flush_buffer, create_session)
+    except Exception:  # pylint: disable=broad-except
+        logger.exception('Failed to flush film counters, run app.reconcile')
+        return
+    on_flush(films)
+
+
+def reconcile_counters(connection: Connection) -> int:
+    """Recompute counters of all films from reviews and rate all films again.
+
+    A single UPDATE reads the scored and the commented reviews of each film
+    from their partial indexes. Returns the number of films.
+    """
+
+    def aggregate(function: Any, column: Any) -> Any:
+        return (
+            select(function)
+            .where(Review.film_id == Film.id, column.isnot(None))
+            .scalar_subquery()
+        )
+
+    result = connection.execute(
+        update(Film).values(
+            sum_scores=aggregate(
+                func.coalesce(func.sum(Review.score), 0), Review.score
+            ),
+            total_scores=aggregate(func.count(), Review.score),
+            avg_score=aggregate(func.avg(Review.score), Review.score),
+            total_comments=aggregate(func.count(), Review.comment),
+        )
+    )
+    rate_all_films(connection, force=True)
+    return result.rowcount
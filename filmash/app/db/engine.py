@@ -0,0 +1,116 @@
+from typing import Any, Dict, NamedTuple, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import URL, Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.config import (
+    DB_MAX_OVERFLOW,
+    DB_POOL_SIZE,
+    SQLITE_BUSY_TIMEOUT,
+    SQLITE_CACHE_SIZE,
+    SQLITE_MMAP_SIZE,
+    SQLITE_PROFILE,
+)
+from app.metrics import instrument_engine
+
+ASYNC_DRIVERS = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg'}
+# INSERT constructs supporting ON CONFLICT by dialect name
+UPSERT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+class SQLiteProfile(NamedTuple):
+    """Pragmas set on every new SQLite connection, None keeps the default."""
+
+    journal_mode: Optional[str] = None
+    synchronous: Optional[str] = None
+    cache_size: Optional[int] = None
+    mmap_size: Optional[int] = None
+    busy_timeout: Optional[int] = None
+
+    def pragmas(self) -> Dict[str, Any]:
+        return {
+            name: value
+            for name, value in self._asdict().items()  # pylint: disable=no-member
+            if value is not None
+        }
+
+
+SQLITE_PROFILES = {
+    # The journal mode is stored in the database file, so it is set back explicitly
+    'default': SQLiteProfile(journal_mode='DELETE'),
+    # WAL lets readers run alongside the single writer, and with it
+    # synchronous=NORMAL syncs only at checkpoints. Negative cache_size is in KiB.
+    'tuned': SQLiteProfile(
+        journal_mode='WAL',
+        synchronous='NORMAL',
+        cache_size=-64 * 1024,
+        mmap_size=256 * 1024 * 1024,
+        busy_timeout=5000,
+    ),
+}
+
+
+def get_sqlite_profile(name: str = SQLITE_PROFILE) -> SQLiteProfile:
+    overrides = {
+        'cache_size': SQLITE_CACHE_SIZE,
+        'mmap_size': SQLITE_MMAP_SIZE,
+        'busy_timeout': SQLITE_BUSY_TIMEOUT,
+    }
+    return SQLITE_PROFILES[name]._replace(
+        **{name: value for name, value in overrides.items() if value is not None}
+    )
+
+
+def set_sqlite_pragmas(engine: Engine, profile: SQLiteProfile) -> None:
+    pragmas = profile.pragmas()
+
+    def set_pragmas(dbapi_connection: Any, _connection_record: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+    event.listen(engine, 'connect', set_pragmas)
+
+
+def get_async_url(url: str) -> URL:
+    sync_url = make_url(url)
+    return sync_url.set(drivername=ASYNC_DRIVERS[sync_url.get_backend_name()])
+
+
+def get_engine_options(url: URL, poolclass: Any) -> Dict[str, Any]:
+    if url.get_backend_name() != 'sqlite':
+        return {'pool_size': DB_POOL_SIZE, 'max_overflow': DB_MAX_OVERFLOW}
+    options: Dict[str, Any] = {'connect_args': {'check_same_thread': False}}
+    if url.database not in (None, '', ':memory:'):
+        # SQLAlchemy opens a new connection per checkout of a file database by
+        # default, which throws away the page cache and repeats the pragmas
+        options.update(
+            poolclass=poolclass, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW
+        )
+    return options
+
+
+def create_sync_engine(url: str, profile: Optional[SQLiteProfile] = None) -> Engine:
+    sync_url = make_url(url)
+    engine = create_engine(sync_url, **get_engine_options(sync_url, QueuePool))
+    instrument_engine(engine)
+    if sync_url.get_backend_name() == 'sqlite':
+        set_sqlite_pragmas(engine, profile or get_sqlite_profile())
+    return engine
+
+
+def create_async_db_engine(
+    url: str, profile: Optional[SQLiteProfile] = None
+) -> AsyncEngine:
+    async_url = get_async_url(url)
+    engine = create_async_engine(
+        async_url, **get_engine_options(async_url, AsyncAdaptedQueuePool)
+    )
+    instrument_engine(engine.sync_engine)
+    if async_url.get_backend_name() == 'sqlite':
+        set_sqlite_pragmas(engine.sync_engine, profile or get_sqlite_profile())
+    return engine
@@ -0,0 +1,129 @@
+from typing import Callable, List
+
+from sqlalchemy import func, insert, inspect, select, text, update
+from sqlalchemy.engine import Connection
+
+from app.db.models import Base, Film, Review, SchemaVersion, ScoreStats
+from app.db.ratings import STATS_ID, rate_films
+
+
+def execute_ddl(*statements: str) -> Callable[[Connection], None]:
+    """Step running `statements` as written, whatever the models are now."""
+
+    def step(connection: Connection) -> None:
+        for statement in statements:
+            connection.execute(text(statement))
+
+    return step
+
+
+def add_sum_scores(connection: Connection) -> None:
+    # Databases created from the models before they were versioned have it
+    columns = {column['name'] for column in inspect(connection).get_columns('Film')}
+    if 'sum_scores' not in columns:
+        connection.execute(
+            text('ALTER TABLE "Film" ADD COLUMN sum_scores INTEGER DEFAULT 0')
+        )
+    connection.execute(
+        update(Film).values(
+            sum_scores=select(func.coalesce(func.sum(Review.score), 0))
+            .where(Review.film_id == Film.id)
+            .scalar_subquery()
+        )
+    )
+
+
+def add_weighted_ratings(connection: Connection) -> None:
+    connection.execute(text('ALTER TABLE "Film" ADD COLUMN weighted_rating FLOAT'))
+    sum_scores, total_scores = connection.execute(
+        select(
+            func.coalesce(func.sum(Film.sum_scores), 0),
+            func.coalesce(func.sum(Film.total_scores), 0),
+        )
+    ).one()
+    connection.execute(
+        insert(ScoreStats).values(
+            id=STATS_ID, sum_scores=sum_scores, total_scores=total_scores
+        )
+    )
+    if total_scores:
+        rate_films(connection, sum_scores / total_scores)
+
+
+def check_review_scores(connection: Connection) -> None:
+    """Rebuild Review with a working range check of scores.
+
+    The check used to be '0 <= score <= 10', which SQLite reads as
+    '(0 <= score) <= 10', always true. PostgreSQL rejects it, so only SQLite
+    databases have it. SQLite cannot alter a check, hence the copy.
+    """
+    if connection.dialect.name != 'sqlite':
+        return
+    execute_ddl(
+        'CREATE TABLE "Review_new" ('
+        'user_id INTEGER NOT NULL, film_id INTEGER NOT NULL, comment TEXT, '
+        'score INTEGER CHECK (0 <= score AND score <= 10), '
+        'PRIMARY KEY (user_id, film_id), '
+        'FOREIGN KEY(user_id) REFERENCES "User" (id), '
+        'FOREIGN KEY(film_id) REFERENCES "Film" (id))',
+        'INSERT INTO "Review_new" (user_id, film_id, comment, score) '
+        'SELECT user_id, film_id, comment, score FROM "Review"',
+        'DROP TABLE "Review"',
+        'ALTER TABLE "Review_new" RENAME TO "Review"',
+        'CREATE INDEX "ix_Review_film_id_scored" '
+        'ON "Review" (film_id, user_id, score) WHERE score IS NOT NULL',
+        'CREATE INDEX "ix_Review_film_id_commented" '
+        'ON "Review" (film_id, user_id) WHERE comment IS NOT NULL',
+        'CREATE INDEX "ix_Review_user_id_film_id" '
+        'ON "Review" (user_id, film_id, score)',
+    )(connection)
+
+
+MIGRATIONS: List[Callable[[Connection], None]] = [
+    add_sum_scores,
+    execute_ddl(
+        'CREATE INDEX IF NOT EXISTS "ix_Film_avg_score" ON "Film" (avg_score)',
+        'CREATE INDEX IF NOT EXISTS "ix_Film_year_avg_score" '
+        'ON "Film" (year, avg_score)',
+        'CREATE INDEX IF NOT EXISTS "ix_Review_film_id_scored" '
+        'ON "Review" (film_id, user_id, score) WHERE score IS NOT NULL',
+        'CREATE INDEX IF NOT EXISTS "ix_Review_film_id_commented" '
+        'ON "Review" (film_id, user_id) WHERE comment IS NOT NULL',
+    ),
+    execute_ddl(
+        'CREATE INDEX IF NOT EXISTS "ix_Film_name_year" ON "Film" (name, year)'
+    ),
+    add_weighted_ratings,
+    execute_ddl(
+        'CREATE INDEX IF NOT EXISTS "ix_Film_weighted_rating" '
+        'ON "Film" (weighted_rating)',
+        'CREATE INDEX IF NOT EXISTS "ix_Film_year_weighted_rating" '
+        'ON "Film" (year, weighted_rating)',
+    ),
+    execute_ddl(
+        'CREATE INDEX IF NOT EXISTS "ix_Review_user_id_film_id" '
+        'ON "Review" (user_id, film_id, score)'
+    ),
+    check_review_scores,
+]
+
+
+def migrate(connection: Connection) -> int:
+    """Create missing tables and bring an existing schema up to date.
+
+    A new database is created from the models and stamped with the latest
+    version, an existing one gets the steps after its stored version.
+    Returns the number of applied steps.
+    """
+    created = not inspect(connection).has_table(Film.__tablename__)
+    Base.metadata.create_all(connection)
+
+    version = connection.execute(select(SchemaVersion.c.version)).scalar()
+    if version is None:
+        version = len(MIGRATIONS) if created else 0
+        connection.execute(insert(SchemaVersion).values(version=version))
+
+    for step in MIGRATIONS[version:]:
+        step(connection)
+    connection.execute(update(SchemaVersion).values(version=len(MIGRATIONS)))
+    return len(MIGRATIONS) - version
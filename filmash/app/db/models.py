@@ -1,6 +1,16 @@
-from sqlalchemy import CheckConstraint, Column, Float, ForeignKey, Integer, String, Text
-from sqlalchemy.ext.declarative import DeclarativeMeta, declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy import (
+    BigInteger,
+    CheckConstraint,
+    Column,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Table,
+    Text,
+)
+from sqlalchemy.orm import DeclarativeMeta, declarative_base, relationship
 
 Base: DeclarativeMeta = declarative_base()
 
@@ -12,7 +22,7 @@ class User(Base):
     login = Column(String, unique=True, nullable=False)
     hashed_password = Column(String, nullable=False)
 
-    reviews = relationship('Review')
+    reviews = relationship('Review', back_populates='user')
 
 
 class Film(Base):
@@ -22,11 +32,21 @@ class Film(Base):
     name = Column(String, nullable=False)
     year = Column(Integer, nullable=False)
     avg_score = Column(Float, CheckConstraint('0 <= avg_score AND avg_score <= 10'))
+    sum_scores = Column(Integer, default=0)
     total_scores = Column(Integer, default=0)
     total_comments = Column(Integer, default=0)
+    weighted_rating = Column(Float)
 
     reviews = relationship('Review')
 
+    __table_args__ = (
+        Index('ix_Film_avg_score', 'avg_score'),
+        Index('ix_Film_year_avg_score', 'year', 'avg_score'),
+        Index('ix_Film_name_year', 'name', 'year'),
+        Index('ix_Film_weighted_rating', 'weighted_rating'),
+        Index('ix_Film_year_weighted_rating', 'year', 'weighted_rating'),
+    )
+
 
 class Review(Base):
     __tablename__ = 'Review'
@@ -34,6 +54,68 @@ class Review(Base):
     user_id = Column(Integer, ForeignKey('User.id'), primary_key=True)
     film_id = Column(Integer, ForeignKey('Film.id'), primary_key=True)
     comment = Column(Text)
-    score = Column(Integer, CheckConstraint('0 <= score <= 10'))
+    score = Column(Integer, CheckConstraint('0 <= score AND score <= 10'))
+
+    user = relationship('User', back_populates='reviews')
+
+    __table_args__ = (
+        Index(
+            'ix_Review_film_id_scored',
+            'film_id',
+            'user_id',
+            'score',
+            sqlite_where=score.isnot(None),
+            postgresql_where=score.isnot(None),
+        ),
+        Index(
+            'ix_Review_film_id_commented',
+            'film_id',
+            'user_id',
+            sqlite_where=comment.isnot(None),
+            postgresql_where=comment.isnot(None),
+        ),
+        # Reviews of a user in film order. Comments are left out, since they
+        # are unbounded and PostgreSQL limits the size of index entries
+        Index('ix_Review_user_id_film_id', 'user_id', 'film_id', 'score'),
+    )
+
+
+class ScoreStats(Base):
+    """Totals of all scores as of the last `rate_all_films`, a single row with `id` 1."""
+
+    __tablename__ = 'ScoreStats'
+
+    id = Column(Integer, primary_key=True)
+    sum_scores = Column(Integer, nullable=False)
+    total_scores = Column(Integer, nullable=False)
+    # Mean of all scores the weighted ratings of films are computed with
+    rated_mean = Column(Float)
+
+
+class SimilarFilm(Base):
+    """Films most similar to a film by scores, computed by `app.similarity`.
+
+    Neighbours of a film are stored in the order of `rank`, starting from 1,
+    so they are read with the primary key.
+    """
+
+    __tablename__ = 'SimilarFilm'
+
+    film_id = Column(Integer, ForeignKey('Film.id'), primary_key=True)
+    rank = Column(Integer, primary_key=True)
+    similar_film_id = Column(Integer, ForeignKey('Film.id'), nullable=False)
+    similarity = Column(Float, nullable=False)
+
+
+class SimilarityInput(Base):
+    """Digest of the scores of a film its stored neighbours were computed from."""
+
+    __tablename__ = 'SimilarityInput'
+
+    film_id = Column(Integer, primary_key=True)
+    scores_digest = Column(BigInteger, nullable=False)
+
 
-    user = relationship('User')
+SchemaVersion = Table(
+    'SchemaVersion', Base.metadata, Column('version', Integer, nullable=False)
+)
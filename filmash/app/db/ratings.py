@@ -0,0 +1,142 @@
+"""IMDb-style weighted ratings of films.
+
+The rating pulls the average score of a film with few scores towards the
+mean of all scores. A new score rates only its film, with the mean stored
+in `ScoreStats`. The mean itself is recomputed from the film counters by
+`rate_all_films`, every RATING_INTERVAL seconds in the app and by
+`app.reconcile`, so writes never touch a shared row.
+"""
+import asyncio
+import logging
+from typing import Any, Callable, Collection, ContextManager, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import Float, cast, func, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.config import RATING_INTERVAL, RATING_MEAN_TOLERANCE, RATING_PRIOR_VOTES
+from app.db.engine import UPSERT_INSERTS
+from app.db.models import Film, ScoreStats
+
+logger = logging.getLogger(__name__)
+
+STATS_ID = 1
+
+rater: Optional['asyncio.Task[None]'] = None
+
+
+def weighted_rating(mean: Any) -> Any:
+    return (cast(Film.sum_scores, Float) + RATING_PRIOR_VOTES * mean) / (
+        Film.total_scores + RATING_PRIOR_VOTES
+    )
+
+
+def rate_films(connection: Connection, mean: float) -> None:
+    connection.execute(
+        update(Film)
+        .where(Film.avg_score.isnot(None))
+        .values(weighted_rating=weighted_rating(mean))
+        .execution_options(synchronize_session=False)
+    )
+    connection.execute(
+        update(ScoreStats).where(ScoreStats.id == STATS_ID).values(rated_mean=mean)
+    )
+
+
+def rate_films_by_id(session: Session, film_ids: Collection[int]) -> None:
+    """Update the weighted ratings of films after their scores have changed.
+
+    Ratings of all films are computed with the same stored mean, so they
+    stay comparable. Films are left unrated until the first mean is stored.
+    """
+    rated_mean = (
+        select(ScoreStats.rated_mean).where(ScoreStats.id == STATS_ID).scalar_subquery()
+    )
+    session.execute(
+        update(Film)
+        .where(Film.id.in_(film_ids))
+        .values(weighted_rating=weighted_rating(rated_mean))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def rate_all_films(connection: Connection, force: bool = False) -> bool:
+    """Store the totals of all scores and rate all films again once their
+    mean moves further than RATING_MEAN_TOLERANCE from the stored one.
+
+    Returns whether the films were rated again.
+    """
+    sum_scores, total_scores = connection.execute(
+        select(
+            func.coalesce(func.sum(Film.sum_scores), 0),
+            func.coalesce(func.sum(Film.total_scores), 0),
+        )
+    ).one()
+    rated_mean = connection.execute(
+        select(ScoreStats.rated_mean).where(ScoreStats.id == STATS_ID)
+    ).scalar()
+    insert = UPSERT_INSERTS[connection.dialect.name]
+    statement = insert(ScoreStats).values(
+        id=STATS_ID, sum_scores=sum_scores, total_scores=total_scores
+    )
+    connection.execute(
+        statement.on_conflict_do_update(
+            index_elements=[ScoreStats.id],
+            set_={'sum_scores': sum_scores, 'total_scores': total_scores},
+        )
+    )
+    if not total_scores:
+        return False
+    mean = sum_scores / total_scores
+    if (
+        not force
+        and rated_mean is not None
+        and abs(mean - rated_mean) <= RATING_MEAN_TOLERANCE
+    ):
+        return False
+    rate_films(connection, mean)
+    return True
+
+
+def rate_all_films_in_session(
+    create_session: Callable[[], ContextManager[Session]]
+) -> bool:
+    with create_session() as session:
+        return rate_all_films(session.connection())
+
+
+async def rate_periodically(
+    interval: float,
+    create_session: Callable[[], ContextManager[Session]],
+    on_rate: Callable[[], None],
+) -> None:
+    """Run `rate_all_films` every `interval` seconds and call `on_rate` once
+    the films were rated again."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            rated = await run_in_threadpool(rate_all_films_in_session, create_session)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('Failed to rate films')
+            continue
+        if rated:
+            on_rate()
+
+
+def start_rater(
+    create_session: Callable[[], ContextManager[Session]],
+    on_rate: Callable[[], None],
+) -> None:
+    global rater  # pylint: disable=global-statement
+    if rater is None:
+        rater = asyncio.get_running_loop().create_task(
+            rate_periodically(RATING_INTERVAL, create_session, on_rate)
+        )
+
+
+def stop_rater() -> None:
+    global rater  # pylint: disable=global-statement
+    if rater is not None:
+        rater.cancel()
+        rater = None
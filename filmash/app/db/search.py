@@ -0,0 +1,122 @@
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import column, event, literal_column, table
+from sqlalchemy.exc import OperationalError
+
+from app.db.models import Film
+
+# FTS5 index over film names with the trigram tokenizer, so that MATCH
+# finds arbitrary substrings of at least `MIN_TERM_LENGTH` characters
+MIN_TERM_LENGTH = 3
+
+FilmSearch = table('FilmSearch', column('rowid'), column('rank'))
+
+CREATE_SEARCH_INDEX = [
+    """
+    CREATE VIRTUAL TABLE FilmSearch USING fts5(
+        name, content='Film', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS Film_search_insert AFTER INSERT ON Film BEGIN
+        INSERT INTO FilmSearch(rowid, name) VALUES (new.id, new.name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS Film_search_delete AFTER DELETE ON Film BEGIN
+        INSERT INTO FilmSearch(FilmSearch, rowid, name)
+        VALUES ('delete', old.id, old.name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS Film_search_update AFTER UPDATE OF name ON Film BEGIN
+        INSERT INTO FilmSearch(FilmSearch, rowid, name)
+        VALUES ('delete', old.id, old.name);
+        INSERT INTO FilmSearch(rowid, name) VALUES (new.id, new.name);
+    END
+    """,
+    "INSERT INTO FilmSearch(FilmSearch) VALUES ('rebuild')",
+]
+
+search_index_enabled = False
+
+
+def create_search_index(connection: Any) -> bool:
+    """Create the search index and the triggers keeping it in sync with `Film`.
+
+    Returns False and leaves the database untouched when the backend has no
+    FTS5 trigram support, in which case search falls back to LIKE.
+    """
+    global search_index_enabled  # pylint: disable=global-statement
+    if connection.dialect.name != 'sqlite':
+        search_index_enabled = False
+        return False
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'FilmSearch'"
+    ).first()
+    if not exists:
+        try:
+            for statement in CREATE_SEARCH_INDEX:
+                connection.exec_driver_sql(statement)
+        except OperationalError:
+            search_index_enabled = False
+            return False
+    search_index_enabled = True
+    return True
+
+
+def drop_search_index(connection: Any) -> None:
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql('DROP TABLE IF EXISTS FilmSearch')
+
+
+@event.listens_for(Film.__table__, 'after_create')
+def _create_search_index(_target: Any, connection: Any, **_kwargs: Any) -> None:
+    create_search_index(connection)
+
+
+@event.listens_for(Film.__table__, 'before_drop')
+def _drop_search_index(_target: Any, connection: Any, **_kwargs: Any) -> None:
+    drop_search_index(connection)
+
+
+def like_pattern(term: str) -> str:
+    escaped = term.replace('/', '//').replace('%', '/%').replace('_', '/_')
+    return f'%{escaped}%'
+
+
+def quote_phrase(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def filter_by_name(
+    statement: Any, substring: Optional[str], search: Optional[str]
+) -> Tuple[Any, Optional[Any]]:
+    """Filter films whose name contains `substring` and every word of `search`.
+
+    Terms long enough for the trigram index are matched through it, shorter
+    ones (or all of them when the index is unavailable) with case-insensitive
+    LIKE. Returns the statement and, for `search`, a relevance expression to
+    order by.
+    """
+    terms: List[str] = [substring] if substring else []
+    words = search.split() if search else []
+    indexed = [
+        term
+        for term in terms + words
+        if search_index_enabled and len(term) >= MIN_TERM_LENGTH
+    ]
+    for term in terms + words:
+        if term not in indexed:
+            statement = statement.filter(
+                Film.name.ilike(like_pattern(term), escape='/')
+            )
+    if not indexed:
+        return statement, None
+
+    statement = statement.join(FilmSearch, FilmSearch.c.rowid == Film.id).filter(
+        literal_column('FilmSearch').op('MATCH')(
+            ' '.join(quote_phrase(term) for term in indexed)
+        )
+    )
+    return statement, FilmSearch.c.rank if words else None
@@ -1,13 +1,34 @@
-from contextlib import contextmanager
-from typing import Any, Callable, Iterator
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Iterator, List, Optional, Tuple
 
-from sqlalchemy import create_engine
+from sqlalchemy import Float, case, cast, func, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, sessionmaker
 
-from app.db.models import Base, Film
+from app.config import DB_MAX_OVERFLOW, DB_MODE, DB_POOL_SIZE, DB_URL, DBMode
+from app.db import counters
+from app.db.adapter import SyncSessionAdapter
+from app.db.engine import UPSERT_INSERTS, create_async_db_engine, create_sync_engine
+from app.db.migrations import migrate
+from app.db.models import Film, Review, User
+from app.db.ratings import rate_films_by_id
+from app.db.search import create_search_index
 
 engine = None
+async_engine = None
 SessionLocal: Callable[[], Any]
+AsyncSessionLocal: Callable[[], Any]
+session_slots: Optional[asyncio.Semaphore] = None
+
+
+def get_session_slots() -> asyncio.Semaphore:
+    # Created lazily to be bound to the running event loop
+    global session_slots  # pylint: disable=global-statement
+    if session_slots is None:
+        session_slots = asyncio.Semaphore(DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    return session_slots
 
 
 def add_initial_data(session: Session) -> None:
@@ -22,13 +43,166 @@ def add_initial_data(session: Session) -> None:
         )
 
 
-def init_db() -> None:  # pragma: no cover
-    global engine, SessionLocal  # pylint: disable=global-statement
-    engine = create_engine('sqlite:///filmash.db')
-    SessionLocal = sessionmaker(bind=engine)
-    Base.metadata.create_all(engine)
-    with create_session() as session:
-        add_initial_data(session)
+async def get_user_by_login(session: AsyncSession, login: str) -> Optional[User]:
+    result = await session.execute(select(User).filter_by(login=login))
+    return result.scalar_one_or_none()
+
+
+async def create_user(session: AsyncSession, login: str, hashed_password: str) -> User:
+    user = User(login=login, hashed_password=hashed_password)
+    session.add(user)
+    await session.commit()
+    return user
+
+
+def upsert_review(session: Session, user_id: int, film_id: int, **values: Any) -> None:
+    insert = UPSERT_INSERTS[session.get_bind().dialect.name]
+    statement = insert(Review).values(user_id=user_id, film_id=film_id, **values)
+    session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[Review.user_id, Review.film_id],
+            set_={name: statement.excluded[name] for name in values},
+        )
+    )
+
+
+def lock_film(session: Session, film_id: int) -> bool:
+    """Lock the film row until the end of the transaction.
+
+    Concurrent reviews of the film wait here, so on PostgreSQL the next
+    statements see their committed scores and comments. SQLite ignores
+    FOR UPDATE as it has a single writer anyway. Returns False if the film
+    does not exist.
+    """
+    locked = session.execute(
+        select(Film.id).where(Film.id == film_id).with_for_update()
+    )
+    return locked.first() is not None
+
+
+def select_review_field(user_id: int, film_id: int, field: Any) -> Any:
+    return (
+        select(field)
+        .where(Review.user_id == user_id, Review.film_id == film_id)
+        .scalar_subquery()
+    )
+
+
+def apply_score(
+    session: Session, user_id: int, film_id: int, score: int
+) -> Optional[Film]:
+    """Upsert the user's score and apply the change to the film aggregates
+    and its weighted rating.
+
+    The aggregates are updated with a single UPDATE that reads the previous
+    score in the same statement, so concurrent votes never overwrite each
+    other. In write-behind mode only the review is saved and the change of
+    the aggregates is left to `counters`. Returns the updated film or None
+    if it does not exist.
+    """
+    if counters.buffer is not None:
+        return counters.save_review_later(session, user_id, film_id, score=score)
+    if not lock_film(session, film_id):
+        return None
+    previous_score = select_review_field(user_id, film_id, Review.score)
+    delta = score - func.coalesce(previous_score, 0)
+    added = case((previous_score.is_(None), 1), else_=0)
+    session.execute(
+        update(Film)
+        .where(Film.id == film_id)
+        .values(
+            sum_scores=Film.sum_scores + delta,
+            total_scores=Film.total_scores + added,
+            avg_score=cast(Film.sum_scores + delta, Float)
+            / (Film.total_scores + added),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    upsert_review(session, user_id, film_id, score=score)
+    rate_films_by_id(session, [film_id])
+    return session.get(Film, film_id, populate_existing=True)
+
+
+def apply_comment(
+    session: Session, user_id: int, film_id: int, comment: str
+) -> Optional[Film]:
+    if counters.buffer is not None:
+        return counters.save_review_later(session, user_id, film_id, comment=comment)
+    if not lock_film(session, film_id):
+        return None
+    previous_comment = select_review_field(user_id, film_id, Review.comment)
+    session.execute(
+        update(Film)
+        .where(Film.id == film_id)
+        .values(
+            total_comments=Film.total_comments
+            + case((previous_comment.is_(None), 1), else_=0)
+        )
+        .execution_options(synchronize_session=False)
+    )
+    upsert_review(session, user_id, film_id, comment=comment)
+    return session.get(Film, film_id, populate_existing=True)
+
+
+def save_score(
+    session: Session, user_id: int, film_id: int, score: int
+) -> Optional[Film]:
+    # Committed right away to keep the write lock short
+    film = apply_score(session, user_id, film_id, score)
+    session.commit()
+    return film
+
+
+def save_comment(
+    session: Session, user_id: int, film_id: int, comment: str
+) -> Optional[Film]:
+    film = apply_comment(session, user_id, film_id, comment)
+    session.commit()
+    return film
+
+
+def save_batch(
+    session: Session,
+    apply: Callable[[Session, int, int, Any], Optional[Film]],
+    user_id: int,
+    items: List[Tuple[int, Any]],
+) -> List[Optional[Film]]:
+    """Apply `(film_id, value)` items in order and commit them together.
+
+    Returns the films with aggregates after the whole batch, or None for
+    items referring to missing films.
+    """
+    films = [apply(session, user_id, film_id, value) for film_id, value in items]
+    session.commit()
+    return films
+
+
+def init_db(  # pragma: no cover
+    url: str = DB_URL, mode: DBMode = DB_MODE, initial_data: bool = True
+) -> None:
+    global engine, async_engine  # pylint: disable=global-statement
+    global SessionLocal, AsyncSessionLocal  # pylint: disable=global-statement
+    engine = create_sync_engine(url)
+    SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
+    if mode == DBMode.ASYNC:
+        async_engine = create_async_db_engine(url)
+        AsyncSessionLocal = sessionmaker(
+            bind=async_engine, class_=AsyncSession, expire_on_commit=False
+        )
+    with engine.begin() as connection:
+        migrate(connection)
+        create_search_index(connection)
+    if initial_data:
+        with create_session() as session:
+            add_initial_data(session)
+
+
+def open_db(url: str) -> Engine:
+    """Engine of an existing database for command line tools, which must not
+    add the demo films to it."""
+    init_db(url, DBMode.SYNC, initial_data=False)
+    assert engine is not None
+    return engine
 
 
 @contextmanager
@@ -44,6 +218,22 @@ def create_session() -> Iterator[Any]:  # pragma: no cover
         new_session.close()
 
 
-def get_session() -> Any:
-    with create_session() as s:
+@asynccontextmanager
+async def create_async_session() -> AsyncIterator[Any]:  # pragma: no cover
+    if DB_MODE == DBMode.ASYNC:
+        new_session = AsyncSessionLocal()
+    else:
+        new_session = SyncSessionAdapter(SessionLocal(), get_session_slots())
+    try:
+        yield new_session
+        await new_session.commit()
+    except Exception:
+        await new_session.rollback()
+        raise
+    finally:
+        await new_session.close()
+
+
+async def get_session() -> AsyncIterator[Any]:
+    async with create_async_session() as s:
         yield s
@@ -0,0 +1,89 @@
+"""Streaming export of films and reviews as NDJSON.
+
+Usage: python -m app.exporter {films,reviews} [--output FILE] [--db-url URL]
+
+Rows are read with a server-side cursor in partitions of `YIELD_PER`, so
+memory use does not depend on the size of the tables. Exported films have
+`name` and `year` keys and can be imported back with `app.importer`.
+"""
+import argparse
+import json
+import sys
+from typing import IO, Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import app.db.utils as db_utils
+from app.config import DB_URL
+from app.db.models import Film, Review
+
+YIELD_PER = 1000
+
+EXPORTS: Dict[str, Any] = {
+    'films': select(
+        Film.id,
+        Film.name,
+        Film.year,
+        Film.avg_score,
+        Film.total_scores,
+        Film.total_comments,
+        Film.weighted_rating,
+    ).order_by(Film.id),
+    'reviews': select(
+        Review.user_id, Review.film_id, Review.score, Review.comment
+    ).order_by(Review.user_id, Review.film_id),
+}
+
+
+def to_ndjson(keys: List[str], rows: Iterable[Any]) -> str:
+    return ''.join(json.dumps(dict(zip(keys, row))) + '\n' for row in rows)
+
+
+def export_lines(
+    connection: Connection, name: str, yield_per: int = YIELD_PER
+) -> Iterator[str]:
+    """Yield NDJSON chunks of `yield_per` rows of the export `name`."""
+    statement = EXPORTS[name]
+    keys = statement.selected_columns.keys()
+    result = connection.execution_options(stream_results=True).execute(statement)
+    for rows in result.partitions(yield_per):
+        yield to_ndjson(keys, rows)
+
+
+async def stream_export(
+    session: AsyncSession, name: str, yield_per: int = YIELD_PER
+) -> AsyncIterator[str]:
+    statement = EXPORTS[name]
+    keys = statement.selected_columns.keys()
+    result = await session.stream(statement)
+    async for rows in result.partitions(yield_per):
+        yield to_ndjson(keys, rows)
+
+
+def write_export(
+    connection: Connection, name: str, file: IO[str], yield_per: int = YIELD_PER
+) -> None:
+    for chunk in export_lines(connection, name, yield_per):
+        file.write(chunk)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Export films or reviews as NDJSON.')
+    parser.add_argument('table', choices=EXPORTS)
+    parser.add_argument('--output', default='-', help='defaults to stdout')
+    parser.add_argument('--yield-per', type=int, default=YIELD_PER)
+    parser.add_argument('--db-url', default=DB_URL)
+    args = parser.parse_args(argv)
+
+    with db_utils.open_db(args.db_url).connect() as connection:
+        if args.output == '-':
+            write_export(connection, args.table, sys.stdout, args.yield_per)
+        else:
+            with open(args.output, 'w') as file:
+                write_export(connection, args.table, file, args.yield_per)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
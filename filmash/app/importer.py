@@ -0,0 +1,158 @@
+"""Streaming import of film catalogues into the database.
+
+Usage: python -m app.importer FILE [--format csv|jsonl] [--chunk-size N]
+
+CSV files need a header with `name` and `year` columns, JSONL files hold
+one object with these keys per line. `-` reads the catalogue from stdin.
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+from datetime import datetime
+from itertools import islice
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from sqlalchemy import bindparam, exists, insert, select
+from sqlalchemy.engine import Engine
+
+import app.db.utils as db_utils
+from app.config import DB_URL
+from app.db.models import Film
+
+CHUNK_SIZE = 10000
+
+# Inserts a film unless one with the same name and year exists already,
+# which is also true for duplicates earlier in the same executemany batch
+INSERT_FILM = insert(Film).from_select(
+    ['name', 'year'],
+    select(bindparam('name'), bindparam('year')).where(
+        ~exists().where(Film.name == bindparam('name'), Film.year == bindparam('year'))
+    ),
+)
+
+
+class ImportStats(NamedTuple):
+    rows: int = 0
+    inserted: int = 0
+    invalid: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f'{self.rows} rows, {self.inserted} new films, {self.invalid} invalid '
+            f'in {self.seconds:.1f}s ({self.rows_per_second:.0f} rows/s)'
+        )
+
+
+def read_csv(file: IO[str]) -> Iterator[Dict[str, Any]]:
+    return csv.DictReader(file)
+
+
+def read_jsonl(file: IO[str]) -> Iterator[Dict[str, Any]]:
+    for line in file:
+        if line.strip():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield record if isinstance(record, dict) else {}
+
+
+READERS: Dict[str, Callable[[IO[str]], Iterator[Dict[str, Any]]]] = {
+    'csv': read_csv,
+    'jsonl': read_jsonl,
+}
+
+
+def parse_film(record: Dict[str, Any]) -> Optional[Tuple[str, int]]:
+    name = str(record.get('name') or '').strip()
+    try:
+        year = int(record.get('year'))  # type: ignore
+    except (TypeError, ValueError):
+        return None
+    if not name or not 1895 <= year <= datetime.now().year:
+        return None
+    return name, year
+
+
+def import_films(
+    engine: Engine,
+    records: Iterable[Dict[str, Any]],
+    chunk_size: int = CHUNK_SIZE,
+    report: Optional[Callable[[ImportStats], None]] = None,
+) -> ImportStats:
+    """Insert new films from `records` in chunks, one transaction per chunk.
+
+    Records without a valid name and year are skipped and counted as invalid.
+    """
+    started = time.perf_counter()
+    stats = ImportStats()
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return stats
+        films = [parse_film(record) for record in chunk]
+        params: List[Dict[str, Any]] = [
+            {'name': name, 'year': year}
+            for name, year in dict.fromkeys(filter(None, films))
+        ]
+        inserted = 0
+        if params:
+            with engine.begin() as connection:
+                inserted = connection.execute(INSERT_FILM, params).rowcount
+        stats = ImportStats(
+            rows=stats.rows + len(chunk),
+            inserted=stats.inserted + inserted,
+            invalid=stats.invalid + films.count(None),
+            seconds=time.perf_counter() - started,
+        )
+        if report is not None:
+            report(stats)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Import a film catalogue.')
+    parser.add_argument('file', help='CSV or JSONL catalogue, - for stdin')
+    parser.add_argument('--format', choices=READERS, help='defaults to the extension')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--db-url', default=DB_URL)
+    args = parser.parse_args(argv)
+
+    file_format = args.format or args.file.rpartition('.')[2]
+    if file_format not in READERS:
+        parser.error('cannot infer the format, use --format')
+
+    engine = db_utils.open_db(args.db_url)
+    file = (
+        sys.stdin if args.file == '-' else open(args.file, newline='', encoding='utf-8')
+    )
+    with file:
+        stats = import_films(
+            engine,
+            READERS[file_format](file),
+            chunk_size=args.chunk_size,
+            report=lambda stats: print(stats, file=sys.stderr),
+        )
+    print(f'Imported {stats}')
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
@@ -0,0 +1,129 @@
+import bisect
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import Film
+
+
+class RankedFilm(NamedTuple):
+    id: int
+    name: str
+    year: int
+    avg_score: float
+    total_scores: int
+    weighted_rating: Optional[float] = None
+
+    @property
+    def rank(self) -> Tuple[float, int]:
+        # Ascending order of ranks is descending order of average scores and ids
+        return -self.avg_score, -self.id
+
+
+class Leaderboard:
+    """Films with at least `min_votes` scores sorted by average score.
+
+    Keeps one sorted list of ranks for all films and one per year, so
+    top-N listings are served without sorting films in the database.
+    Films are moved with `update` when their scores change. The lists are
+    loaded on first use and reloaded after `ttl` seconds to pick up
+    changes made by other processes; a load that overlaps an update is
+    thrown away, like responses in `ResponseCache`.
+    """
+
+    def __init__(self, min_votes: int, ttl: float) -> None:
+        self.min_votes = min_votes
+        self.ttl = ttl
+        self.generation = 0
+        self.expires_at = 0.0
+        self.films: Dict[int, RankedFilm] = {}
+        self.boards: Dict[Optional[int], List[Tuple[float, int]]] = {}
+
+    @property
+    def loaded(self) -> bool:
+        return time.monotonic() < self.expires_at
+
+    def clear(self) -> None:
+        self.generation += 1
+        self.expires_at = 0.0
+        self.films, self.boards = {}, {}
+
+    async def load(self, session: AsyncSession) -> bool:
+        generation = self.generation
+        result = await session.execute(
+            select(
+                Film.id,
+                Film.name,
+                Film.year,
+                Film.avg_score,
+                Film.total_scores,
+                Film.weighted_rating,
+            )
+            .where(Film.avg_score.isnot(None), Film.total_scores >= self.min_votes)
+            .order_by(Film.avg_score.desc(), Film.id.desc())
+        )
+        if generation != self.generation:
+            return False
+
+        films = [RankedFilm(*row) for row in result]
+        boards: Dict[Optional[int], List[Tuple[float, int]]] = {None: []}
+        for film in films:
+            boards[None].append(film.rank)
+            boards.setdefault(film.year, []).append(film.rank)
+        self.films = {film.id: film for film in films}
+        self.boards = boards
+        self.expires_at = time.monotonic() + self.ttl
+        return True
+
+    def update(self, film: Any) -> None:
+        """Move the film to its place after its average score has changed."""
+        self.generation += 1
+        previous = self.films.pop(film.id, None)
+        if previous is not None:
+            for year in (None, previous.year):
+                board = self.boards[year]
+                del board[bisect.bisect_left(board, previous.rank)]
+
+        if film.avg_score is not None and film.total_scores >= self.min_votes:
+            ranked = RankedFilm(
+                film.id,
+                film.name,
+                film.year,
+                film.avg_score,
+                film.total_scores,
+                film.weighted_rating,
+            )
+            self.films[film.id] = ranked
+            for year in (None, film.year):
+                bisect.insort(self.boards.setdefault(year, []), ranked.rank)
+
+    async def top(
+        self,
+        session: AsyncSession,
+        year: Optional[int],
+        limit: int,
+        min_votes: Optional[int] = None,
+    ) -> Optional[List[RankedFilm]]:
+        """Return the best `limit` films of the year or of all years.
+
+        Returns None if the listing has to be queried: when it counts
+        films with fewer votes than the leaderboard keeps, or when it has
+        free places left for films without scores.
+        """
+        if max(min_votes or 0, 1) < self.min_votes:
+            return None
+        if not self.loaded and not await self.load(session):
+            return None
+
+        films = []
+        for _, negative_id in self.boards.get(year, []):
+            film = self.films[-negative_id]
+            if film.total_scores >= (min_votes or 0):
+                films.append(film)
+                if len(films) == limit:
+                    break
+        if len(films) < limit and not min_votes:
+            return None
+        return films
@@ -0,0 +1,278 @@
+"""Request and database query metrics in the Prometheus text format.
+
+`MetricsMiddleware` times every request and collects the time the request
+spends in database queries, bcrypt and JSON rendering through the
+`current_request` context variable, which is also seen by the threadpool.
+"""
+import bisect
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import SLOW_QUERY_MS
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4'
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+PHASES = ('db', 'bcrypt', 'serialization')
+
+LabelValues = Tuple[str, ...]
+
+
+def format_labels(names: Sequence[str], values: Sequence[Any]) -> str:
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf'
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, description: str, labels: Sequence[str]) -> None:
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        with self._lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def clear(self) -> None:
+        with self._lock:
+            self.values.clear()
+
+    def render(self) -> Iterator[str]:
+        yield f'# HELP {self.name} {self.description}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            for values, total in sorted(self.values.items()):
+                labels = format_labels(self.labels, values)
+                yield f'{self.name}{labels} {format_value(total)}'
+
+
+class Histogram:
+    """Histogram with fixed upper bounds of buckets, one series per labels."""
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: Sequence[str],
+        buckets: Sequence[float],
+    ) -> None:
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets) + (math.inf,)
+        # Label values mapped to the counts of every bucket, the sum and the count
+        self.series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            counts, total = self.series.setdefault(
+                label_values, ([0] * len(self.buckets), [0.0])
+            )
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    def clear(self) -> None:
+        with self._lock:
+            self.series.clear()
+
+    def render(self) -> Iterator[str]:
+        yield f'# HELP {self.name} {self.description}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            for values, (counts, total) in sorted(self.series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    labels = format_labels(
+                        self.labels + ('le',), values + (format_value(bound),)
+                    )
+                    yield f'{self.name}_bucket{labels} {cumulative}'
+                labels = format_labels(self.labels, values)
+                yield f'{self.name}_sum{labels} {format_value(total[0])}'
+                yield f'{self.name}_count{labels} {cumulative}'
+
+
+REQUEST_DURATION = Histogram(
+    'filmash_request_duration_seconds',
+    'Time to respond to a request.',
+    ('method', 'route', 'status'),
+    DURATION_BUCKETS,
+)
+REQUEST_QUERIES = Histogram(
+    'filmash_request_queries',
+    'Number of database queries run by a request.',
+    ('method', 'route'),
+    QUERY_COUNT_BUCKETS,
+)
+REQUEST_PHASE_DURATION = Histogram(
+    'filmash_request_phase_seconds',
+    'Time a request spent in database queries, bcrypt and JSON rendering.',
+    ('method', 'route', 'phase'),
+    DURATION_BUCKETS,
+)
+QUERY_DURATION = Histogram(
+    'filmash_query_duration_seconds',
+    'Time to execute a database query.',
+    ('statement',),
+    DURATION_BUCKETS,
+)
+SLOW_QUERIES = Counter(
+    'filmash_slow_queries_total',
+    'Number of database queries slower than SLOW_QUERY_MS.',
+    ('statement',),
+)
+REJECTED_REQUESTS = Counter(
+    'filmash_rejected_requests_total',
+    'Number of write requests rejected by the rate or concurrency limit.',
+    ('reason',),
+)
+METRICS: List[Union[Counter, Histogram]] = [
+    REQUEST_DURATION,
+    REQUEST_QUERIES,
+    REQUEST_PHASE_DURATION,
+    QUERY_DURATION,
+    SLOW_QUERIES,
+    REJECTED_REQUESTS,
+]
+
+
+def render_metrics() -> str:
+    return ''.join(line + '\n' for metric in METRICS for line in metric.render())
+
+
+def clear_metrics() -> None:
+    for metric in METRICS:
+        metric.clear()
+
+
+class RequestMetrics:
+    def __init__(self, method: str, path: str) -> None:
+        self.method = method
+        self.path = path
+        self.queries = 0
+        self.phases = dict.fromkeys(PHASES, 0.0)
+
+    def record(self, route: str, status: int, duration: float) -> None:
+        REQUEST_DURATION.observe(duration, self.method, route, str(status))
+        REQUEST_QUERIES.observe(self.queries, self.method, route)
+        for phase, phase_duration in self.phases.items():
+            REQUEST_PHASE_DURATION.observe(phase_duration, self.method, route, phase)
+
+
+current_request: ContextVar[Optional[RequestMetrics]] = ContextVar(
+    'current_request', default=None
+)
+
+
+@contextmanager
+def measure(phase: str) -> Iterator[None]:
+    """Add the time spent in the block to the phase of the current request."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        request = current_request.get()
+        if request is not None:
+            request.phases[phase] += time.perf_counter() - started
+
+
+class TimedJSONResponse(ORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        with measure('serialization'):
+            return super().render(content)
+
+
+def before_cursor_execute(conn: Any, *_args: Any) -> None:
+    conn.info['query_started'] = time.perf_counter()
+
+
+def after_cursor_execute(conn: Any, _cursor: Any, statement: str, *_args: Any) -> None:
+    duration = time.perf_counter() - conn.info.pop('query_started')
+    kind = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ''
+    QUERY_DURATION.observe(duration, kind)
+
+    request = current_request.get()
+    if request is not None:
+        request.queries += 1
+        request.phases['db'] += duration
+    if SLOW_QUERY_MS is not None and duration * 1000 >= SLOW_QUERY_MS:
+        SLOW_QUERIES.inc(kind)
+        logger.warning(
+            'Slow query (%.1f ms) in %s: %s',
+            duration * 1000,
+            f'{request.method} {request.path}' if request is not None else '-',
+            ' '.join(statement.split()),
+        )
+
+
+def instrument_engine(engine: Engine) -> None:
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording the duration and queries of every request.
+
+    Requests are labelled with the path template of the matched route, so
+    `/films/1` and `/films/2` share the same series.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.routes: Dict[Any, str] = {}
+
+    def get_route(self, scope: Scope) -> str:
+        endpoint = scope.get('endpoint')
+        if endpoint is None:
+            return 'unmatched'
+        if endpoint not in self.routes:
+            for route in scope['app'].routes:
+                if getattr(route, 'endpoint', None) is endpoint:
+                    self.routes[endpoint] = route.path
+        return self.routes.get(endpoint, 'unmatched')
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        request = RequestMetrics(scope['method'], scope['path'])
+        token = current_request.set(request)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            current_request.reset(token)
+            request.record(self.get_route(scope), status, time.perf_counter() - started)
@@ -0,0 +1,217 @@
+import base64
+import binascii
+import json
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from fastapi import Depends, HTTPException, Query, status
+from sqlalchemy import and_, false, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.utils import count_cache, get_and_check_total_pages, get_page_size
+from app.validators import SortType
+
+CURSOR_VALUE_TYPES = (str, int, float, type(None))
+
+
+def encode_cursor(position: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Position stored in the cursor.
+
+    Positions hold scalar keyset values and the non-negative number of rows
+    `served`, anything else is rejected as an invalid cursor.
+    """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid cursor'
+        ) from e
+    served = position.get('served', 0) if isinstance(position, dict) else None
+    if (
+        not isinstance(position, dict)
+        or not all(isinstance(value, CURSOR_VALUE_TYPES) for value in position.values())
+        or not isinstance(served, int)
+        or isinstance(served, bool)
+        or served < 0
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid cursor'
+        )
+    return position
+
+
+async def count_rows(session: AsyncSession, statement: Any) -> int:
+    result = await session.execute(
+        select(func.count()).select_from(statement.order_by(None).subquery())
+    )
+    return result.scalar_one()
+
+
+class Keyset:
+    """Ordering of a listing by an optional nullable sort column and a unique key.
+
+    Rows are ordered by `sort_column` (NULLs go first for ascending and last
+    for descending order) and then by `key` in the same direction, so that
+    a single index on `sort_column` serves both orders and the position of
+    the last returned row is enough to seek to the next page.
+    """
+
+    def __init__(
+        self,
+        key: Any,
+        sort_column: Any = None,
+        sort_type: Optional[SortType] = None,
+    ) -> None:
+        self.key = key
+        self.sort_column = sort_column if sort_type else None
+        self.sort_type = sort_type
+
+    def order_by(self) -> List[Any]:
+        if self.sort_column is None:
+            return [self.key]
+        if self.sort_type == SortType.ASC:
+            return [self.sort_column.asc().nullsfirst(), self.key.asc()]
+        return [self.sort_column.desc().nullslast(), self.key.desc()]
+
+    @property
+    def columns(self) -> List[Any]:
+        return [self.key] if self.sort_column is None else [self.sort_column, self.key]
+
+    def position(self, row: Any) -> Dict[str, Any]:
+        return {column.key: getattr(row, column.key) for column in self.columns}
+
+    def after(self, position: Dict[str, Any]) -> Any:
+        if not {column.key for column in self.columns} <= position.keys():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid cursor'
+            )
+        if self.sort_column is None:
+            return self.key > position[self.key.key]
+
+        after_key = (
+            self.key > position[self.key.key]
+            if self.sort_type == SortType.ASC
+            else self.key < position[self.key.key]
+        )
+
+        column, value = self.sort_column, position[self.sort_column.key]
+        if value is None:
+            same_value = and_(column.is_(None), after_key)
+            further = column.isnot(None) if self.sort_type == SortType.ASC else false()
+        else:
+            same_value = and_(column == value, after_key)
+            further = (
+                column > value
+                if self.sort_type == SortType.ASC
+                else or_(column < value, column.is_(None))
+            )
+        return or_(same_value, further)
+
+
+class Pagination:
+    """Page-number or cursor (keyset) pagination query parameters.
+
+    With `page` rows are fetched with OFFSET and the total number of pages
+    is counted unless `include_total` is false. With `cursor` the listing
+    seeks past the last row of the previous page and is not counted.
+    """
+
+    def __init__(
+        self,
+        page: Optional[int] = Query(None, ge=1),
+        cursor: Optional[str] = Query(None),
+        include_total: bool = Query(True),
+        page_size: int = Depends(get_page_size),
+    ) -> None:
+        self.page = page
+        self.cursor = cursor
+        self.include_total = include_total
+        self.page_size = int(page_size)
+
+    async def paginate(  # pylint: disable=too-many-arguments
+        self,
+        session: AsyncSession,
+        statement: Any,
+        keyset: Optional[Keyset],
+        top: Optional[int] = None,
+        total_items: Optional[int] = None,
+        count_key: Optional[Hashable] = None,
+    ) -> Tuple[List[Any], Dict[str, Any]]:
+        """Fetch one page of `statement` ordered by `keyset`.
+
+        Without a keyset the statement must be ordered already, and its
+        cursors fall back to storing the number of rows served. Total pages
+        are computed from `total_items` when the caller keeps a counter of
+        the rows, or from the count cached under `count_key`; otherwise the
+        rows are counted.
+        """
+        if keyset is not None:
+            statement = statement.order_by(*keyset.order_by())
+        if self.cursor is None and self.page is None:
+            rows = await fetch_all(session, statement.limit(top) if top else statement)
+            return rows, {'page': 1, 'total_pages': 1, 'next_cursor': None}
+
+        total_pages = None
+        if self.cursor is not None:
+            position = decode_cursor(self.cursor)
+            served = position.get('served', 0)
+            if keyset is not None:
+                statement = statement.where(keyset.after(position))
+            else:
+                statement = statement.offset(served)
+        else:
+            assert self.page is not None
+            served = (self.page - 1) * self.page_size
+            if self.include_total:
+                total_pages = await self.count_pages(
+                    session,
+                    statement.limit(top) if top else statement,
+                    total_items,
+                    count_key,
+                )
+            statement = statement.offset(served)
+
+        limit = self.page_size if top is None else min(self.page_size, top - served)
+        rows = await fetch_all(session, statement.limit(limit + 1)) if limit > 0 else []
+
+        next_cursor = None
+        if len(rows) > limit and (top is None or served + limit < top):
+            position = keyset.position(rows[limit - 1]) if keyset is not None else {}
+            if top is not None or keyset is None:
+                position['served'] = served + limit
+            next_cursor = encode_cursor(position)
+
+        return rows[:limit], {
+            'page': self.page if self.cursor is None else None,
+            'total_pages': total_pages,
+            'next_cursor': next_cursor,
+        }
+
+    async def count_pages(
+        self,
+        session: AsyncSession,
+        statement: Any,
+        total_items: Optional[int],
+        count_key: Optional[Hashable],
+    ) -> int:
+        assert self.page is not None
+        if total_items is None and count_key is not None:
+            cached = count_cache.get(count_key)
+            # A cached count may be outdated if the page seems to be past the end
+            if cached is not None and (self.page - 1) * self.page_size < max(cached, 1):
+                total_items = cached
+        if total_items is None:
+            total_items = await count_rows(session, statement)
+            if count_key is not None:
+                count_cache.set(count_key, total_items)
+        return get_and_check_total_pages(self.page, total_items, self.page_size)
+
+
+async def fetch_all(session: AsyncSession, statement: Any) -> List[Any]:
+    result = await session.execute(statement)
+    if len(statement.column_descriptions) == 1:
+        return result.scalars().all()
+    return result.all()
@@ -0,0 +1,149 @@
+"""Admission control of write requests.
+
+Each client gets a token bucket holding up to RATE_LIMIT_BURST requests,
+refilled with RATE_LIMIT_PER_SECOND requests every second. The buckets
+live in memory, or in Redis when RATE_LIMIT_REDIS_URL is set, so that all
+processes share them. WRITE_CONCURRENCY_LIMIT caps the writes a process
+handles at once. Requests over either limit are rejected before they are
+authenticated, so they cost neither bcrypt nor a database lock.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple, Union
+
+from app.config import (
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_PER_SECOND,
+    RATE_LIMIT_REDIS_URL,
+    WRITE_CONCURRENCY_LIMIT,
+)
+
+logger = logging.getLogger(__name__)
+
+# Buckets kept in memory, the least recently used ones are dropped first
+MAX_BUCKETS = 100000
+
+# Refills the bucket KEYS[1] and takes a request from it atomically. ARGV are
+# the rate, the burst and the current time. Returns the seconds to wait
+TOKEN_BUCKET_SCRIPT = '''
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or burst
+local elapsed = math.max(0, now - (tonumber(bucket[2]) or now))
+tokens = math.min(burst, tokens + elapsed * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+'''
+
+
+class TokenBuckets:
+    """Thread-safe token buckets of clients in memory."""
+
+    def __init__(self, rate: float, burst: int, maxsize: int = MAX_BUCKETS) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self._buckets: OrderedDict[str, Tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    async def acquire(self, key: str) -> float:
+        """Take a request from the bucket of the client.
+
+        Returns 0 if the request is admitted and the seconds until the
+        bucket has a request again otherwise.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                tokens, wait = tokens - 1, 0.0
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class RedisTokenBuckets:
+    """Token buckets of clients in Redis, shared by all processes.
+
+    Requests are admitted when Redis is unavailable.
+    """
+
+    def __init__(self, url: str, rate: float, burst: int) -> None:
+        import redis.asyncio  # pylint: disable=import-outside-toplevel
+
+        self.rate = rate
+        self.burst = burst
+        self.client = redis.asyncio.from_url(url)
+        self._script = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def acquire(self, key: str) -> float:
+        try:
+            wait = await self._script(
+                keys=[f'filmash:rate:{key}'], args=[self.rate, self.burst, time.time()]
+            )
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('Failed to check the rate limit of %s', key)
+            return 0.0
+        return float(wait)
+
+
+RateLimiter = Union[TokenBuckets, RedisTokenBuckets]
+
+
+def create_rate_limiter(
+    rate: Optional[float] = RATE_LIMIT_PER_SECOND,
+    burst: int = RATE_LIMIT_BURST,
+    redis_url: Optional[str] = RATE_LIMIT_REDIS_URL,
+) -> Optional[RateLimiter]:
+    if not rate:
+        return None
+    if redis_url:
+        return RedisTokenBuckets(redis_url, rate, burst)
+    return TokenBuckets(rate, burst)
+
+
+class ConcurrencyLimit:
+    """Number of requests in progress, admitted up to `limit`.
+
+    Used only from the event loop, so checking and counting need no lock.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.active = 0
+
+    def try_enter(self) -> bool:
+        if self.active >= self.limit:
+            return False
+        self.active += 1
+        return True
+
+    def exit(self) -> None:
+        self.active -= 1
+
+
+def create_write_limit(
+    limit: Optional[int] = WRITE_CONCURRENCY_LIMIT,
+) -> Optional[ConcurrencyLimit]:
+    return ConcurrencyLimit(limit) if limit else None
@@ -0,0 +1,28 @@
+"""Recompute film counters and weighted ratings from reviews.
+
+Usage: python -m app.reconcile [--db-url URL]
+
+Repairs counters after changes buffered with COUNTERS_FLUSH_INTERVAL were
+lost, e.g. when the server was killed. Run it while the server is stopped,
+as changes still buffered by a running server would be counted twice.
+"""
+import argparse
+from typing import List, Optional
+
+import app.db.utils as db_utils
+from app.config import DB_URL
+from app.db.counters import reconcile_counters
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--db-url', default=DB_URL)
+    args = parser.parse_args(argv)
+
+    with db_utils.open_db(args.db_url).begin() as connection:
+        films = reconcile_counters(connection)
+    print(f'Recomputed counters of {films} films')
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
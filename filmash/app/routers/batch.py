@@ -0,0 +1,72 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import Film
+from app.db.utils import apply_comment, apply_score, get_session, save_batch
+from app.routers.films import (
+    render_posted_comment,
+    render_posted_score,
+    update_cached_film,
+)
+from app.utils import auth, limit_writes
+from app.validators import ReviewsBatchRequestBodyModel, ScoresBatchRequestBodyModel
+
+router = APIRouter()
+
+
+def render_results(
+    items: List[Tuple[int, Any]],
+    films: List[Optional[Film]],
+    render: Callable[[Film, Any], Dict[str, Any]],
+) -> Dict[str, Any]:
+    results = []
+    for (film_id, value), film in zip(items, films):
+        if film is None:
+            results.append(
+                {
+                    'film_id': film_id,
+                    'status': status.HTTP_404_NOT_FOUND,
+                    'detail': f'Film with specified id = {film_id} does not exist',
+                }
+            )
+        else:
+            results.append(
+                {
+                    'film_id': film_id,
+                    'status': status.HTTP_200_OK,
+                    **render(film, value),
+                }
+            )
+    return {'results': results}
+
+
+@router.post('/scores:batch', dependencies=[Depends(limit_writes)])
+async def post_scores_batch(
+    body: ScoresBatchRequestBodyModel,
+    user_id: int = Depends(auth),
+    session: AsyncSession = Depends(get_session),
+) -> Any:
+    items = [(item.film_id, item.score) for item in body.scores]
+    films = await session.run_sync(save_batch, apply_score, user_id, items)
+    for film in films:
+        if film is not None:
+            update_cached_film(film, score_changed=True)
+
+    return render_results(items, films, render_posted_score)
+
+
+@router.post('/comments:batch', dependencies=[Depends(limit_writes)])
+async def post_comments_batch(
+    body: ReviewsBatchRequestBodyModel,
+    user_id: int = Depends(auth),
+    session: AsyncSession = Depends(get_session),
+) -> Any:
+    items = [(item.film_id, item.comment) for item in body.comments]
+    films = await session.run_sync(save_batch, apply_comment, user_id, items)
+    for film in films:
+        if film is not None:
+            update_cached_film(film, score_changed=False)
+
+    return render_results(items, films, render_posted_comment)
@@ -0,0 +1,29 @@
+from typing import Any
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.utils import get_session
+from app.exporter import stream_export
+from app.utils import auth
+
+router = APIRouter()
+
+NDJSON = 'application/x-ndjson'
+
+
+@router.get('/films:export', response_class=StreamingResponse)
+async def export_films(
+    _: int = Depends(auth),
+    session: AsyncSession = Depends(get_session),
+) -> Any:
+    return StreamingResponse(stream_export(session, 'films'), media_type=NDJSON)
+
+
+@router.get('/reviews:export', response_class=StreamingResponse)
+async def export_reviews(
+    _: int = Depends(auth),
+    session: AsyncSession = Depends(get_session),
+) -> Any:
+    return StreamingResponse(stream_export(session, 'reviews'), media_type=NDJSON)
@@ -0,0 +1,295 @@
+from datetime import datetime
+from typing import Any, Dict, List, NoReturn, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import CachedResponse
+from app.db.models import Film, Review
+from app.db.search import filter_by_name
+from app.db.utils import get_session, save_comment, save_score
+from app.metrics import TimedJSONResponse
+from app.pagination import Keyset, Pagination
+from app.utils import auth, leaderboard, limit_writes, response_cache
+from app.validators import ReviewRequestBodyModel, ScoreRequestBodyModel, SortType
+
+router = APIRouter()
+
+
+def raise_film_not_found(film_id: int) -> NoReturn:
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f'Film with specified id = {film_id} does not exist',
+    )
+
+
+async def get_film_or_404(session: AsyncSession, film_id: int) -> Film:
+    film = await session.get(Film, film_id)
+    if not film:
+        raise_film_not_found(film_id)
+    return film
+
+
+def update_cached_film(film: Film, score_changed: bool) -> None:
+    """Move the film on the leaderboard and drop cached responses that show
+    the film or may now include it.
+
+    A top-N listing is affected by a new score only if it already lists
+    the film, or the film has enough votes and the listing has free places
+    or the film's new average gets into it.
+    """
+    if score_changed:
+        leaderboard.update(film)
+
+    def affected(key: Any, cached: CachedResponse) -> bool:
+        if key == ('film', film.id):
+            return True
+        if key[0] != 'top' or not score_changed:
+            return False
+        _, year, top, min_votes = key
+        if year is not None and year != film.year:
+            return False
+        films = cached.content['films']
+        if any(item['film_id'] == film.id for item in films):
+            return True
+        if film.total_scores < (min_votes or 0):
+            return False
+        last_score = films[-1]['avg_score'] if films else None
+        return len(films) < top or last_score is None or film.avg_score >= last_score
+
+    response_cache.evict(affected)
+
+
+def update_flushed_films(films: List[Film]) -> None:
+    for film in films:
+        update_cached_film(film, score_changed=True)
+
+
+def update_rated_films() -> None:
+    # Weighted ratings of all films have changed
+    leaderboard.clear()
+    response_cache.clear()
+
+
+def render_posted_score(film: Film, score: int) -> Dict[str, Any]:
+    return {
+        'film_name': film.name,
+        'posted_score': score,
+        'avg_score': film.avg_score,
+        'total_scores': film.total_scores,
+    }
+
+
+def render_posted_comment(film: Film, comment: str) -> Dict[str, Any]:
+    return {
+        'film_name': film.name,
+        'posted_comment': comment,
+        'total_comments': film.total_comments,
+    }
+
+
+@router.post('/films/{film_id}/scores', dependencies=[Depends(limit_writes)])
+async def post_new_score(
+    film_id: int,
+    body: ScoreRequestBodyModel,
+    user_id: int = Depends(auth),
+    session: AsyncSession = Depends(get_session),
+) -> Any:
+    film = await session.run_sync(save_score, user_id, film_id, body.score)
+    if not film:
+        raise_film_not_found(film_id)
+    update_cached_film(film, score_changed=True)
+
+    return render_posted_score(film, body.score)
+
+
+@router.get('/films/{film_id}/scores')
+async def get_scores_by_film(
+    film_id: int,
+    pagination: Pagination = Depends(),
+    _: int = Depends(auth),
+    session: AsyncSession = Depends(get_session),
+) -> Any:
+    film = await get_film_or_404(session, film_id)
+
+    reviews_query = select(Review.user_id, Review.score).filter(
+        Review.film_id == film_id, Review.score.isnot(None)
+    )
+    reviews, page_info = await pagination.paginate(
+        session, reviews_query, Keyset(Review.user_id), total_items=film.total_scores
+    )
+
+    return TimedJSONResponse(
+        {
+            'film_name': film.name,
+            'avg_score': film.avg_score,
+            'total_scores': film.total_scores,
+            'scores': [
+                {'user_id': review.user_id, 'score': review.score} for review in reviews
+            ],
+            **page_info,
+        }
+    )
+
+
+@router.post('/films/{film_id}/comments', dependencies=[Depends(limit_writes)])
+async def post_new_comment(
+    film_id: int,
+    body: ReviewRequestBodyModel,
+    user_id: int = Depends(auth),
+    session: AsyncSession = Depends(get_session),
+) -> Any:
+    film = await session.run_sync(save_comment, user_id, film_id, body.comment)
+    if not film:
+        raise_film_not_found(film_id)
+    update_cached_film(film, score_changed=False)
+
+    return render_posted_comment(film, body.comment)
+
+
+@router.get('/films/{film_id}/comments')
+async def get_comments_by_film(
+    film_id: int,
+    pagination: Pagination = Depends(),
+    _: int = Depends(auth),
+    session: AsyncSession = Depends(get_session),
+) -> Any:
+    film = await get_film_or_404(session, film_id)
+
+    reviews_query = select(Review.user_id, Review.comment).filter(
+        Review.film_id == film_id, Review.comment.isnot(None)
+    )
+    reviews, page_info = await pagination.paginate(
+        session,
+        reviews_query,
+        Keyset(Review.user_id),
+        total_items=film.total_comments,
+    )
+
+    return TimedJSONResponse(
+        {
+            'film_name': film.name,
+            'comments': [
+                {'user_id': review.user_id, 'comment': review.comment}
+                for review in reviews
+            ],
+            **page_info,
+        }
+    )
+
+
+@router.get('/films/{film_id}')
+async def get_film_info(
+    film_id: int,
+    request: Request,
+    _: int = Depends(auth),
+    session: AsyncSession = Depends(get_session),
+) -> Any:
+    async def render() -> Any:
+        film = await get_film_or_404(session, film_id)
+        return {
+            'film_id': film.id,
+            'film_name': film.name,
+            'avg_score': film.avg_score,
+            'total_scores': film.total_scores,
+            'total_comments': film.total_comments,
+            'weighted_rating': film.weighted_rating,
+        }
+
+    return await response_cache.respond(request, ('film', film_id), render)
+
+
+# Columns of listed films, including the sort columns that keyset cursors need
+LISTED_FILM_COLUMNS = (
+    Film.id,
+    Film.name,
+    Film.year,
+    Film.avg_score,
+    Film.weighted_rating,
+)
+
+
+def render_films(films: List[Any], page_info: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'films': [
+            {
+                'film_id': film.id,
+                'film_name': film.name,
+                'year': film.year,
+                'avg_score': film.avg_score,
+                'weighted_rating': film.weighted_rating,
+            }
+            for film in films
+        ],
+        **page_info,
+    }
+
+
+@router.get('/films')
+async def get_filtered_films(  # pylint: disable=too-many-arguments
+    request: Request,
+    substring: Optional[str] = Query(None, max_length=100),
+    search: Optional[str] = Query(None, max_length=100),
+    year: Optional[int] = Query(None, ge=1895, le=datetime.now().year),
+    sort_by_avg_score: Optional[SortType] = Query(None),
+    sort_by_weighted_rating: Optional[SortType] = Query(None),
+    top: Optional[int] = Query(None, ge=1),
+    min_votes: Optional[int] = Query(None, ge=0),
+    pagination: Pagination = Depends(),
+    session: AsyncSession = Depends(get_session),
+    _: str = Depends(auth),
+) -> Any:
+    if sort_by_avg_score and sort_by_weighted_rating:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Films can be sorted either by average score or by weighted rating',
+        )
+    films_query = select(*LISTED_FILM_COLUMNS)
+
+    films_query, relevance = filter_by_name(films_query, substring, search)
+
+    if year:
+        films_query = films_query.filter(Film.year == year)
+    if min_votes:
+        films_query = films_query.filter(Film.total_scores >= min_votes)
+
+    sort_column, sort_type = (
+        (Film.weighted_rating, sort_by_weighted_rating)
+        if sort_by_weighted_rating
+        else (Film.avg_score, sort_by_avg_score)
+    )
+    keyset: Optional[Keyset] = Keyset(Film.id, sort_column, sort_type)
+    if relevance is not None and not sort_type:
+        films_query, keyset = films_query.order_by(relevance, Film.id), None
+
+    async def render() -> Any:
+        films, page_info = await pagination.paginate(
+            session,
+            films_query,
+            keyset,
+            top=top,
+            count_key=('films', substring, search, year, min_votes, top),
+        )
+        return render_films(films, page_info)
+
+    if (
+        top
+        and sort_by_avg_score == SortType.DESC
+        and not (substring or search)
+        and pagination.page is None
+        and pagination.cursor is None
+    ):
+
+        async def render_top() -> Any:
+            films = await leaderboard.top(session, year, top, min_votes)
+            if films is None:
+                return await render()
+            return render_films(
+                films, {'page': 1, 'total_pages': 1, 'next_cursor': None}
+            )
+
+        return await response_cache.respond(
+            request, ('top', year, top, min_votes), render_top
+        )
+    return TimedJSONResponse(await render())
@@ -0,0 +1,13 @@
+from typing import Any
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.metrics import CONTENT_TYPE, render_metrics
+
+router = APIRouter()
+
+
+@router.get('/metrics', response_class=PlainTextResponse)
+async def get_metrics() -> Any:
+    return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
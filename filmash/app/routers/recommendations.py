@@ -0,0 +1,55 @@
+from typing import Any, Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import Film, SimilarFilm
+from app.db.utils import get_session
+from app.metrics import TimedJSONResponse
+from app.routers.films import get_film_or_404
+from app.utils import auth
+
+router = APIRouter()
+
+
+@router.get('/films/{film_id}/similar')
+async def get_similar_films(
+    film_id: int,
+    top: Optional[int] = Query(None, ge=1),
+    _: int = Depends(auth),
+    session: AsyncSession = Depends(get_session),
+) -> Any:
+    """Films most similar to the film by scores, as of the last refresh with
+    `app.similarity`."""
+    similar_query = (
+        select(
+            SimilarFilm.similar_film_id,
+            SimilarFilm.similarity,
+            Film.name,
+            Film.year,
+        )
+        .join(Film, Film.id == SimilarFilm.similar_film_id)
+        .filter(SimilarFilm.film_id == film_id)
+        .order_by(SimilarFilm.rank)
+        .limit(top)
+    )
+    similar_films = (await session.execute(similar_query)).all()
+    if not similar_films:
+        # Films without neighbours are told apart from missing ones only here
+        await get_film_or_404(session, film_id)
+
+    return TimedJSONResponse(
+        {
+            'film_id': film_id,
+            'similar_films': [
+                {
+                    'film_id': similar.similar_film_id,
+                    'film_name': similar.name,
+                    'year': similar.year,
+                    'similarity': similar.similarity,
+                }
+                for similar in similar_films
+            ],
+        }
+    )
@@ -0,0 +1,115 @@
+from typing import Any, Dict, List
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import TOKEN_TTL
+from app.db.models import Film, Review
+from app.db.utils import create_user, get_session, get_user_by_login
+from app.metrics import TimedJSONResponse
+from app.pagination import Keyset, Pagination
+from app.tokens import create_token
+from app.utils import (
+    auth,
+    basic_auth,
+    get_hashed_password,
+    invalidate_credentials,
+    limit_writes,
+    run_bcrypt,
+)
+from app.validators import UserRequestBodyModel
+
+router = APIRouter()
+
+
+@router.post('/users', dependencies=[Depends(limit_writes)])
+async def register_new_user(
+    body: UserRequestBodyModel, session: AsyncSession = Depends(get_session)
+) -> Any:
+    login, password = body.login, body.password
+
+    if await get_user_by_login(session, login):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail='User with specified login already exists',
+        )
+
+    hashed_password = await run_bcrypt(get_hashed_password, password.get_secret_value())
+    try:
+        user = await create_user(session, login, hashed_password)
+    except IntegrityError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail='User with specified login already exists',
+        ) from e
+
+    invalidate_credentials(login)
+    return {'registered_login': user.login}
+
+
+@router.post('/token', dependencies=[Depends(limit_writes)])
+async def issue_token(user_id: int = Depends(basic_auth)) -> Any:
+    return {
+        'access_token': create_token(user_id),
+        'token_type': 'bearer',
+        'expires_in': TOKEN_TTL,
+    }
+
+
+async def get_film_names(session: AsyncSession, film_ids: List[int]) -> Dict[int, str]:
+    if not film_ids:
+        return {}
+    result = await session.execute(
+        select(Film.id, Film.name).filter(Film.id.in_(film_ids))
+    )
+    return dict(result.all())
+
+
+@router.get('/users/{login}/reviews')
+async def get_reviews_by_user(
+    login: str,
+    pagination: Pagination = Depends(),
+    _: int = Depends(auth),
+    session: AsyncSession = Depends(get_session),
+) -> Any:
+    """List the user's reviews ordered by film id.
+
+    Pages seek by (user_id, film_id) and the user's reviews are counted from
+    `ix_Review_user_id_film_id` alone. Names of the films of a page are
+    fetched by id afterwards, so no query joins all the user's reviews.
+    """
+    user = await get_user_by_login(session, login)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f'User with specified login = {login} does not exist',
+        )
+
+    reviews_query = select(Review.film_id, Review.score, Review.comment).filter(
+        Review.user_id == user.id
+    )
+    reviews, page_info = await pagination.paginate(
+        session,
+        reviews_query,
+        Keyset(Review.film_id),
+        count_key=('reviews', user.id),
+    )
+    film_names = await get_film_names(session, [review.film_id for review in reviews])
+
+    return TimedJSONResponse(
+        {
+            'login': login,
+            'reviews': [
+                {
+                    'film_id': review.film_id,
+                    'film_name': film_names.get(review.film_id),
+                    'score': review.score,
+                    'comment': review.comment,
+                }
+                for review in reviews
+            ],
+            **page_info,
+        }
+    )
@@ -0,0 +1,257 @@
+"""Offline computation of similar films from co-rating data.
+
+Usage: python -m app.similarity [--top K] [--full] [--db-url URL]
+
+Films are compared by the cosine similarity of their columns in the sparse
+user x film matrix of scores, and the `top` most similar films of each film
+are stored in `SimilarFilm`. A refresh recomputes only the films whose
+scores changed since the last run, which are found by digests of their
+scores, and the films whose neighbours may have changed with them, unless
+they are most of the films.
+"""
+import argparse
+import time
+from itertools import chain
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Set
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import bindparam, delete, insert, select
+from sqlalchemy.engine import Connection, Engine
+
+import app.db.utils as db_utils
+from app.config import DB_URL, SIMILAR_FILMS
+from app.db.models import Review, SimilarFilm, SimilarityInput
+
+# Films whose similarities are computed at once, bounds the memory used
+CHUNK_SIZE = 1000
+# Changed films whose listings are looked up with one query
+LISTED_CHUNK_SIZE = 500
+# Share of films from which recomputing only the affected ones is slower than
+# recomputing all of them
+FULL_REFRESH_SHARE = 0.7
+
+
+class RefreshStats(NamedTuple):
+    films: int = 0
+    changed: int = 0
+    refreshed: int = 0
+    seconds: float = 0.0
+
+    def __str__(self) -> str:
+        return (
+            f'{self.films} rated films, {self.changed} changed, '
+            f'{self.refreshed} refreshed in {self.seconds:.1f}s'
+        )
+
+
+class Scores(NamedTuple):
+    film_ids: Any  # sorted ids of the films in the columns of `matrix`
+    matrix: Any  # users x films, each column scaled to unit length
+    digests: Any
+
+
+def digest_scores(user_ids: Any, scores: Any, columns: Any, films: int) -> Any:
+    """Order-independent 64-bit digests of the (user, score) pairs of each film."""
+    x = (user_ids.astype(np.uint64) << np.uint64(4)) | scores.astype(np.uint64)
+    x ^= x >> np.uint64(30)
+    x *= np.uint64(0xBF58476D1CE4E5B9)
+    x ^= x >> np.uint64(27)
+    x *= np.uint64(0x94D049BB133111EB)
+    x ^= x >> np.uint64(31)
+    digests = np.zeros(films, dtype=np.uint64)
+    np.add.at(digests, columns, x)
+    return digests.view(np.int64)
+
+
+def fetch_array(connection: Connection, query: Any) -> Any:
+    """Integer rows of a query as a 2D array.
+
+    Rows are flattened into the array directly, building it from row objects
+    is several times slower.
+    """
+    result = connection.execute(query)
+    values = np.fromiter(chain.from_iterable(result), dtype=np.int64)
+    return values.reshape(-1, len(result.keys()))
+
+
+def load_scores(connection: Connection) -> Scores:
+    user_ids, film_ids, scores = fetch_array(
+        connection,
+        select(Review.user_id, Review.film_id, Review.score).where(
+            Review.score.isnot(None)
+        ),
+    ).T
+    film_ids, columns = np.unique(film_ids, return_inverse=True)
+    users, user_rows = np.unique(user_ids, return_inverse=True)
+    matrix = sparse.csc_matrix(
+        (scores.astype(np.float64), (user_rows, columns)),
+        shape=(len(users), len(film_ids)),
+    )
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    scales = np.divide(1, norms, out=np.zeros_like(norms), where=norms > 0)
+    return Scores(
+        film_ids=film_ids,
+        matrix=(matrix @ sparse.diags(scales)).tocsc(),
+        digests=digest_scores(user_ids, scores, columns, len(film_ids)),
+    )
+
+
+def find_co_rated_films(scores: Scores, changed: Set[int]) -> Set[int]:
+    """Films sharing raters with the `changed` films."""
+    columns = np.flatnonzero(np.isin(scores.film_ids, list(changed)))
+    co_rated = scores.matrix[:, columns].T @ scores.matrix
+    return set(scores.film_ids[np.unique(co_rated.indices)].tolist())
+
+
+def find_listing_films(connection: Connection, changed: Set[int]) -> Set[int]:
+    """Films that listed the `changed` films as neighbours.
+
+    Only the matching rows are read. An index by `similar_film_id` would slow
+    down writing the neighbours more than it speeds this up.
+    """
+    changed_ids = sorted(changed)
+    listing: Set[int] = set()
+    for start in range(0, len(changed_ids), LISTED_CHUNK_SIZE):
+        listing.update(
+            connection.execute(
+                select(SimilarFilm.film_id).where(
+                    SimilarFilm.similar_film_id.in_(
+                        changed_ids[start : start + LISTED_CHUNK_SIZE]
+                    )
+                )
+            ).scalars()
+        )
+    return listing
+
+
+def select_top(neighbours: Any, similarities: Any, top: int) -> Any:
+    """Indices of the `top` most similar neighbours, ties broken by film id."""
+    if len(similarities) > top:
+        # Partial selection, widened to all neighbours tied with the last one
+        cutoff = -np.partition(-similarities, top - 1)[top - 1]
+        candidates = np.flatnonzero(similarities >= cutoff)
+    else:
+        candidates = np.arange(len(similarities))
+    order = np.lexsort((neighbours[candidates], -similarities[candidates]))
+    return candidates[order[:top]]
+
+
+def compute_similar_films(
+    scores: Scores, columns: Any, top: int
+) -> Iterator[List[Dict[str, Any]]]:
+    """Yield rows of `SimilarFilm` for the films in `columns` in chunks."""
+    for start in range(0, len(columns), CHUNK_SIZE):
+        chunk = columns[start : start + CHUNK_SIZE]
+        similarities = (scores.matrix.T @ scores.matrix[:, chunk]).tocsc()
+        rows = []
+        for i, column in enumerate(chunk):
+            span = slice(similarities.indptr[i], similarities.indptr[i + 1])
+            neighbours, values = similarities.indices[span], similarities.data[span]
+            keep = (neighbours != column) & (values > 0)
+            neighbours, values = neighbours[keep], values[keep]
+            film_id = int(scores.film_ids[column])
+            for rank, k in enumerate(
+                select_top(scores.film_ids[neighbours], values, top)
+            ):
+                rows.append(
+                    {
+                        'film_id': film_id,
+                        'rank': rank + 1,
+                        'similar_film_id': int(scores.film_ids[neighbours[k]]),
+                        'similarity': min(float(values[k]), 1.0),
+                    }
+                )
+        yield rows
+
+
+def refresh_similar_films(
+    engine: Engine, top: int = SIMILAR_FILMS, full: bool = False
+) -> RefreshStats:
+    """Recompute the stored neighbours of films affected by changed scores.
+
+    `full` recomputes the neighbours of all films, which is needed after
+    `top` has changed, and so does a refresh affecting FULL_REFRESH_SHARE of
+    the films or more. Runs in one transaction, so readers see either the old
+    or the new neighbours.
+    """
+    started = time.perf_counter()
+    with engine.begin() as connection:
+        scores = load_scores(connection)
+        stored = (
+            {}
+            if full
+            else dict(
+                connection.execute(
+                    select(SimilarityInput.film_id, SimilarityInput.scores_digest)
+                ).all()
+            )
+        )
+        current = dict(zip(scores.film_ids.tolist(), scores.digests.tolist()))
+        changed = {
+            film_id
+            for film_id, digest in current.items()
+            if stored.get(film_id) != digest
+        } | (stored.keys() - current.keys())
+        if not changed and not full:
+            return RefreshStats(
+                films=len(current), seconds=time.perf_counter() - started
+            )
+
+        limit = FULL_REFRESH_SHARE * len(current)
+        refresh_all = full or len(changed) >= limit
+        if not refresh_all:
+            affected = changed | find_co_rated_films(scores, changed)
+            if len(affected) < limit:
+                affected |= find_listing_films(connection, changed)
+            refresh_all = len(affected) >= limit
+        if refresh_all:
+            connection.execute(delete(SimilarFilm))
+            connection.execute(delete(SimilarityInput))
+            affected = inputs = set(current)
+        else:
+            connection.execute(
+                delete(SimilarFilm).where(SimilarFilm.film_id == bindparam('film')),
+                [{'film': film_id} for film_id in affected],
+            )
+            connection.execute(
+                delete(SimilarityInput).where(
+                    SimilarityInput.film_id == bindparam('film')
+                ),
+                [{'film': film_id} for film_id in changed],
+            )
+            inputs = changed & current.keys()
+        columns = np.flatnonzero(np.isin(scores.film_ids, list(affected)))
+        for rows in compute_similar_films(scores, columns, top):
+            if rows:
+                connection.execute(insert(SimilarFilm), rows)
+
+        digests = [
+            {'film_id': film_id, 'scores_digest': current[film_id]}
+            for film_id in inputs
+        ]
+        if digests:
+            connection.execute(insert(SimilarityInput), digests)
+    return RefreshStats(
+        films=len(current),
+        changed=len(changed),
+        refreshed=len(affected),
+        seconds=time.perf_counter() - started,
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Refresh similar films.')
+    parser.add_argument('--top', type=int, default=SIMILAR_FILMS)
+    parser.add_argument(
+        '--full', action='store_true', help='recompute all films, e.g. for a new --top'
+    )
+    parser.add_argument('--db-url', default=DB_URL)
+    args = parser.parse_args(argv)
+
+    engine = db_utils.open_db(args.db_url)
+    print(refresh_similar_films(engine, args.top, args.full))
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
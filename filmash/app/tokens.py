@@ -0,0 +1,72 @@
+"""Short-lived access tokens in the JWT format signed with HMAC-SHA256.
+
+A token carries the user id and its expiry time, so it is checked without
+querying the database. Tokens stay valid until they expire.
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import secrets
+import time
+from typing import Any, Dict, Optional
+
+from app.config import TOKEN_SECRET, TOKEN_TTL
+
+_secret = TOKEN_SECRET.encode() if TOKEN_SECRET else secrets.token_bytes(32)
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def encode_segment(value: Dict[str, Any]) -> bytes:
+    data = json.dumps(value, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(data).rstrip(b'=')
+
+
+def decode_segment(segment: bytes) -> Any:
+    try:
+        return json.loads(
+            base64.urlsafe_b64decode(segment + b'=' * (-len(segment) % 4))
+        )
+    except (binascii.Error, ValueError) as e:
+        raise InvalidToken from e
+
+
+HEADER = encode_segment({'alg': 'HS256', 'typ': 'JWT'})
+
+
+def sign(message: bytes) -> bytes:
+    digest = hmac.new(_secret, message, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b'=')
+
+
+def create_token(
+    user_id: int, ttl: int = TOKEN_TTL, now: Optional[float] = None
+) -> str:
+    issued_at = int(time.time() if now is None else now)
+    payload = encode_segment(
+        {'sub': str(user_id), 'iat': issued_at, 'exp': issued_at + ttl}
+    )
+    message = HEADER + b'.' + payload
+    return (message + b'.' + sign(message)).decode()
+
+
+def get_token_user(token: str, now: Optional[float] = None) -> int:
+    """Return the user id of a valid token, raise InvalidToken otherwise."""
+    parts = token.encode().split(b'.')
+    if len(parts) != 3 or parts[0] != HEADER:
+        raise InvalidToken
+    message = parts[0] + b'.' + parts[1]
+    if not hmac.compare_digest(sign(message), parts[2]):
+        raise InvalidToken
+    payload = decode_segment(parts[1])
+    try:
+        expires_at, user_id = int(payload['exp']), int(payload['sub'])
+    except (KeyError, TypeError, ValueError) as e:
+        raise InvalidToken from e
+    if expires_at <= (time.time() if now is None else now):
+        raise InvalidToken
+    return user_id
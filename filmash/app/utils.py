@@ -1,13 +1,91 @@
+import asyncio
+import hashlib
+import hmac
+import math
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, AsyncIterator, Callable, NoReturn, Optional, TypeVar
+
 import bcrypt
-from fastapi import Depends, HTTPException, status
-from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from sqlalchemy.orm import Session
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security import (
+    HTTPAuthorizationCredentials,
+    HTTPBasic,
+    HTTPBasicCredentials,
+    HTTPBearer,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import ResponseCache, TTLCache
+from app.config import (
+    AUTH_CACHE_SIZE,
+    AUTH_CACHE_TTL,
+    BCRYPT_WORKERS,
+    COUNT_CACHE_SIZE,
+    COUNT_CACHE_TTL,
+    LEADERBOARD_MIN_VOTES,
+    LEADERBOARD_TTL,
+    PAGE_SIZE,
+    RESPONSE_CACHE_SIZE,
+    RESPONSE_CACHE_TTL,
+)
+from app.db.utils import get_session, get_user_by_login
+from app.leaderboard import Leaderboard
+from app.metrics import REJECTED_REQUESTS, measure
+from app.ratelimit import create_rate_limiter, create_write_limit
+from app.tokens import InvalidToken, get_token_user
 
-from app.config import PAGE_SIZE
-from app.db.models import User
-from app.db.utils import get_session
+T = TypeVar('T')
 
 security = HTTPBasic()
+optional_basic = HTTPBasic(auto_error=False)
+bearer = HTTPBearer(auto_error=False)
+
+# Recently verified (login, password digest) pairs mapped to user ids,
+# so repeated requests with the same credentials skip bcrypt
+credentials_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+_digest_key = secrets.token_bytes(32)
+
+# Rendered film info and top-N listings, evicted when film aggregates change
+response_cache = ResponseCache(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+
+# Estimated numbers of rows of listings without denormalized counters
+count_cache = TTLCache(maxsize=COUNT_CACHE_SIZE, ttl=COUNT_CACHE_TTL)
+
+# Films sorted by average score, moved when scores are posted
+leaderboard = Leaderboard(min_votes=LEADERBOARD_MIN_VOTES, ttl=LEADERBOARD_TTL)
+
+# Admission control of write requests, both disabled unless configured
+rate_limiter = create_rate_limiter()
+write_limit = create_write_limit()
+
+bcrypt_executor: Optional[ProcessPoolExecutor] = None
+
+
+def start_bcrypt_executor(max_workers: int = BCRYPT_WORKERS) -> None:
+    global bcrypt_executor  # pylint: disable=global-statement
+    if max_workers > 0 and bcrypt_executor is None:
+        bcrypt_executor = ProcessPoolExecutor(max_workers=max_workers)
+
+
+def shutdown_bcrypt_executor() -> None:
+    global bcrypt_executor  # pylint: disable=global-statement
+    if bcrypt_executor is not None:
+        bcrypt_executor.shutdown()
+        bcrypt_executor = None
+
+
+async def run_bcrypt(func: Callable[..., T], *args: Any) -> T:
+    """Run CPU-bound bcrypt work without blocking the event loop.
+
+    Uses the process pool when it is started and the threadpool otherwise.
+    """
+    with measure('bcrypt'):
+        if bcrypt_executor is None:
+            return await run_in_threadpool(func, *args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(bcrypt_executor, func, *args)
 
 
 def get_hashed_password(password: str) -> str:
@@ -15,27 +93,112 @@ def get_hashed_password(password: str) -> str:
     return bcrypt.hashpw(password.encode(), salt).decode()
 
 
-def auth(
+def check_password(password: str, hashed_password: str) -> bool:
+    return bcrypt.checkpw(password.encode(), hashed_password.encode())
+
+
+def get_password_digest(password: str) -> bytes:
+    return hmac.new(_digest_key, password.encode(), hashlib.sha256).digest()
+
+
+def invalidate_credentials(login: str) -> None:
+    credentials_cache.evict(lambda key, _: key[0] == login)
+
+
+async def basic_auth(
     credentials: HTTPBasicCredentials = Depends(security),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_session),
 ) -> int:
-    user = session.query(User).filter_by(login=credentials.username).first()
-    correct_username = user.login if user else None
-    correct_password = (
-        bcrypt.checkpw(credentials.password.encode(), user.hashed_password.encode())
-        if user
-        else None
+    cache_key = (credentials.username, get_password_digest(credentials.password))
+    user_id = credentials_cache.get(cache_key)
+    if user_id is not None:
+        return user_id
+
+    user = await get_user_by_login(session, credentials.username)
+    correct_password = user is not None and await run_bcrypt(
+        check_password, credentials.password, user.hashed_password
     )
-    if not (correct_username and correct_password):
+    if not (user and correct_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='Incorrect login or password',
             headers={'WWW-Authenticate': 'Basic'},
         )
 
+    credentials_cache.set(cache_key, user.id)
     return user.id
 
 
+async def auth(
+    token: Optional[HTTPAuthorizationCredentials] = Depends(bearer),
+    credentials: Optional[HTTPBasicCredentials] = Depends(optional_basic),
+    session: AsyncSession = Depends(get_session),
+) -> int:
+    """Authenticate with a bearer token from `POST /token` or with HTTP Basic.
+
+    Tokens are verified without the database, Basic credentials are checked
+    with `basic_auth`.
+    """
+    if token is not None:
+        try:
+            return get_token_user(token.credentials)
+        except InvalidToken as e:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail='Invalid or expired token',
+                headers={'WWW-Authenticate': 'Bearer'},
+            ) from e
+    if credentials is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail='Not authenticated',
+            headers={'WWW-Authenticate': 'Basic'},
+        )
+    return await basic_auth(credentials, session)
+
+
+def get_client_key(request: Request) -> str:
+    """The user of a valid bearer token, otherwise the client's address."""
+    scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() == 'bearer':
+        try:
+            return f'user:{get_token_user(credentials)}'
+        except InvalidToken:
+            pass
+    return f'ip:{request.client.host if request.client else None}'
+
+
+def reject_request(reason: str, retry_after: float) -> NoReturn:
+    REJECTED_REQUESTS.inc(reason)
+    raise HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail='Too many requests',
+        headers={'Retry-After': str(max(1, math.ceil(retry_after)))},
+    )
+
+
+async def limit_writes(request: Request) -> AsyncIterator[None]:
+    """Admit a write request under the rate and concurrency limits.
+
+    Runs before authentication, so clients are told apart by tokens and
+    addresses only, and Basic credentials are not checked for rejected
+    requests.
+    """
+    if rate_limiter is not None:
+        wait = await rate_limiter.acquire(get_client_key(request))
+        if wait > 0:
+            reject_request('rate_limit', wait)
+    if write_limit is None:
+        yield
+        return
+    if not write_limit.try_enter():
+        reject_request('concurrency', 1)
+    try:
+        yield
+    finally:
+        write_limit.exit()
+
+
 def get_and_check_total_pages(page: int, total_items: int, page_size: int) -> int:
     total_pages = (total_items - 1) // page_size + 1 if total_items != 0 else 1
     if page > total_pages:
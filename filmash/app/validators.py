@@ -1,7 +1,12 @@
 from enum import Enum
+from typing import Any, List, Sequence, TypeVar
 
 from pydantic import BaseModel, SecretStr, validator
 
+from app.config import BATCH_MAX_SIZE
+
+T = TypeVar('T', bound=Sequence[Any])
+
 
 class UserRequestBodyModel(BaseModel):
     login: str
@@ -40,6 +45,32 @@ class ReviewRequestBodyModel(BaseModel):
         return value
 
 
+def check_batch_size(items: T) -> T:
+    if not 1 <= len(items) <= BATCH_MAX_SIZE:
+        raise ValueError(f'must contain from 1 to {BATCH_MAX_SIZE} items')
+    return items
+
+
+class ScoreBatchItemModel(ScoreRequestBodyModel):
+    film_id: int
+
+
+class ScoresBatchRequestBodyModel(BaseModel):
+    scores: List[ScoreBatchItemModel]
+
+    _check_size = validator('scores', allow_reuse=True)(check_batch_size)
+
+
+class ReviewBatchItemModel(ReviewRequestBodyModel):
+    film_id: int
+
+
+class ReviewsBatchRequestBodyModel(BaseModel):
+    comments: List[ReviewBatchItemModel]
+
+    _check_size = validator('comments', allow_reuse=True)(check_batch_size)
+
+
 class SortType(str, Enum):
     ASC = 'asc'
     DESC = 'desc'
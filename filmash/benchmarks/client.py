@@ -0,0 +1,76 @@
+import asyncio
+import json
+from typing import Any, Dict, Optional, Tuple
+
+
+class HTTPClient:
+    """Minimal keep-alive HTTP/1.1 client, so that load generation stays cheap."""
+
+    def __init__(self, host: str, port: int, headers: Dict[str, str]) -> None:
+        self.host = host
+        self.port = port
+        self.headers = headers
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def connect(self) -> None:
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except ConnectionError:
+                pass
+        self._reader = self._writer = None
+
+    async def request(
+        self, method: str, path: str, body: Any = None
+    ) -> Tuple[int, bytes]:
+        try:
+            return await self._request(method, path, body)
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            # The server drops the connection after an unhandled error
+            await self.close()
+            raise ConnectionError('Connection to the server was lost') from e
+
+    async def _request(self, method: str, path: str, body: Any) -> Tuple[int, bytes]:
+        if self._reader is None or self._writer is None:
+            await self.connect()
+        assert self._reader is not None and self._writer is not None
+
+        payload = json.dumps(body).encode() if body is not None else b''
+        headers = {
+            'Host': f'{self.host}:{self.port}',
+            'Content-Length': str(len(payload)),
+            **self.headers,
+        }
+        if body is not None:
+            headers['Content-Type'] = 'application/json'
+        head = ''.join(f'{name}: {value}\r\n' for name, value in headers.items())
+        self._writer.write(f'{method} {path} HTTP/1.1\r\n{head}\r\n'.encode() + payload)
+        await self._writer.drain()
+
+        status_line = await self._reader.readline()
+        if not status_line:
+            raise ConnectionError('Server closed the connection')
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while (line := await self._reader.readline()) not in (b'\r\n', b''):
+            name, _, value = line.decode().partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get('transfer-encoding') == 'chunked':
+            return status, await self._read_chunked()
+        length = int(response_headers.get('content-length', 0))
+        return status, await self._reader.readexactly(length)
+
+    async def _read_chunked(self) -> bytes:
+        assert self._reader is not None
+        chunks = []
+        while size := int((await self._reader.readline()).strip(), 16):
+            chunks.append(await self._reader.readexactly(size))
+            await self._reader.readline()
+        await self._reader.readline()
+        return b''.join(chunks)
@@ -0,0 +1,131 @@
+"""Compare the sync and async database modes under the same load.
+
+Usage: python -m benchmarks.db_modes [--films N] [--requests N] [--concurrency N]
+"""
+import argparse
+import asyncio
+import random
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+
+import app.db.utils as db_utils
+from app.config import DBMode
+from app.db.counters import reconcile_counters
+from app.db.models import Film, Review, User
+from app.utils import get_hashed_password
+from benchmarks.utils import Call, basic_auth_header, run_load, run_server
+
+LOGIN, PASSWORD = 'bench', 'bench'
+TITLE_WORDS = [
+    'Dark',
+    'Last',
+    'Summer',
+    'City',
+    'Night',
+    'Star',
+    'River',
+    'War',
+    'Love',
+    'Ghost',
+]
+
+
+def seed_database(
+    url: str, films: int, users: int, reviews: Optional[int] = None
+) -> None:
+    """Create `films` films and `users` users with `reviews` random reviews.
+
+    Every review has a score and every fourth one a comment. By default
+    every user reviews ten films.
+    """
+    db_utils.init_db(url, DBMode.SYNC)
+    hashed_password = get_hashed_password(PASSWORD)
+    if reviews is None:
+        reviews = users * min(films, 10)
+    with db_utils.create_session() as session:
+        session.add(User(login=LOGIN, hashed_password=hashed_password))
+        session.bulk_save_objects(
+            [
+                User(login=f'user_{i}', hashed_password=hashed_password)
+                for i in range(users)
+            ]
+        )
+        session.bulk_save_objects(
+            [
+                Film(
+                    name=' '.join(random.sample(TITLE_WORDS, 2) + [str(i)]),
+                    year=random.randint(1950, 2020),
+                )
+                for i in range(films)
+            ]
+        )
+        session.flush()
+        # Users are numbered from 2 after the benchmark user, films from 5
+        # after the initial ones
+        session.bulk_insert_mappings(
+            Review,
+            [
+                {
+                    'user_id': pair // films + 2,
+                    'film_id': pair % films + 5,
+                    'score': random.randint(0, 10),
+                    'comment': 'Seen it' if i % 4 == 0 else None,
+                }
+                for i, pair in enumerate(random.sample(range(users * films), reviews))
+            ],
+        )
+        reconcile_counters(session.connection())
+    # Close pooled connections so that the server can switch the journal mode
+    assert db_utils.engine is not None
+    db_utils.engine.dispose()
+
+
+def make_calls(films: int, total: int) -> List[Call]:
+    calls = []
+    for _ in range(total):
+        film_id = random.randint(1, films)
+        calls.append(
+            random.choice(
+                [
+                    Call('GET', f'/films/{film_id}'),
+                    Call('GET', f'/films/{film_id}/scores?page=1'),
+                    Call('GET', '/films?sort_by_avg_score=desc&top=10'),
+                    Call('POST', f'/films/{film_id}/scores', {'score': 7}),
+                ]
+            )
+        )
+    return calls
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--films', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    args = parser.parse_args()
+
+    calls = make_calls(args.films, args.requests)
+    print(f'{"mode":<8}{"rps":>10}{"p50, ms":>10}{"p99, ms":>10}{"errors":>8}')
+    for mode in DBMode:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            url = f'sqlite:///{Path(tmp_dir) / "bench.db"}'
+            seed_database(url, args.films, args.users)
+            with run_server({'DB_URL': url, 'DB_MODE': mode.value}) as port:
+                stats = asyncio.run(
+                    run_load(
+                        port,
+                        calls,
+                        args.concurrency,
+                        headers=basic_auth_header(LOGIN, PASSWORD),
+                    )
+                )
+        print(
+            f'{mode.value:<8}{stats["rps"]:>10.1f}{stats["p50_ms"]:>10.1f}'
+            f'{stats["p99_ms"]:>10.1f}{stats["errors"]:>8}'
+        )
+
+
+if __name__ == '__main__':
+    main()
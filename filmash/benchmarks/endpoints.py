@@ -0,0 +1,188 @@
+"""Measure the throughput and latency of every kind of request.
+
+Usage: python -m benchmarks.endpoints [--films N] [--users N] [--reviews N]
+    [--requests N] [--concurrency N] [--output FILE] [--compare FILE]
+
+A fresh database is seeded with random films, users and reviews, then each
+scenario is run on its own against the same server. Results are written as
+JSON together with the git revision, so that a run can be compared with the
+results of another commit via --compare.
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from app.config import DBMode
+from benchmarks.db_modes import LOGIN, PASSWORD, TITLE_WORDS, seed_database
+from benchmarks.utils import ROOT_DIR, Call, basic_auth_header, run_load, run_server
+
+RESULTS_DIR = ROOT_DIR / 'benchmark-results'
+WARMUP_REQUESTS = 50
+
+# Every scenario makes a call for a random film id and a random generator
+SCENARIOS: Dict[str, Callable[[int, random.Random], Call]] = {
+    'score': lambda film_id, rng: Call(
+        'POST', f'/films/{film_id}/scores', {'score': rng.randint(0, 10)}
+    ),
+    'comment': lambda film_id, rng: Call(
+        'POST', f'/films/{film_id}/comments', {'comment': 'Worth seeing'}
+    ),
+    'film': lambda film_id, rng: Call('GET', f'/films/{film_id}'),
+    'scores_page': lambda film_id, rng: Call('GET', f'/films/{film_id}/scores?page=1'),
+    'comments_page': lambda film_id, rng: Call(
+        'GET', f'/films/{film_id}/comments?page=1'
+    ),
+    'top': lambda film_id, rng: Call('GET', '/films?sort_by_avg_score=desc&top=10'),
+    'year_listing': lambda film_id, rng: Call(
+        'GET',
+        f'/films?year={rng.randint(1950, 2020)}&sort_by_weighted_rating=desc&page=1',
+    ),
+    'search': lambda film_id, rng: Call(
+        'GET', f'/films?search={rng.choice(TITLE_WORDS)}&page=1'
+    ),
+    'substring': lambda film_id, rng: Call(
+        'GET', f'/films?substring={rng.choice(TITLE_WORDS).lower()}&page=1'
+    ),
+}
+
+
+def make_calls(scenario: str, films: int, total: int, rng: random.Random) -> List[Call]:
+    make_call = SCENARIOS[scenario]
+    return [make_call(rng.randint(1, films), rng) for _ in range(total)]
+
+
+def get_revision() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'],
+            cwd=ROOT_DIR,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+async def run_scenarios(
+    port: int, scenarios: List[str], args: argparse.Namespace, rng: random.Random
+) -> Dict[str, Dict[str, float]]:
+    headers = basic_auth_header(LOGIN, PASSWORD)
+    results = {}
+    for scenario in scenarios:
+        warmup = make_calls(scenario, args.films, WARMUP_REQUESTS, rng)
+        await run_load(port, warmup, args.concurrency, headers)
+        calls = make_calls(scenario, args.films, args.requests, rng)
+        results[scenario] = await run_load(port, calls, args.concurrency, headers)
+    return results
+
+
+def print_results(results: Dict[str, Dict[str, float]]) -> None:
+    print(f'{"scenario":<16}{"rps":>10}{"p50, ms":>10}{"p99, ms":>10}{"errors":>8}')
+    for scenario, stats in results.items():
+        print(
+            f'{scenario:<16}{stats["rps"]:>10.1f}{stats["p50_ms"]:>10.1f}'
+            f'{stats["p99_ms"]:>10.1f}{stats["errors"]:>8}'
+        )
+
+
+def write_report(
+    args: argparse.Namespace, results: Dict[str, Dict[str, float]]
+) -> Path:
+    revision = get_revision()
+    report: Dict[str, Any] = {
+        'revision': revision,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'settings': {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ('scenario', 'output', 'compare', 'threshold')
+        },
+        'results': results,
+    }
+    output: Path = args.output or RESULTS_DIR / f'{revision}.json'
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2) + '\n')
+    return output
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    threshold: float,
+) -> List[str]:
+    """Print the change against `baseline` and return the regressed scenarios.
+
+    A scenario regresses when its throughput drops or its p99 latency grows
+    by more than `threshold` percent.
+    """
+    regressed = []
+    print(f'{"scenario":<16}{"rps, %":>10}{"p50, %":>10}{"p99, %":>10}')
+    for scenario, stats in results.items():
+        old = baseline.get(scenario)
+        if old is None:
+            continue
+        changes = [
+            (stats[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            for key in ('rps', 'p50_ms', 'p99_ms')
+        ]
+        worse = changes[0] < -threshold or changes[2] > threshold
+        if worse:
+            regressed.append(scenario)
+        print(
+            f'{scenario:<16}{changes[0]:>+10.1f}{changes[1]:>+10.1f}'
+            f'{changes[2]:>+10.1f}{"  regressed" if worse else ""}'
+        )
+    return regressed
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--films', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--reviews', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=1000, help='per scenario')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument(
+        '--mode', choices=[mode.value for mode in DBMode], default='async'
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--scenario', action='append', choices=SCENARIOS, help='defaults to all'
+    )
+    parser.add_argument(
+        '--output', type=Path, help='defaults to benchmark-results/<revision>.json'
+    )
+    parser.add_argument('--compare', type=Path, help='results of an earlier run')
+    parser.add_argument('--threshold', type=float, default=10, help='percent')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+    scenarios = args.scenario or list(SCENARIOS)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        url = f'sqlite:///{Path(tmp_dir) / "bench.db"}'
+        seed_database(url, args.films, args.users, args.reviews)
+        with run_server({'DB_URL': url, 'DB_MODE': args.mode}) as port:
+            results = asyncio.run(run_scenarios(port, scenarios, args, rng))
+
+    print_results(results)
+    output = write_report(args, results)
+    print(f'Results are written to {output}')
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        print(f'\nCompared with {baseline["revision"]}:')
+        if compare(results, baseline['results'], args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
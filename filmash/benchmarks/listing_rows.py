@@ -0,0 +1,117 @@
+"""Measure the per-row cost of building film and score listings.
+
+Usage: python -m benchmarks.listing_rows [--rows N] [--repeat N]
+
+Compares loading ORM objects and rendering through FastAPI's
+`jsonable_encoder` and the standard `json` module with selecting only the
+listed columns and rendering them straight with orjson, as the endpoints do.
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import app.db.utils as db_utils
+from app.db.models import Film, Review
+from app.metrics import TimedJSONResponse
+from app.routers.films import LISTED_FILM_COLUMNS, render_films
+from benchmarks.db_modes import seed_database
+
+PAGE_INFO = {'page': 1, 'total_pages': 1, 'next_cursor': None}
+SCORED_FILM_ID = 1
+
+
+def render_scores(reviews: List[Any]) -> Dict[str, Any]:
+    return {
+        'scores': [
+            {'user_id': review.user_id, 'score': review.score} for review in reviews
+        ],
+        **PAGE_INFO,
+    }
+
+
+def films_orm(session: Session, rows: int) -> bytes:
+    films = session.execute(select(Film).limit(rows)).scalars().all()
+    return JSONResponse(jsonable_encoder(render_films(films, PAGE_INFO))).body
+
+
+def films_columns(session: Session, rows: int) -> bytes:
+    films = session.execute(select(*LISTED_FILM_COLUMNS).limit(rows)).all()
+    return TimedJSONResponse(render_films(films, PAGE_INFO)).body
+
+
+def scores_statement(rows: int) -> Any:
+    return (
+        select(Review.user_id, Review.score)
+        .filter(Review.film_id == SCORED_FILM_ID)
+        .order_by(Review.user_id)
+        .limit(rows)
+    )
+
+
+def scores_encoded(session: Session, rows: int) -> bytes:
+    reviews = session.execute(scores_statement(rows)).all()
+    return JSONResponse(jsonable_encoder(render_scores(reviews))).body
+
+
+def scores_direct(session: Session, rows: int) -> bytes:
+    reviews = session.execute(scores_statement(rows)).all()
+    return TimedJSONResponse(render_scores(reviews)).body
+
+
+VARIANTS: Dict[str, Callable[[Session, int], bytes]] = {
+    'films, ORM + jsonable_encoder': films_orm,
+    'films, columns + orjson': films_columns,
+    'scores, jsonable_encoder': scores_encoded,
+    'scores, orjson': scores_direct,
+}
+
+
+def seed_scores(rows: int) -> None:
+    """Give the first film a score from every seeded user."""
+    with db_utils.create_session() as session:
+        session.bulk_insert_mappings(
+            Review,
+            [
+                {'user_id': user_id, 'film_id': SCORED_FILM_ID, 'score': user_id % 11}
+                for user_id in range(2, rows + 2)
+            ],
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        seed_database(
+            f'sqlite:///{Path(tmp_dir) / "bench.db"}', args.rows, args.rows, reviews=0
+        )
+        seed_scores(args.rows)
+        print(f'{"listing":<32}{"ms per page":>12}{"us per row":>12}')
+        for name, variant in VARIANTS.items():
+            timings = []
+            for _ in range(args.repeat):
+                with db_utils.create_session() as session:
+                    started = time.perf_counter()
+                    variant(session, args.rows)
+                    timings.append(time.perf_counter() - started)
+            elapsed = statistics.median(timings)
+            print(
+                f'{name:<32}{elapsed * 1000:>12.1f}{elapsed / args.rows * 1e6:>12.2f}'
+            )
+        assert db_utils.engine is not None
+        db_utils.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+import asyncio
+import base64
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+from benchmarks.client import HTTPClient
+
+HOST = '127.0.0.1'
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+
+class Call(NamedTuple):
+    method: str
+    path: str
+    body: Any = None
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def basic_auth_header(login: str, password: str) -> Dict[str, str]:
+    token = base64.b64encode(f'{login}:{password}'.encode()).decode()
+    return {'Authorization': f'Basic {token}'}
+
+
+@contextmanager
+def run_server(env: Dict[str, str], timeout: float = 30) -> Iterator[int]:
+    """Start `python -m app.main` with the given settings and yield its port."""
+    port = get_free_port()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'app.main'],
+        cwd=ROOT_DIR,
+        env={**os.environ, **env, 'HOST': HOST, 'PORT': str(port)},
+        stdout=subprocess.DEVNULL,
+        stderr=None if os.environ.get('BENCH_VERBOSE') else subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                socket.create_connection((HOST, port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline or process.poll() is not None:
+                    raise RuntimeError('Server did not start') from None
+                time.sleep(0.1)
+        yield port
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def percentile(latencies: List[float], q: float) -> float:
+    if len(latencies) < 2:
+        return latencies[0] if latencies else 0.0
+    return statistics.quantiles(latencies, n=100, method='inclusive')[int(q) - 1]
+
+
+async def run_load(
+    port: int,
+    calls: List[Call],
+    concurrency: int,
+    headers: Optional[Dict[str, str]] = None,
+) -> Dict[str, float]:
+    """Replay `calls` over `concurrency` connections and report latency stats."""
+    queue: 'asyncio.Queue[Call]' = asyncio.Queue()
+    for call in calls:
+        queue.put_nowait(call)
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker() -> None:
+        nonlocal errors
+        client = HTTPClient(HOST, port, headers or {})
+        try:
+            while not queue.empty():
+                call = queue.get_nowait()
+                started = time.perf_counter()
+                try:
+                    status, _ = await client.request(call.method, call.path, call.body)
+                except ConnectionError:
+                    status = 599
+                latencies.append(time.perf_counter() - started)
+                errors += status >= 400
+        finally:
+            await client.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
@@ -0,0 +1,67 @@
+"""Compare the SQLite engine profiles under concurrent score submissions.
+
+Usage: python -m benchmarks.write_contention [--films N] [--requests N]
+    [--concurrency N] [--write-ratio R] [--flush-interval SECONDS]
+
+With --films 1 every score updates the same film row; --flush-interval
+enables write-behind film counters for comparison.
+"""
+import argparse
+import asyncio
+import random
+import tempfile
+from pathlib import Path
+from typing import List
+
+from app.db.engine import SQLITE_PROFILES
+from benchmarks.db_modes import LOGIN, PASSWORD, seed_database
+from benchmarks.utils import Call, basic_auth_header, run_load, run_server
+
+
+def make_calls(films: int, total: int, write_ratio: float) -> List[Call]:
+    calls = []
+    for _ in range(total):
+        film_id = random.randint(1, films)
+        if random.random() < write_ratio:
+            calls.append(
+                Call(
+                    'POST', f'/films/{film_id}/scores', {'score': random.randint(0, 10)}
+                )
+            )
+        else:
+            calls.append(Call('GET', f'/films/{film_id}/scores?page=1'))
+    return calls
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--films', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--write-ratio', type=float, default=0.5)
+    parser.add_argument('--flush-interval', help='COUNTERS_FLUSH_INTERVAL')
+    args = parser.parse_args()
+    env = {'COUNTERS_FLUSH_INTERVAL': args.flush_interval or ''}
+
+    calls = make_calls(args.films, args.requests, args.write_ratio)
+    print(f'{"profile":<10}{"rps":>10}{"p50, ms":>10}{"p99, ms":>10}{"errors":>8}')
+    for profile in SQLITE_PROFILES:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            url = f'sqlite:///{Path(tmp_dir) / "bench.db"}'
+            seed_database(url, args.films, args.users)
+            with run_server({**env, 'DB_URL': url, 'SQLITE_PROFILE': profile}) as port:
+                headers = basic_auth_header(LOGIN, PASSWORD)
+                # Warm up so that bcrypt checks of new credentials are not measured
+                asyncio.run(run_load(port, calls[:1], 1, headers=headers))
+                stats = asyncio.run(
+                    run_load(port, calls, args.concurrency, headers=headers)
+                )
+        print(
+            f'{profile:<10}{stats["rps"]:>10.1f}{stats["p50_ms"]:>10.1f}'
+            f'{stats["p99_ms"]:>10.1f}{stats["errors"]:>8}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Measure read latency while one client floods the server with scores.
+
+Usage: python -m benchmarks.write_storm [--films N] [--reads N] [--writes N]
+    [--rate R] [--burst N] [--write-concurrency N]
+
+Reads of film info run alongside the storm of scores without limits and with
+the rate and concurrency limits of write requests enabled.
+"""
+import argparse
+import asyncio
+import random
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks.db_modes import LOGIN, PASSWORD, seed_database
+from benchmarks.utils import Call, basic_auth_header, run_load, run_server
+
+READ_CONCURRENCY = 4
+WRITE_CONCURRENCY = 64
+
+
+async def run_storm(
+    port: int, reads: List[Call], writes: List[Call]
+) -> Tuple[Dict[str, float], Optional[Dict[str, float]]]:
+    headers = basic_auth_header(LOGIN, PASSWORD)
+    # Warm up so that bcrypt checks of new credentials are not measured
+    await run_load(port, reads[:1], 1, headers=headers)
+    if not writes:
+        return await run_load(port, reads, READ_CONCURRENCY, headers=headers), None
+    read_stats, write_stats = await asyncio.gather(
+        run_load(port, reads, READ_CONCURRENCY, headers=headers),
+        run_load(port, writes, WRITE_CONCURRENCY, headers=headers),
+    )
+    return read_stats, write_stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--films', type=int, default=1000)
+    parser.add_argument('--reads', type=int, default=2000)
+    parser.add_argument('--writes', type=int, default=4000)
+    parser.add_argument('--rate', default='50', help='RATE_LIMIT_PER_SECOND')
+    parser.add_argument('--burst', default='50', help='RATE_LIMIT_BURST')
+    parser.add_argument(
+        '--write-concurrency', default='4', help='WRITE_CONCURRENCY_LIMIT'
+    )
+    args = parser.parse_args()
+    limits = {
+        'RATE_LIMIT_PER_SECOND': args.rate,
+        'RATE_LIMIT_BURST': args.burst,
+        'WRITE_CONCURRENCY_LIMIT': args.write_concurrency,
+    }
+    reads = [
+        Call('GET', f'/films/{random.randint(1, args.films)}')
+        for _ in range(args.reads)
+    ]
+    writes = [
+        Call('POST', f'/films/{random.randint(1, args.films)}/scores', {'score': 5})
+        for _ in range(args.writes)
+    ]
+    scenarios: List[Tuple[str, Dict[str, str], List[Call]]] = [
+        ('reads only', {}, []),
+        ('storm', {}, writes),
+        ('storm, limited', limits, writes),
+    ]
+
+    print(
+        f'{"scenario":<16}{"read p50, ms":>14}{"read p99, ms":>14}'
+        f'{"write rps":>11}{"rejected":>10}'
+    )
+    for name, env, calls in scenarios:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            url = f'sqlite:///{Path(tmp_dir) / "bench.db"}'
+            seed_database(url, args.films, users=100)
+            with run_server({**env, 'DB_URL': url}) as port:
+                read_stats, write_stats = asyncio.run(run_storm(port, reads, calls))
+        write_columns = (
+            f'{write_stats["rps"]:>11.1f}{write_stats["errors"]:>10}'
+            if write_stats
+            else f'{"-":>11}{"-":>10}'
+        )
+        print(
+            f'{name:<16}{read_stats["p50_ms"]:>14.1f}{read_stats["p99_ms"]:>14.1f}'
+            + write_columns
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -2,27 +2,46 @@
 
 import base64
 from contextlib import contextmanager
-from typing import Any, Iterator
+from typing import Any, AsyncIterator, Callable, Iterator
 
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker
 
 import app.utils as utils_module
-from app.db.models import Film, Review, User
+from app.config import DBMode
+from app.db.adapter import SyncSessionAdapter
+from app.db.engine import create_async_db_engine, create_sync_engine
+from app.db.models import Film, Review, ScoreStats, User
 from app.db.utils import add_initial_data, get_session
 from app.main import app
+from app.metrics import clear_metrics
+from tests.postgres import get_test_db_url
 
-test_engine = create_engine('sqlite:///test.db')
+TEST_DB_URL = get_test_db_url()
+test_engine = create_sync_engine(TEST_DB_URL)
+test_async_engine = create_async_db_engine(TEST_DB_URL)
 TestingSessionLocal = sessionmaker(bind=test_engine)
+TestingAsyncSessionLocal = sessionmaker(
+    bind=test_async_engine, class_=AsyncSession, expire_on_commit=False
+)
 
+sqlite_only = pytest.mark.skipif(
+    test_engine.dialect.name != 'sqlite', reason='SQLite specific'
+)
 
-@pytest.fixture(autouse=True)
-def create_test_database():
+
+@pytest.fixture(autouse=True, params=list(DBMode), ids=lambda mode: mode.value)
+def create_test_database(request):
     import app.db.models as models  # pylint: disable=import-outside-toplevel
 
-    app.dependency_overrides[get_session] = get_test_session
+    app.dependency_overrides[get_session] = make_get_test_session(request.param)
+    utils_module.credentials_cache.clear()
+    utils_module.response_cache.clear()
+    utils_module.leaderboard.clear()
+    utils_module.count_cache.clear()
+    clear_metrics()
     models.Base.metadata.create_all(test_engine)
     with create_test_session() as s:
         add_initial_data(session=s)
@@ -55,9 +74,24 @@ def create_test_session() -> Iterator[Any]:
         new_session.close()
 
 
-def get_test_session():
-    with create_test_session() as s:
-        yield s
+def make_get_test_session(mode: DBMode) -> Callable[[], AsyncIterator[Any]]:
+    async def get_test_session() -> AsyncIterator[Any]:
+        if mode == DBMode.ASYNC:
+            new_session = TestingAsyncSessionLocal()
+        else:
+            new_session = SyncSessionAdapter(
+                TestingSessionLocal(expire_on_commit=False)
+            )
+        try:
+            yield new_session
+            await new_session.commit()
+        except Exception:
+            await new_session.rollback()
+            raise
+        finally:
+            await new_session.close()
+
+    return get_test_session
 
 
 @pytest.fixture
@@ -81,6 +115,19 @@ def credentials(user, password):
     return base64.b64encode(f'{user.login}:{password}'.encode()).decode()
 
 
+@pytest.fixture
+def voters(session, password):
+    hashed_password = utils_module.get_hashed_password(password)
+    users = [
+        User(login=f'voter_{i}', hashed_password=hashed_password) for i in range(3)
+    ]
+    session.add_all(users)
+    session.commit()
+    return [
+        base64.b64encode(f'{user.login}:{password}'.encode()).decode() for user in users
+    ]
+
+
 @pytest.fixture
 def six_users(session, password):
     users = []
@@ -118,21 +165,27 @@ def reviews(user, six_users, film, session):
     session.bulk_save_objects(reviews)
 
     film.avg_score = 7.25
+    film.sum_scores = 29
     film.total_scores = 4
     film.total_comments = 3
 
     session.query(Film).get(1).avg_score = 10
+    session.query(Film).get(1).sum_scores = 10
     session.query(Film).get(1).total_scores = 1
 
     session.query(Film).get(2).avg_score = 3
+    session.query(Film).get(2).sum_scores = 3
     session.query(Film).get(2).total_scores = 1
 
     session.query(Film).get(3).avg_score = 6
+    session.query(Film).get(3).sum_scores = 6
     session.query(Film).get(3).total_scores = 1
 
     session.query(Film).get(4).avg_score = 1
+    session.query(Film).get(4).sum_scores = 1
     session.query(Film).get(4).total_scores = 1
 
+    session.add(ScoreStats(id=1, sum_scores=49, total_scores=8))
     session.commit()
     return reviews
 
@@ -156,3 +209,10 @@ def page_size_3():
     app.dependency_overrides[utils_module.get_page_size] = lambda: 3
     yield
     app.dependency_overrides[utils_module.get_page_size] = utils_module.get_page_size
+
+
+@pytest.fixture
+def bcrypt_process_pool():
+    utils_module.start_bcrypt_executor(max_workers=1)
+    yield utils_module.bcrypt_executor
+    utils_module.shutdown_bcrypt_executor()
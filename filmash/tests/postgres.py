@@ -0,0 +1,78 @@
+"""Database the tests run against.
+
+`TEST_DB_URL` points the tests to an existing database. With `TEST_POSTGRES=1`
+a throwaway PostgreSQL cluster is started with `initdb` and `pg_ctl` from
+`PG_BIN` or `PATH` and removed at exit. Otherwise the tests use SQLite.
+"""
+import atexit
+import os
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+
+SQLITE_URL = 'sqlite:///test.db'
+
+
+def find_program(name: str) -> str:
+    bin_dir = os.environ.get('PG_BIN')
+    program = str(Path(bin_dir) / name) if bin_dir else shutil.which(name)
+    if not program or not os.access(program, os.X_OK):
+        raise RuntimeError(
+            f'{name} not found, set PG_BIN to the PostgreSQL bin directory'
+        )
+    return program
+
+
+def start_local_postgres() -> str:
+    """Start a PostgreSQL server listening on a socket in a temporary directory."""
+    data_dir = tempfile.mkdtemp(prefix='filmash-pg-')
+    pg_ctl = find_program('pg_ctl')
+    subprocess.run(
+        [
+            find_program('initdb'),
+            '-D',
+            data_dir,
+            '-U',
+            'postgres',
+            '-A',
+            'trust',
+            '--no-sync',
+        ],
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    subprocess.run(
+        [
+            pg_ctl,
+            '-D',
+            data_dir,
+            '-l',
+            str(Path(data_dir) / 'server.log'),
+            '-o',
+            f"-k {data_dir} -c listen_addresses='' -c fsync=off",
+            '-w',
+            'start',
+        ],
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+    def stop() -> None:
+        subprocess.run(
+            [pg_ctl, '-D', data_dir, '-m', 'immediate', 'stop'],
+            check=False,
+            stdout=subprocess.DEVNULL,
+        )
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    atexit.register(stop)
+    return f'postgresql://postgres@/postgres?host={data_dir}'
+
+
+def get_test_db_url() -> str:
+    if os.environ.get('TEST_DB_URL'):
+        return os.environ['TEST_DB_URL']
+    if os.environ.get('TEST_POSTGRES'):
+        return start_local_postgres()
+    return SQLITE_URL
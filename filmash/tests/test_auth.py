@@ -0,0 +1,72 @@
+import base64
+import time
+
+import bcrypt
+import pytest
+
+import app.utils as utils_module
+from app.cache import TTLCache
+
+
+@pytest.mark.usefixtures('reviews')
+def test_repeated_requests_skip_bcrypt(client, credentials, film, mocker):
+    checkpw = mocker.spy(bcrypt, 'checkpw')
+
+    for _ in range(3):
+        resp = client.get(
+            url=f'/films/{film.id}',
+            headers={'Authorization': f'Basic {credentials}'},
+        )
+        assert resp.status_code == 200
+
+    assert checkpw.call_count == 1
+    assert utils_module.credentials_cache.hits == 2
+    assert utils_module.credentials_cache.misses == 1
+
+
+def test_wrong_password_is_not_served_from_cache(client, user, credentials, film):
+    client.get(
+        url=f'/films/{film.id}', headers={'Authorization': f'Basic {credentials}'}
+    )
+    wrong = base64.b64encode(f'{user.login}:wrong'.encode()).decode()
+
+    resp = client.get(
+        url=f'/films/{film.id}', headers={'Authorization': f'Basic {wrong}'}
+    )
+
+    assert resp.status_code == 401
+    assert resp.json()['detail'] == 'Incorrect login or password'
+
+
+def test_invalidating_credentials(client, user, credentials, film):
+    client.get(
+        url=f'/films/{film.id}', headers={'Authorization': f'Basic {credentials}'}
+    )
+    assert len(utils_module.credentials_cache) == 1
+
+    utils_module.invalidate_credentials(user.login)
+
+    assert len(utils_module.credentials_cache) == 0
+
+
+def test_cache_entries_expire(mocker):
+    cache = TTLCache(maxsize=10, ttl=5)
+    now = time.monotonic()
+    cache.set('key', 1)
+
+    assert cache.get('key') == 1
+    mocker.patch('app.cache.time.monotonic', return_value=now + 10)
+    assert cache.get('key') is None
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'size': 0}
+
+
+def test_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
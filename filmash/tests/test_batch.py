@@ -0,0 +1,153 @@
+import pytest
+
+from app.db.models import Film, Review
+
+
+@pytest.mark.usefixtures('reviews')
+def test_posting_scores_batch(client, credentials, film, session):
+    resp = client.post(
+        url='/scores:batch',
+        headers={'Authorization': f'Basic {credentials}'},
+        json={
+            'scores': [
+                {'film_id': film.id, 'score': 10},
+                {'film_id': 100, 'score': 5},
+                {'film_id': 1, 'score': 4},
+            ]
+        },
+    )
+
+    assert resp.status_code == 200
+    assert resp.json() == {
+        'results': [
+            {
+                'film_id': film.id,
+                'status': 200,
+                'film_name': 'Inception',
+                'posted_score': 10,
+                'avg_score': 7.8,
+                'total_scores': 5,
+            },
+            {
+                'film_id': 100,
+                'status': 404,
+                'detail': 'Film with specified id = 100 does not exist',
+            },
+            {
+                'film_id': 1,
+                'status': 200,
+                'film_name': 'Lord of the Rings',
+                'posted_score': 4,
+                'avg_score': 4,
+                'total_scores': 1,
+            },
+        ]
+    }
+    assert session.query(Film).get(1).sum_scores == 4
+
+
+@pytest.mark.usefixtures('user')
+def test_posting_same_film_twice_in_batch(client, credentials, film):
+    resp = client.post(
+        url='/scores:batch',
+        headers={'Authorization': f'Basic {credentials}'},
+        json={
+            'scores': [
+                {'film_id': film.id, 'score': 10},
+                {'film_id': film.id, 'score': 6},
+            ]
+        },
+    )
+
+    results = resp.json()['results']
+    assert [result['posted_score'] for result in results] == [10, 6]
+    assert {(result['avg_score'], result['total_scores']) for result in results} == {
+        (6, 1)
+    }
+
+
+@pytest.mark.usefixtures('user')
+def test_posting_invalid_scores_batch(client, credentials, film, session):
+    resp = client.post(
+        url='/scores:batch',
+        headers={'Authorization': f'Basic {credentials}'},
+        json={
+            'scores': [
+                {'film_id': film.id, 'score': 10},
+                {'film_id': film.id, 'score': 11},
+            ]
+        },
+    )
+
+    assert resp.status_code == 422
+    assert resp.json()['detail'] == [
+        {
+            'loc': ['body', 'scores', 1, 'score'],
+            'msg': 'must be between 0 and 10',
+            'type': 'value_error',
+        }
+    ]
+    assert session.query(Review).count() == 0
+
+
+@pytest.mark.usefixtures('user')
+@pytest.mark.parametrize('size', [0, 101])
+def test_posting_batch_of_wrong_size(client, credentials, film, size):
+    resp = client.post(
+        url='/scores:batch',
+        headers={'Authorization': f'Basic {credentials}'},
+        json={'scores': [{'film_id': film.id, 'score': 1}] * size},
+    )
+
+    assert resp.status_code == 422
+    assert resp.json()['detail'][0]['msg'] == 'must contain from 1 to 100 items'
+
+
+@pytest.mark.usefixtures('reviews')
+def test_posting_comments_batch(client, credentials, film):
+    resp = client.post(
+        url='/comments:batch',
+        headers={'Authorization': f'Basic {credentials}'},
+        json={
+            'comments': [
+                {'film_id': film.id, 'comment': 'Mind-bending'},
+                {'film_id': 100, 'comment': 'Who?'},
+            ]
+        },
+    )
+
+    assert resp.status_code == 200
+    assert resp.json() == {
+        'results': [
+            {
+                'film_id': film.id,
+                'status': 200,
+                'film_name': 'Inception',
+                'posted_comment': 'Mind-bending',
+                'total_comments': 4,
+            },
+            {
+                'film_id': 100,
+                'status': 404,
+                'detail': 'Film with specified id = 100 does not exist',
+            },
+        ]
+    }
+
+
+@pytest.mark.usefixtures('user')
+def test_posting_empty_comment_in_batch(client, credentials, film):
+    resp = client.post(
+        url='/comments:batch',
+        headers={'Authorization': f'Basic {credentials}'},
+        json={'comments': [{'film_id': film.id, 'comment': ' '}]},
+    )
+
+    assert resp.status_code == 422
+    assert resp.json()['detail'][0]['loc'] == ['body', 'comments', 0, 'comment']
+
+
+def test_posting_batch_without_auth(client):
+    resp = client.post(url='/scores:batch', json={'scores': []})
+
+    assert resp.status_code == 401
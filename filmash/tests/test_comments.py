@@ -1,5 +1,12 @@
+import threading
+import time
+
 import pytest
 
+from app.db.models import Review
+from app.db.utils import apply_comment, save_comment
+from tests.conftest import TestingSessionLocal
+
 
 @pytest.mark.usefixtures('user')
 def test_posting_comment(client, credentials, film):
@@ -124,3 +131,23 @@ def test_posting_comment_for_nonexistent_film(client, credentials):
 
     assert resp.status_code == 404
     assert data['detail'] == 'Film with specified id = 1000 does not exist'
+
+
+def test_concurrent_first_comments_of_user_count_once(user, film, session):
+    first, second = TestingSessionLocal(), TestingSessionLocal()
+    apply_comment(first, user.id, film.id, 'Hm')
+    thread = threading.Thread(
+        target=save_comment, args=(second, user.id, film.id, 'Great')
+    )
+    thread.start()
+    time.sleep(0.2)
+    first.commit()
+    thread.join()
+    first.close()
+    second.close()
+
+    session.refresh(film)
+    assert film.total_comments == 1
+    assert session.query(Review.comment).filter_by(film_id=film.id).all() == [
+        ('Great',)
+    ]
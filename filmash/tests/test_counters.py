@@ -0,0 +1,159 @@
+import asyncio
+from contextlib import closing, contextmanager
+from typing import Any, Iterator, List
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, func, select, update
+
+import app.db.counters as counters
+from app.db.counters import CounterBuffer, CounterDeltas, flush_counters
+from app.db.models import Film, ScoreStats
+from app.db.utils import apply_score
+from app.main import app
+from app.reconcile import main
+from app.routers.films import update_flushed_films
+from tests.conftest import TestingSessionLocal, create_test_session, test_engine
+
+
+@contextmanager
+def create_flush_session() -> Iterator[Any]:
+    # Flushed films are used after commit like with the app's sessions
+    with closing(TestingSessionLocal(expire_on_commit=False)) as session:
+        yield session
+
+
+@pytest.fixture
+def write_behind(mocker):
+    mocker.patch('app.db.counters.buffer', CounterBuffer())
+    mocker.patch('app.main.create_session', create_flush_session)
+
+
+def post(client, credentials, film_id, kind, body):
+    return client.post(
+        url=f'/films/{film_id}/{kind}',
+        headers={'Authorization': f'Basic {credentials}'},
+        json=body,
+    )
+
+
+def get_counters(session, film_id):
+    return session.execute(
+        select(Film.sum_scores, Film.total_scores, Film.avg_score, Film.total_comments)
+        .where(Film.id == film_id)
+        .execution_options(populate_existing=True)
+    ).one()
+
+
+@pytest.mark.usefixtures('user', 'write_behind')
+def test_counters_change_on_flush(client, credentials, film, session):
+    session.add(ScoreStats(id=1, sum_scores=0, total_scores=0, rated_mean=5))
+    session.commit()
+    post(client, credentials, film.id, 'scores', {'score': 8})
+    post(client, credentials, film.id, 'scores', {'score': 6})
+    post(client, credentials, film.id, 'comments', {'comment': 'Nice!'})
+    post(client, credentials, film.id, 'comments', {'comment': 'Nicer!'})
+
+    assert get_counters(session, film.id) == (0, 0, None, 0)
+    assert counters.buffer.deltas == {film.id: CounterDeltas(6, 1, 1)}
+
+    films = flush_counters(session, counters.buffer)
+
+    assert [flushed.id for flushed in films] == [film.id]
+    assert get_counters(session, film.id) == (6, 1, 6, 1)
+    assert films[0].weighted_rating == pytest.approx(31 / 6)
+    assert len(counters.buffer) == 0
+    assert flush_counters(session, counters.buffer) == []
+
+
+@pytest.mark.usefixtures('user', 'write_behind')
+def test_flushed_films_are_updated_in_caches(client, credentials, film):
+    headers = {'Authorization': f'Basic {credentials}'}
+    post(client, credentials, film.id, 'scores', {'score': 9})
+    assert (
+        client.get(url=f'/films/{film.id}', headers=headers).json()['avg_score'] is None
+    )
+
+    with create_test_session() as session:
+        update_flushed_films(flush_counters(session, counters.buffer))
+
+    assert client.get(url=f'/films/{film.id}', headers=headers).json()['avg_score'] == 9
+
+
+@pytest.mark.usefixtures('write_behind')
+def test_rolled_back_reviews_are_not_counted(user, film):
+    with create_test_session() as session:
+        apply_score(session, user.id, film.id, 7)
+        session.rollback()
+
+    assert len(counters.buffer) == 0
+
+
+@pytest.mark.usefixtures('user', 'write_behind')
+def test_failed_flush_keeps_changes(client, credentials, film, session, mocker):
+    post(client, credentials, film.id, 'scores', {'score': 5})
+    mocker.patch('app.db.counters.rate_films_by_id', side_effect=RuntimeError)
+
+    with pytest.raises(RuntimeError):
+        flush_counters(session, counters.buffer)
+
+    assert get_counters(session, film.id) == (0, 0, None, 0)
+    assert counters.buffer.deltas == {film.id: CounterDeltas(5, 1, 0)}
+
+
+@pytest.mark.usefixtures('user', 'write_behind')
+def test_scoring_missing_film_in_write_behind_mode(client, credentials):
+    resp = post(client, credentials, 100, 'scores', {'score': 5})
+
+    assert resp.status_code == 404
+
+
+@pytest.mark.usefixtures('user', 'write_behind')
+def test_changes_are_flushed_on_shutdown(credentials, film, session):
+    with TestClient(app) as client:
+        post(client, credentials, film.id, 'scores', {'score': 4})
+
+    assert get_counters(session, film.id) == (4, 1, 4, 0)
+
+
+@pytest.mark.usefixtures('user', 'write_behind')
+def test_flushing_periodically(client, credentials, film, mocker):
+    post(client, credentials, film.id, 'scores', {'score': 3})
+    flushed: List[List[Film]] = []
+    mocker.patch(
+        'app.db.counters.flush_counters',
+        side_effect=[RuntimeError, *[[film]] * 100],
+    )
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.new_event_loop().run_until_complete(
+            asyncio.wait_for(
+                counters.flush_periodically(0.01, create_flush_session, flushed.append),
+                0.2,
+            )
+        )
+
+    assert flushed[0] == [film]
+
+
+@pytest.mark.usefixtures('reviews')
+def test_reconciling_counters(film, session, tmp_path, capsys):
+    session.execute(update(Film).values(sum_scores=0, total_scores=0, total_comments=0))
+    session.execute(update(ScoreStats).values(sum_scores=1, total_scores=1))
+    session.commit()
+
+    with test_engine.begin() as connection:
+        assert counters.reconcile_counters(connection) == 5
+
+    assert get_counters(session, film.id) == (29, 4, 7.25, 3)
+    assert get_counters(session, 1) == (10, 1, 10, 0)
+    stats = session.execute(select(ScoreStats)).scalar_one()
+    assert (stats.sum_scores, stats.total_scores, stats.rated_mean) == (49, 8, 6.125)
+
+    url = f'sqlite:///{tmp_path / "reconcile.db"}'
+    main(['--db-url', url])
+    assert capsys.readouterr().out == 'Recomputed counters of 0 films\n'
+    engine = create_engine(url)
+    with engine.connect() as connection:
+        assert connection.execute(select(func.count(Film.id))).scalar_one() == 0
+    engine.dispose()
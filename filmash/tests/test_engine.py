@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, SingletonThreadPool
+
+from app.db.adapter import SyncSessionAdapter
+from app.db.engine import (
+    SQLITE_PROFILES,
+    create_async_db_engine,
+    create_sync_engine,
+    get_engine_options,
+    get_sqlite_profile,
+)
+from app.db.models import Film
+from tests.conftest import TestingSessionLocal, sqlite_only, test_engine
+
+PRAGMAS = ['journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'busy_timeout']
+TUNED = ('wal', 1, -65536, 268435456, 5000)
+
+
+def read_pragmas(engine):
+    with engine.connect() as connection:
+        return tuple(
+            connection.exec_driver_sql(f'PRAGMA {name}').scalar() for name in PRAGMAS
+        )
+
+
+async def read_async_pragmas(url):
+    engine = create_async_db_engine(url)
+    async with engine.connect() as connection:
+        pragmas = [
+            (await connection.exec_driver_sql(f'PRAGMA {name}')).scalar()
+            for name in PRAGMAS
+        ]
+    await engine.dispose()
+    return tuple(pragmas), engine.sync_engine.pool
+
+
+@sqlite_only
+def test_tuned_profile_is_applied():
+    assert read_pragmas(test_engine) == TUNED
+    assert isinstance(test_engine.pool, QueuePool)
+
+
+def test_tuned_profile_is_applied_to_async_engine(tmp_path):
+    loop = asyncio.new_event_loop()
+    pragmas, pool = loop.run_until_complete(
+        read_async_pragmas(f'sqlite:///{tmp_path / "async.db"}')
+    )
+    loop.close()
+
+    assert pragmas == TUNED
+    assert isinstance(pool, AsyncAdaptedQueuePool)
+
+
+def test_default_profile_keeps_sqlite_defaults(tmp_path):
+    engine = create_sync_engine(
+        f'sqlite:///{tmp_path / "default.db"}', SQLITE_PROFILES['default']
+    )
+
+    journal_mode, synchronous, *_ = read_pragmas(engine)
+
+    assert (journal_mode, synchronous) == ('delete', 2)
+    engine.dispose()
+
+
+def test_profile_overrides(mocker):
+    mocker.patch('app.db.engine.SQLITE_BUSY_TIMEOUT', 100)
+
+    assert get_sqlite_profile('default').pragmas() == {
+        'journal_mode': 'DELETE',
+        'busy_timeout': 100,
+    }
+    assert get_sqlite_profile('tuned').busy_timeout == 100
+
+
+@pytest.mark.parametrize('url', ['sqlite://', 'sqlite:///:memory:'])
+def test_memory_database_is_not_pooled(url):
+    engine = create_sync_engine(url)
+
+    assert get_engine_options(engine.url, QueuePool) == {
+        'connect_args': {'check_same_thread': False}
+    }
+    assert isinstance(engine.pool, SingletonThreadPool)
+
+
+async def use_sessions_with_one_slot():
+    slots = asyncio.Semaphore(1)
+    first = SyncSessionAdapter(TestingSessionLocal(), slots)
+    second = SyncSessionAdapter(TestingSessionLocal(), slots)
+    await first.execute(select(Film.id))
+
+    waiting = asyncio.ensure_future(second.get(Film, 1))
+    await asyncio.sleep(0.1)
+    blocked = not waiting.done()
+    await first.close()
+    film = await waiting
+    await second.close()
+    return blocked, film.name, slots.locked()
+
+
+def test_sessions_wait_for_free_slot():
+    loop = asyncio.new_event_loop()
+    blocked, name, locked = loop.run_until_complete(use_sessions_with_one_slot())
+    loop.close()
+
+    assert blocked
+    assert name == 'Lord of the Rings'
+    assert not locked
@@ -0,0 +1,129 @@
+# pylint: disable=redefined-outer-name
+
+import io
+import json
+
+import pytest
+from sqlalchemy import create_engine, func, insert, select
+
+from app.db.migrations import migrate
+from app.db.models import Film
+from app.exporter import main, write_export
+from app.importer import import_films, read_jsonl
+from tests.conftest import test_engine
+
+REVIEWS = [
+    {'user_id': 1, 'film_id': 1, 'score': 10, 'comment': None},
+    {'user_id': 1, 'film_id': 2, 'score': 3, 'comment': None},
+    {'user_id': 1, 'film_id': 3, 'score': 6, 'comment': None},
+    {'user_id': 1, 'film_id': 4, 'score': 1, 'comment': None},
+    {'user_id': 2, 'film_id': 5, 'score': 10, 'comment': None},
+    {'user_id': 3, 'film_id': 5, 'score': 8, 'comment': None},
+    {'user_id': 4, 'film_id': 5, 'score': 9, 'comment': None},
+    {'user_id': 5, 'film_id': 5, 'score': None, 'comment': 'Nice!'},
+    {'user_id': 6, 'film_id': 5, 'score': 2, 'comment': 'Bad..'},
+    {'user_id': 7, 'film_id': 5, 'score': None, 'comment': 'Old but gold.'},
+]
+
+
+FILMS = [
+    {'name': 'Lord of the Rings', 'year': 1999},
+    {'name': 'Harry Potter', 'year': 2003},
+    {'name': 'The Matrix', 'year': 1999},
+]
+
+
+def read_ndjson(text):
+    assert text.endswith('\n')
+    return [json.loads(line) for line in text.splitlines()]
+
+
+@pytest.mark.usefixtures('reviews')
+def test_exporting_reviews(client, credentials):
+    resp = client.get(
+        url='/reviews:export', headers={'Authorization': f'Basic {credentials}'}
+    )
+
+    assert resp.status_code == 200
+    assert resp.headers['Content-Type'] == 'application/x-ndjson'
+    assert read_ndjson(resp.text) == REVIEWS
+
+
+@pytest.mark.usefixtures('reviews')
+def test_exporting_films_in_partitions(client, credentials, mocker):
+    mocker.patch('app.exporter.YIELD_PER', 2)
+    resp = client.get(
+        url='/films:export', headers={'Authorization': f'Basic {credentials}'}
+    )
+
+    films = read_ndjson(resp.text)
+    assert [film['id'] for film in films] == [1, 2, 3, 4, 5]
+    assert films[-1] == {
+        'id': 5,
+        'name': 'Inception',
+        'year': 2010,
+        'avg_score': 7.25,
+        'total_scores': 4,
+        'total_comments': 3,
+        'weighted_rating': None,
+    }
+
+
+def test_export_needs_auth(client):
+    assert client.get(url='/films:export').status_code == 401
+
+
+@pytest.mark.parametrize('yield_per', [1, 3, 1000])
+@pytest.mark.usefixtures('reviews')
+def test_writing_export(yield_per):
+    file = io.StringIO()
+    with test_engine.connect() as connection:
+        write_export(connection, 'reviews', file, yield_per)
+
+    assert read_ndjson(file.getvalue()) == REVIEWS
+
+
+@pytest.fixture
+def db_url(tmp_path):
+    url = f'sqlite:///{tmp_path / "export.db"}'
+    engine = create_engine(url)
+    with engine.begin() as connection:
+        migrate(connection)
+        connection.execute(insert(Film), FILMS)
+    engine.dispose()
+    return url
+
+
+def test_exported_films_can_be_imported(tmp_path, db_url):
+    output = tmp_path / 'films.ndjson'
+    main(['films', '--output', str(output), '--db-url', db_url])
+
+    engine = create_engine(f'sqlite:///{tmp_path / "copy.db"}')
+    Film.metadata.create_all(engine)
+    with output.open() as file:
+        stats = import_films(engine, read_jsonl(file))
+    with engine.connect() as connection:
+        names = connection.execute(select(Film.name).order_by(Film.id)).scalars()
+        assert list(names) == [film['name'] for film in FILMS]
+    engine.dispose()
+    assert (stats.rows, stats.inserted) == (3, 3)
+
+
+def test_export_command_writes_to_stdout(db_url, capsys):
+    main(['films', '--yield-per', '2', '--db-url', db_url])
+
+    films = read_ndjson(capsys.readouterr().out)
+    assert [(film['name'], film['year']) for film in films] == [
+        (film['name'], film['year']) for film in FILMS
+    ]
+
+
+def test_export_command_adds_no_films(tmp_path, capsys):
+    url = f'sqlite:///{tmp_path / "empty.db"}'
+    main(['films', '--db-url', url])
+
+    assert capsys.readouterr().out == ''
+    engine = create_engine(url)
+    with engine.connect() as connection:
+        assert connection.execute(select(func.count(Film.id))).scalar_one() == 0
+    engine.dispose()
@@ -1,3 +1,5 @@
+from unittest.mock import ANY
+
 import pytest
 
 
@@ -17,16 +19,19 @@ def test_filtering_films_by_substring(client, credentials):
                 'film_name': 'Harry Potter',
                 'year': 2003,
                 'avg_score': 3,
+                'weighted_rating': None,
             },
             {
                 'film_id': 3,
                 'film_name': 'Harry Potter 2',
                 'year': 2005,
                 'avg_score': 6,
+                'weighted_rating': None,
             },
         ],
         'page': 1,
         'total_pages': 1,
+        'next_cursor': None,
     }
 
 
@@ -46,16 +51,19 @@ def test_filtering_films_by_year(client, credentials):
                 'film_name': 'Lord of the Rings',
                 'year': 1999,
                 'avg_score': 10,
+                'weighted_rating': None,
             },
             {
                 'film_id': 4,
                 'film_name': 'The Matrix',
                 'year': 1999,
                 'avg_score': 1,
+                'weighted_rating': None,
             },
         ],
         'page': 1,
         'total_pages': 1,
+        'next_cursor': None,
     }
 
 
@@ -75,34 +83,40 @@ def test_sorting_films_descending(client, credentials):
                 'film_name': 'Lord of the Rings',
                 'year': 1999,
                 'avg_score': 10,
+                'weighted_rating': None,
             },
             {
                 'film_id': 5,
                 'film_name': 'Inception',
                 'year': 2010,
                 'avg_score': 7.25,
+                'weighted_rating': None,
             },
             {
                 'film_id': 3,
                 'film_name': 'Harry Potter 2',
                 'year': 2005,
                 'avg_score': 6,
+                'weighted_rating': None,
             },
             {
                 'film_id': 2,
                 'film_name': 'Harry Potter',
                 'year': 2003,
                 'avg_score': 3,
+                'weighted_rating': None,
             },
             {
                 'film_id': 4,
                 'film_name': 'The Matrix',
                 'year': 1999,
                 'avg_score': 1,
+                'weighted_rating': None,
             },
         ],
         'page': 1,
         'total_pages': 1,
+        'next_cursor': None,
     }
 
 
@@ -122,16 +136,19 @@ def test_top_films(client, credentials):
                 'film_name': 'The Matrix',
                 'year': 1999,
                 'avg_score': 1,
+                'weighted_rating': None,
             },
             {
                 'film_id': 2,
                 'film_name': 'Harry Potter',
                 'year': 2003,
                 'avg_score': 3,
+                'weighted_rating': None,
             },
         ],
         'page': 1,
         'total_pages': 1,
+        'next_cursor': None,
     }
 
 
@@ -151,10 +168,12 @@ def test_complex_filter_for_films_page_one(client, credentials):
                 'film_name': 'Lord of the Rings',
                 'year': 1999,
                 'avg_score': 10,
+                'weighted_rating': None,
             }
         ],
         'page': 1,
         'total_pages': 2,
+        'next_cursor': ANY,
     }
 
 
@@ -174,10 +193,12 @@ def test_complex_filter_for_films_page_two(client, credentials):
                 'film_name': 'Inception',
                 'year': 2010,
                 'avg_score': 7.25,
+                'weighted_rating': None,
             }
         ],
         'page': 2,
         'total_pages': 2,
+        'next_cursor': None,
     }
 
 
@@ -194,3 +215,67 @@ def test_getting_film_info(client, film, credentials):
     assert data['avg_score'] == film.avg_score
     assert data['total_scores'] == film.total_scores
     assert data['total_comments'] == film.total_comments
+
+
+@pytest.mark.usefixtures('reviews')
+def test_searching_films_by_words(client, credentials):
+    resp = client.get(
+        url='/films?search=pot%20HARRY',
+        headers={'Authorization': f'Basic {credentials}'},
+    )
+    data = resp.json()
+
+    assert resp.status_code == 200
+    assert [film['film_name'] for film in data['films']] == [
+        'Harry Potter',
+        'Harry Potter 2',
+    ]
+
+
+@pytest.mark.usefixtures('reviews')
+def test_searching_films_with_short_words(client, credentials):
+    resp = client.get(
+        url='/films?search=potter%202&sort_by_avg_score=desc',
+        headers={'Authorization': f'Basic {credentials}'},
+    )
+
+    assert [film['film_name'] for film in resp.json()['films']] == ['Harry Potter 2']
+
+
+@pytest.mark.usefixtures('reviews', 'page_size_1')
+def test_paging_search_results_by_cursor(client, credentials):
+    first = client.get(
+        url='/films?search=harry&page=1',
+        headers={'Authorization': f'Basic {credentials}'},
+    ).json()
+    second = client.get(
+        url=f'/films?search=harry&cursor={first["next_cursor"]}',
+        headers={'Authorization': f'Basic {credentials}'},
+    ).json()
+
+    assert [film['film_id'] for film in first['films'] + second['films']] == [2, 3]
+    assert second['next_cursor'] is None
+
+
+def test_search_index_follows_film_updates(client, credentials, film, session):
+    film.name = 'Interstellar'
+    session.commit()
+
+    resp = client.get(
+        url='/films?substring=stella',
+        headers={'Authorization': f'Basic {credentials}'},
+    )
+
+    assert [film['film_name'] for film in resp.json()['films']] == ['Interstellar']
+
+
+@pytest.mark.usefixtures('reviews')
+def test_filtering_films_without_search_index(client, credentials, mocker):
+    mocker.patch('app.db.search.search_index_enabled', False)
+
+    resp = client.get(
+        url='/films?substring=harry&search=2',
+        headers={'Authorization': f'Basic {credentials}'},
+    )
+
+    assert [film['film_name'] for film in resp.json()['films']] == ['Harry Potter 2']
@@ -0,0 +1,102 @@
+import io
+import json
+from typing import List
+
+import pytest
+from sqlalchemy import create_engine, func, select
+
+from app.db.models import Film
+from app.importer import (
+    ImportStats,
+    import_films,
+    main,
+    parse_film,
+    read_csv,
+    read_jsonl,
+)
+from tests.conftest import test_engine
+
+CATALOGUE = [
+    {'name': 'Inception', 'year': 2010},
+    {'name': 'Tenet', 'year': '2020'},
+    {'name': 'Inception', 'year': 2010},
+    {'name': 'The Matrix', 'year': 1999},
+    {'name': 'The Matrix', 'year': 2021},
+    {'name': '', 'year': 2000},
+    {'name': 'Metropolis', 'year': 1827},
+    {'name': 'Dune'},
+]
+
+
+def get_films(engine):
+    with engine.connect() as connection:
+        return connection.execute(
+            select(Film.name, Film.year, Film.total_scores).order_by(Film.id)
+        ).all()
+
+
+@pytest.mark.parametrize(
+    'record, film',
+    [
+        ({'name': ' Tenet ', 'year': '2020'}, ('Tenet', 2020)),
+        ({'name': 'Tenet', 'year': 'soon'}, None),
+        ({'name': None, 'year': 2020}, None),
+        ({}, None),
+    ],
+)
+def test_parsing_films(record, film):
+    assert parse_film(record) == film
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 100])
+def test_importing_films_skips_duplicates(chunk_size):
+    reports: List[ImportStats] = []
+
+    stats = import_films(
+        test_engine, CATALOGUE, chunk_size=chunk_size, report=reports.append
+    )
+
+    assert (stats.rows, stats.inserted, stats.invalid) == (8, 3, 3)
+    assert len(reports) == -(-8 // chunk_size)
+    assert get_films(test_engine)[4:] == [
+        ('Inception', 2010, 0),
+        ('Tenet', 2020, 0),
+        ('The Matrix', 2021, 0),
+    ]
+
+
+def test_reading_catalogues():
+    csv_file = io.StringIO('name,year\nInception,2010\n"Harry Potter, Part 1",2001\n')
+    jsonl_file = io.StringIO('{"name": "Inception", "year": 2010}\n\nnot json\n[]\n')
+
+    assert list(read_csv(csv_file)) == [
+        {'name': 'Inception', 'year': '2010'},
+        {'name': 'Harry Potter, Part 1', 'year': '2001'},
+    ]
+    assert list(read_jsonl(jsonl_file)) == [
+        {'name': 'Inception', 'year': 2010},
+        {},
+        {},
+    ]
+
+
+def test_import_command(tmp_path, capsys):
+    catalogue = tmp_path / 'films.jsonl'
+    catalogue.write_text(''.join(json.dumps(film) + '\n' for film in CATALOGUE))
+    url = f'sqlite:///{tmp_path / "import.db"}'
+
+    main([str(catalogue), '--chunk-size', '2', '--db-url', url])
+
+    out, err = capsys.readouterr()
+    assert out.startswith('Imported 8 rows, 4 new films, 3 invalid in ')
+    assert out.rstrip().endswith('rows/s)')
+    assert len(err.splitlines()) == 4
+    engine = create_engine(url)
+    with engine.connect() as connection:
+        assert connection.execute(select(func.count(Film.id))).scalar_one() == 4
+    engine.dispose()
+
+
+def test_import_command_needs_known_format(tmp_path):
+    with pytest.raises(SystemExit):
+        main([str(tmp_path / 'films.xml')])
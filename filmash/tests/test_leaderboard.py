@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+from sqlalchemy import update
+
+import app.utils as utils_module
+from app.db.models import Film
+from app.leaderboard import Leaderboard, RankedFilm
+from tests.test_query_plans import capture_statements
+
+TOP = '/films?sort_by_avg_score=desc'
+
+
+def get_film_ids(client, credentials, url):
+    resp = client.get(url=url, headers={'Authorization': f'Basic {credentials}'})
+    assert resp.status_code == 200
+    return [item['film_id'] for item in resp.json()['films']]
+
+
+def post_score(client, credentials, film_id, score):
+    client.post(
+        url=f'/films/{film_id}/scores',
+        json={'score': score},
+        headers={'Authorization': f'Basic {credentials}'},
+    )
+
+
+@pytest.mark.usefixtures('reviews')
+def test_top_films_are_served_from_leaderboard(client, credentials):
+    assert get_film_ids(client, credentials, f'{TOP}&top=2') == [1, 5]
+
+    with capture_statements() as statements:
+        film_ids = get_film_ids(client, credentials, f'{TOP}&top=2&year=1999')
+
+    assert film_ids == [1, 4]
+    assert not [statement for statement, _ in statements if 'Film' in statement]
+
+
+@pytest.mark.usefixtures('reviews')
+def test_posted_scores_move_films(client, credentials):
+    assert get_film_ids(client, credentials, f'{TOP}&top=2&year=1999') == [1, 4]
+
+    post_score(client, credentials, 4, 10)
+    post_score(client, credentials, 1, 9)
+
+    assert get_film_ids(client, credentials, f'{TOP}&top=2&year=1999') == [4, 1]
+    assert get_film_ids(client, credentials, f'{TOP}&top=3') == [4, 1, 5]
+
+
+@pytest.mark.usefixtures('reviews')
+@pytest.mark.parametrize('board_min_votes', [1, 3])
+def test_top_films_with_min_votes(client, credentials, mocker, board_min_votes):
+    mocker.patch.object(utils_module.leaderboard, 'min_votes', board_min_votes)
+    url = f'{TOP}&top=3&min_votes=2'
+
+    assert get_film_ids(client, credentials, url) == [5]
+    assert get_film_ids(client, credentials, f'{url}&year=1999') == []
+    assert get_film_ids(client, credentials, f'{TOP}&min_votes=2&page=1') == [5]
+
+
+def test_films_without_scores_follow_scored_ones(client, credentials, session):
+    session.execute(
+        update(Film)
+        .where(Film.id == 3)
+        .values(avg_score=5, sum_scores=5, total_scores=1)
+    )
+    session.commit()
+
+    assert get_film_ids(client, credentials, f'{TOP}&top=3') == [3, 4, 2]
+    assert utils_module.leaderboard.loaded
+
+
+class SessionScoringFilm:
+    """Session stub that posts a score while the leaderboard is loading."""
+
+    def __init__(self, leaderboard):
+        self.leaderboard = leaderboard
+
+    async def execute(self, _statement):
+        self.leaderboard.update(RankedFilm(1, 'Lord of the Rings', 1999, 8, 1))
+        return []
+
+
+def test_load_overlapping_update_is_dropped():
+    leaderboard = Leaderboard(min_votes=1, ttl=60)
+
+    loop = asyncio.new_event_loop()
+    films = loop.run_until_complete(
+        leaderboard.top(SessionScoringFilm(leaderboard), None, 1)
+    )
+    loop.close()
+
+    assert films is None
+    assert not leaderboard.loaded
@@ -0,0 +1,93 @@
+import logging
+
+import pytest
+
+from app.metrics import Counter, Histogram
+
+
+def get_metrics(client):
+    resp = client.get('/metrics')
+    assert resp.status_code == 200
+    assert resp.headers['Content-Type'] == 'text/plain; version=0.0.4; charset=utf-8'
+    return dict(
+        line.rsplit(' ', 1) for line in resp.text.splitlines() if line[0] != '#'
+    )
+
+
+def sample(name, **labels):
+    return name + '{' + ','.join(f'{k}="{v}"' for k, v in labels.items()) + '}'
+
+
+@pytest.mark.usefixtures('reviews')
+def test_request_metrics(client, credentials, film):
+    for _ in range(2):
+        client.get(
+            url=f'/films/{film.id}/scores?page=1',
+            headers={'Authorization': f'Basic {credentials}'},
+        )
+    client.get(url='/films/1')
+
+    metrics = get_metrics(client)
+
+    route = {'method': 'GET', 'route': '/films/{film_id}/scores'}
+    durations = 'filmash_request_duration_seconds_count'
+    assert metrics[sample(durations, **route, status=200)] == '2'
+    unauthorized = sample(durations, method='GET', route='/films/{film_id}', status=401)
+    assert metrics[unauthorized] == '1'
+    # Credentials are verified with a query only once
+    assert metrics[sample('filmash_request_queries_bucket', **route, le=2)] == '1'
+    assert metrics[sample('filmash_request_queries_bucket', **route, le=3)] == '2'
+    for phase in ('db', 'bcrypt', 'serialization'):
+        phase_sum = sample('filmash_request_phase_seconds_sum', **route, phase=phase)
+        assert float(metrics[phase_sum]) > 0
+    selects = sample('filmash_query_duration_seconds_count', statement='SELECT')
+    assert int(metrics[selects]) >= 5
+
+
+def test_unmatched_requests(client):
+    client.get('/unknown')
+
+    key = sample(
+        'filmash_request_duration_seconds_count',
+        method='GET',
+        route='unmatched',
+        status=404,
+    )
+    assert get_metrics(client)[key] == '1'
+
+
+@pytest.mark.usefixtures('reviews')
+def test_slow_queries_are_logged(client, credentials, mocker, caplog):
+    mocker.patch('app.metrics.SLOW_QUERY_MS', 0)
+
+    with caplog.at_level(logging.WARNING, logger='app.metrics'):
+        client.get(url='/films/1', headers={'Authorization': f'Basic {credentials}'})
+
+    assert caplog.records
+    assert all(
+        record.getMessage().startswith('Slow query (') for record in caplog.records
+    )
+    assert 'in GET /films/1: SELECT "Film".id' in caplog.records[-1].getMessage()
+    assert 'filmash_slow_queries_total{statement="SELECT"}' in get_metrics(client)
+
+
+def test_rendering_metrics():
+    histogram = Histogram('latency', 'Latency.', ('path',), (0.1, 1))
+    histogram.observe(0.1, 'a"\\')
+    histogram.observe(0.5, 'a"\\')
+    histogram.observe(3, 'a"\\')
+    counter = Counter('errors_total', 'Errors.', ())
+    counter.inc(amount=2)
+
+    assert list(histogram.render()) + list(counter.render()) == [
+        '# HELP latency Latency.',
+        '# TYPE latency histogram',
+        'latency_bucket{path="a\\"\\\\",le="0.1"} 1',
+        'latency_bucket{path="a\\"\\\\",le="1"} 2',
+        'latency_bucket{path="a\\"\\\\",le="+Inf"} 3',
+        'latency_sum{path="a\\"\\\\"} 3.6',
+        'latency_count{path="a\\"\\\\"} 3',
+        '# HELP errors_total Errors.',
+        '# TYPE errors_total counter',
+        'errors_total 2',
+    ]
@@ -0,0 +1,142 @@
+# pylint: disable=redefined-outer-name
+
+import pytest
+from sqlalchemy import create_engine, inspect, select
+from sqlalchemy.exc import IntegrityError
+
+from app.db.migrations import MIGRATIONS, migrate
+from app.db.models import Film, Review, SchemaVersion, ScoreStats
+
+LEGACY_SCHEMA = [
+    'CREATE TABLE "User" (id INTEGER PRIMARY KEY, login VARCHAR NOT NULL UNIQUE, '
+    'hashed_password VARCHAR NOT NULL)',
+    'CREATE TABLE "Film" (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, '
+    'year INTEGER NOT NULL, avg_score FLOAT, total_scores INTEGER, '
+    'total_comments INTEGER)',
+    'CREATE TABLE "Review" (user_id INTEGER, film_id INTEGER, comment TEXT, '
+    'score INTEGER, PRIMARY KEY (user_id, film_id))',
+    'INSERT INTO "Film" VALUES (1, \'Inception\', 2010, 7.5, 2, 0), '
+    '(2, \'Tenet\', 2020, NULL, 0, 1)',
+    'INSERT INTO "Review" VALUES (1, 1, NULL, 10), (2, 1, NULL, 5), (1, 2, \'Hm\', NULL)',
+]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "migrations.db"}')
+    yield engine
+    engine.dispose()
+
+
+def get_schema_version(engine):
+    with engine.connect() as connection:
+        return connection.execute(select(SchemaVersion.c.version)).scalar_one()
+
+
+def test_new_database_is_stamped_with_latest_version(engine):
+    with engine.begin() as connection:
+        assert migrate(connection) == 0
+
+    assert get_schema_version(engine) == len(MIGRATIONS)
+
+
+def test_legacy_database_is_migrated(engine):
+    with engine.begin() as connection:
+        for statement in LEGACY_SCHEMA:
+            connection.exec_driver_sql(statement)
+
+    with engine.begin() as connection:
+        assert migrate(connection) == len(MIGRATIONS)
+    with engine.begin() as connection:
+        assert migrate(connection) == 0
+
+    assert get_schema_version(engine) == len(MIGRATIONS)
+    with engine.connect() as connection:
+        assert connection.execute(
+            select(Film.id, Film.sum_scores).order_by(Film.id)
+        ).all() == [(1, 15), (2, 0)]
+        assert connection.execute(
+            select(ScoreStats.sum_scores, ScoreStats.total_scores)
+        ).all() == [(15, 2)]
+        assert connection.execute(
+            select(Film.weighted_rating).order_by(Film.id)
+        ).scalars().all() == [7.5, None]
+    indexes = {
+        index['name']
+        for table in ('Film', 'Review')
+        for index in inspect(engine).get_indexes(table)
+    }
+    assert indexes == {
+        'ix_Film_avg_score',
+        'ix_Film_year_avg_score',
+        'ix_Film_name_year',
+        'ix_Film_weighted_rating',
+        'ix_Film_year_weighted_rating',
+        'ix_Review_film_id_scored',
+        'ix_Review_film_id_commented',
+        'ix_Review_user_id_film_id',
+    }
+
+
+def test_unversioned_database_with_sum_scores_is_migrated(engine):
+    # Created from the models after sum_scores was added, before versioning
+    with engine.begin() as connection:
+        for statement in LEGACY_SCHEMA:
+            connection.exec_driver_sql(statement)
+        connection.exec_driver_sql(
+            'ALTER TABLE "Film" ADD COLUMN sum_scores INTEGER DEFAULT 0'
+        )
+
+    with engine.begin() as connection:
+        assert migrate(connection) == len(MIGRATIONS)
+
+    with engine.connect() as connection:
+        assert connection.execute(
+            select(Film.id, Film.sum_scores).order_by(Film.id)
+        ).all() == [(1, 15), (2, 0)]
+
+
+def test_migrated_reviews_check_score_range(engine):
+    with engine.begin() as connection:
+        for statement in LEGACY_SCHEMA:
+            connection.exec_driver_sql(statement)
+        migrate(connection)
+
+    with engine.connect() as connection:
+        assert connection.execute(
+            select(Review.user_id, Review.film_id, Review.score).order_by(
+                Review.film_id, Review.user_id
+            )
+        ).all() == [(1, 1, 10), (2, 1, 5), (1, 2, None)]
+        with pytest.raises(IntegrityError):
+            connection.exec_driver_sql('INSERT INTO "Review" VALUES (3, 1, NULL, 11)')
+
+
+def get_indexes(engine):
+    return {
+        index['name']: index['column_names']
+        for table in ('Film', 'Review')
+        for index in inspect(engine).get_indexes(table)
+    }
+
+
+def test_migrated_indexes_match_models(engine, tmp_path):
+    with engine.begin() as connection:
+        for statement in LEGACY_SCHEMA:
+            connection.exec_driver_sql(statement)
+        migrate(connection)
+    new_engine = create_engine(f'sqlite:///{tmp_path / "new.db"}')
+    with new_engine.begin() as connection:
+        migrate(connection)
+
+    assert get_indexes(engine) == get_indexes(new_engine)
+    new_engine.dispose()
+
+
+def test_index_steps_create_only_their_indexes(engine):
+    with engine.begin() as connection:
+        for statement in LEGACY_SCHEMA:
+            connection.exec_driver_sql(statement)
+        MIGRATIONS[2](connection)
+
+    assert set(get_indexes(engine)) == {'ix_Film_name_year'}
@@ -0,0 +1,161 @@
+import pytest
+
+from app.db.models import Film
+from app.pagination import encode_cursor
+from tests.test_query_plans import capture_statements
+
+
+def get_all_pages(client, url, credentials, key):
+    items, cursor, pages = [], None, 0
+    while True:
+        resp = client.get(
+            url=f'{url}&cursor={cursor}' if cursor else url,
+            headers={'Authorization': f'Basic {credentials}'},
+        )
+        assert resp.status_code == 200
+        data = resp.json()
+        items.extend(data[key])
+        pages += 1
+        cursor = data['next_cursor']
+        if not cursor:
+            return items, pages
+
+
+@pytest.mark.usefixtures('page_size_3')
+def test_walking_scores_by_cursor(client, film, credentials, reviews):
+    scores, pages = get_all_pages(
+        client, f'/films/{film.id}/scores?page=1', credentials, 'scores'
+    )
+
+    assert pages == 2
+    assert scores == [
+        {'user_id': review.user_id, 'score': review.score}
+        for review in reviews[:6]
+        if review.score is not None
+    ]
+
+
+@pytest.mark.usefixtures('page_size_2')
+def test_getting_comments_by_cursor(client, film, credentials, reviews):
+    first = client.get(
+        url=f'/films/{film.id}/comments?page=1',
+        headers={'Authorization': f'Basic {credentials}'},
+    ).json()
+    resp = client.get(
+        url=f'/films/{film.id}/comments?cursor={first["next_cursor"]}',
+        headers={'Authorization': f'Basic {credentials}'},
+    )
+    data = resp.json()
+
+    assert resp.status_code == 200
+    assert data['comments'] == [
+        {'user_id': reviews[5].user_id, 'comment': reviews[5].comment}
+    ]
+    assert data['page'] is None
+    assert data['total_pages'] is None
+    assert data['next_cursor'] is None
+
+
+@pytest.mark.usefixtures('reviews', 'page_size_2')
+@pytest.mark.parametrize('sort', ['asc', 'desc'])
+def test_walking_sorted_films_by_cursor(client, credentials, session, sort):
+    session.add(Film(name='Unscored', year=2000))
+    session.commit()
+    expected = client.get(
+        url=f'/films?sort_by_avg_score={sort}',
+        headers={'Authorization': f'Basic {credentials}'},
+    ).json()['films']
+
+    films, pages = get_all_pages(
+        client, f'/films?sort_by_avg_score={sort}&page=1', credentials, 'films'
+    )
+
+    assert pages == 3
+    assert films == expected
+    assert (films[0]['avg_score'] is None) == (sort == 'asc')
+
+
+@pytest.mark.usefixtures('reviews', 'page_size_2')
+def test_walking_top_films_by_cursor(client, credentials):
+    films, pages = get_all_pages(
+        client, '/films?sort_by_avg_score=desc&top=3&page=1', credentials, 'films'
+    )
+
+    assert pages == 2
+    assert [film['film_id'] for film in films] == [1, 5, 3]
+
+
+@pytest.mark.usefixtures('reviews', 'page_size_1')
+def test_paging_without_total(client, credentials):
+    resp = client.get(
+        url='/films?page=10&include_total=false',
+        headers={'Authorization': f'Basic {credentials}'},
+    )
+    data = resp.json()
+
+    assert resp.status_code == 200
+    assert data == {'films': [], 'page': 10, 'total_pages': None, 'next_cursor': None}
+
+
+@pytest.mark.parametrize(
+    'cursor',
+    [
+        'abc',
+        'WzFd',
+        'eyJmb28iOiAxfQ==',
+        encode_cursor({'served': 'x'}),
+        encode_cursor({'served': -1}),
+        encode_cursor({'served': True}),
+        encode_cursor({'id': [1]}),
+        encode_cursor({'id': {'id': 1}}),
+    ],
+)
+@pytest.mark.parametrize('listing', ['/films?', '/films?top=3&'])
+def test_getting_films_with_invalid_cursor(client, credentials, listing, cursor):
+    resp = client.get(
+        url=f'{listing}cursor={cursor}',
+        headers={'Authorization': f'Basic {credentials}'},
+    )
+
+    assert resp.status_code == 400
+    assert resp.json()['detail'] == 'Invalid cursor'
+
+
+def count_queries(statements):
+    return [statement for statement, _ in statements if 'count(' in statement]
+
+
+@pytest.mark.usefixtures('reviews', 'page_size_2')
+def test_reviews_are_paged_by_film_counters(client, film, credentials):
+    with capture_statements() as statements:
+        scores = client.get(
+            url=f'/films/{film.id}/scores?page=2',
+            headers={'Authorization': f'Basic {credentials}'},
+        ).json()
+        comments = client.get(
+            url=f'/films/{film.id}/comments?page=2',
+            headers={'Authorization': f'Basic {credentials}'},
+        ).json()
+
+    assert not count_queries(statements)
+    assert (scores['total_pages'], len(scores['scores'])) == (2, 2)
+    assert (comments['total_pages'], len(comments['comments'])) == (2, 1)
+
+
+@pytest.mark.usefixtures('reviews', 'page_size_2')
+def test_films_are_paged_by_cached_count(client, credentials, session):
+    def get_page(page):
+        with capture_statements() as statements:
+            resp = client.get(
+                url=f'/films?sort_by_avg_score=desc&page={page}',
+                headers={'Authorization': f'Basic {credentials}'},
+            )
+        assert resp.status_code == 200
+        return resp.json()['total_pages'], len(count_queries(statements))
+
+    assert get_page(1) == (3, 1)
+    session.add_all([Film(name='Dune', year=2021), Film(name='Tenet', year=2020)])
+    session.commit()
+
+    assert get_page(3) == (3, 0)
+    assert get_page(4) == (4, 1)
@@ -0,0 +1,141 @@
+import re
+from contextlib import contextmanager
+
+import pytest
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+
+from app.db.counters import reconcile_counters
+from app.main import app
+from app.pagination import encode_cursor
+from tests.conftest import sqlite_only, test_async_engine, test_engine
+
+pytestmark = sqlite_only
+
+FULL_SCAN = re.compile(r'SCAN (TABLE )?\w+$')
+# Exports read whole tables on purpose
+FULL_SCAN_PATHS = {'/films:export', '/reviews:export'}
+NO_QUERY_PATHS = {'/metrics'}
+
+REQUESTS = [
+    ('POST', '/users', {}, {'login': 'new_user', 'password': '12345'}),
+    ('POST', '/token', {}, None),
+    ('GET', '/users/{login}/reviews', {'page': 2}, None),
+    ('GET', '/users/{login}/reviews', {'cursor': encode_cursor({'film_id': 2})}, None),
+    ('POST', '/films/{film_id}/scores', {}, {'score': 5}),
+    ('GET', '/films/{film_id}/scores', {'page': 1}, None),
+    ('GET', '/films/{film_id}/scores', {'cursor': encode_cursor({'user_id': 2})}, None),
+    ('POST', '/films/{film_id}/comments', {}, {'comment': 'Nice!'}),
+    ('GET', '/films/{film_id}/comments', {'page': 1}, None),
+    ('GET', '/films/{film_id}', {}, None),
+    ('GET', '/films/{film_id}/similar', {'top': 5}, None),
+    ('POST', '/scores:batch', {}, {'scores': [{'film_id': 1, 'score': 5}] * 2}),
+    ('POST', '/comments:batch', {}, {'comments': [{'film_id': 1, 'comment': 'Ok'}]}),
+    ('GET', '/films', {'year': 2010, 'sort_by_avg_score': 'desc', 'page': 1}, None),
+    ('GET', '/films', {'sort_by_avg_score': 'asc', 'page': 2}, None),
+    ('GET', '/films', {'sort_by_avg_score': 'desc', 'top': 3}, None),
+    (
+        'GET',
+        '/films',
+        {'year': 2010, 'sort_by_avg_score': 'desc', 'min_votes': 2, 'page': 1},
+        None,
+    ),
+    (
+        'GET',
+        '/films',
+        {
+            'sort_by_avg_score': 'desc',
+            'cursor': encode_cursor({'id': 3, 'avg_score': 6}),
+        },
+        None,
+    ),
+    ('GET', '/films', {'sort_by_weighted_rating': 'desc', 'page': 1}, None),
+    ('GET', '/films', {'year': 1999, 'sort_by_weighted_rating': 'asc', 'top': 2}, None),
+    ('GET', '/films', {'search': 'Harry Potter', 'page': 1}, None),
+    ('GET', '/films:export', {}, None),
+    ('GET', '/reviews:export', {}, None),
+    ('GET', '/metrics', {}, None),
+]
+
+
+@contextmanager
+def capture_statements():
+    statements = []
+
+    def capture(_conn, _cursor, statement, parameters, _context, _executemany):
+        statements.append((statement, parameters))
+
+    engines = [test_engine, test_async_engine.sync_engine]
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', capture)
+
+
+def explain(statement, parameters):
+    with test_engine.connect() as connection:
+        plan = connection.exec_driver_sql(
+            f'EXPLAIN QUERY PLAN {statement}', parameters
+        ).all()
+    return [row[-1] for row in plan]
+
+
+def test_every_route_is_checked():
+    routes = {
+        (method, route.path)
+        for route in app.routes
+        if isinstance(route, APIRoute)
+        for method in route.methods
+    }
+    assert routes == {request[:2] for request in REQUESTS}
+
+
+@pytest.mark.usefixtures('page_size_2', 'reviews')
+@pytest.mark.parametrize('method, path, params, body', REQUESTS)
+def test_route_queries_use_indexes(
+    client, film, credentials, method, path, params, body
+):  # pylint: disable=too-many-arguments
+    url = path.format(film_id=film.id, login='user')
+    with capture_statements() as statements:
+        resp = client.request(
+            method,
+            url,
+            params=params,
+            json=body,
+            headers={'Authorization': f'Basic {credentials}'},
+        )
+    assert resp.status_code == 200, resp.text
+
+    queries = [
+        (statement, parameters)
+        for statement, parameters in statements
+        if statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE'))
+    ]
+    assert bool(queries) != (path in NO_QUERY_PATHS)
+    for statement, parameters in queries:
+        plan = explain(statement, parameters)
+        if path not in FULL_SCAN_PATHS:
+            assert not [step for step in plan if FULL_SCAN.match(step)], (
+                statement,
+                plan,
+            )
+        if 'FilmSearch' not in statement:
+            assert not [step for step in plan if 'TEMP B-TREE' in step], (
+                statement,
+                plan,
+            )
+
+
+@pytest.mark.usefixtures('reviews')
+def test_reconciling_counters_reads_reviews_by_film():
+    with capture_statements() as statements, test_engine.begin() as connection:
+        reconcile_counters(connection)
+
+    statement, parameters = statements[0]
+    assert statement.lstrip().startswith('UPDATE "Film"')
+    plan = explain(statement, parameters)
+    assert not [step for step in plan if 'Review' in step and 'INDEX' not in step], plan
+    assert not [step for step in plan if 'TEMP B-TREE' in step], plan
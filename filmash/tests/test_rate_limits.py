@@ -0,0 +1,123 @@
+import asyncio
+import os
+import uuid
+
+import bcrypt
+import pytest
+
+from app.ratelimit import (
+    ConcurrencyLimit,
+    RedisTokenBuckets,
+    TokenBuckets,
+    create_rate_limiter,
+)
+from app.tokens import create_token
+
+
+def acquire(limiter, key):
+    return asyncio.new_event_loop().run_until_complete(limiter.acquire(key))
+
+
+def post_score(client, film_id, authorization):
+    return client.post(
+        url=f'/films/{film_id}/scores',
+        headers={'Authorization': authorization},
+        json={'score': 5},
+    )
+
+
+@pytest.mark.usefixtures('user')
+def test_writes_over_burst_are_rejected(client, credentials, film, mocker):
+    mocker.patch('app.utils.rate_limiter', TokenBuckets(rate=0.1, burst=2))
+    authorization = f'Basic {credentials}'
+
+    assert post_score(client, film.id, authorization).status_code == 200
+    assert post_score(client, film.id, authorization).status_code == 200
+    resp = post_score(client, film.id, authorization)
+
+    assert resp.status_code == 429
+    assert resp.json()['detail'] == 'Too many requests'
+    assert resp.headers['Retry-After'] == '10'
+    resp = client.get(f'/films/{film.id}', headers={'Authorization': authorization})
+    assert resp.status_code == 200
+    metrics = client.get('/metrics').text
+    assert 'filmash_rejected_requests_total{reason="rate_limit"} 1' in metrics
+
+
+def test_rejected_requests_are_not_authenticated(client, user, film, mocker):
+    mocker.patch('app.utils.rate_limiter', TokenBuckets(rate=0.1, burst=1))
+    checkpw = mocker.spy(bcrypt, 'checkpw')
+
+    assert client.post('/token', auth=(user.login, 'wrong')).status_code == 401
+    assert client.post('/token', auth=(user.login, 'wrong')).status_code == 429
+    assert client.post(f'/films/{film.id}/comments', json={}).status_code == 429
+    assert checkpw.call_count == 1
+
+
+@pytest.mark.usefixtures('user')
+def test_token_users_have_own_buckets(client, user, credentials, film, mocker):
+    mocker.patch('app.utils.rate_limiter', TokenBuckets(rate=0.1, burst=1))
+    authorization = f'Bearer {create_token(user.id)}'
+
+    assert post_score(client, film.id, authorization).status_code == 200
+    assert post_score(client, film.id, authorization).status_code == 429
+    assert post_score(client, film.id, f'Basic {credentials}').status_code == 200
+    assert post_score(client, film.id, 'Bearer invalid').status_code == 429
+
+
+def test_buckets_are_refilled(mocker):
+    monotonic = mocker.patch('app.ratelimit.time.monotonic', return_value=100.0)
+    buckets = TokenBuckets(rate=0.5, burst=2)
+
+    assert [acquire(buckets, 'a') for _ in range(3)] == [0, 0, 2]
+    monotonic.return_value = 101.0
+    assert acquire(buckets, 'a') == 1
+    monotonic.return_value = 102.0
+    assert acquire(buckets, 'a') == 0
+    assert acquire(buckets, 'b') == 0
+
+
+def test_least_recently_used_buckets_are_dropped():
+    buckets = TokenBuckets(rate=1, burst=1, maxsize=2)
+    for key in ('a', 'b', 'a', 'c'):
+        acquire(buckets, key)
+
+    assert len(buckets) == 2
+    assert acquire(buckets, 'a') > 0
+    assert acquire(buckets, 'b') == 0
+
+
+@pytest.mark.usefixtures('user')
+def test_writes_over_concurrency_limit_are_rejected(client, credentials, film, mocker):
+    write_limit = mocker.patch('app.utils.write_limit', ConcurrencyLimit(1))
+
+    assert post_score(client, film.id, f'Basic {credentials}').status_code == 200
+    assert write_limit.active == 0
+    write_limit.active = 1
+    resp = post_score(client, film.id, f'Basic {credentials}')
+
+    assert resp.status_code == 429
+    assert resp.headers['Retry-After'] == '1'
+    assert write_limit.active == 1
+
+
+def test_limits_are_disabled_by_default():
+    assert create_rate_limiter(rate=None) is None
+    assert isinstance(create_rate_limiter(rate=1, redis_url=None), TokenBuckets)
+
+
+def test_requests_are_admitted_without_redis():
+    pytest.importorskip('redis')
+    limiter = create_rate_limiter(rate=1, burst=1, redis_url='redis://127.0.0.1:1')
+
+    assert isinstance(limiter, RedisTokenBuckets)
+    assert acquire(limiter, 'a') == 0
+
+
+@pytest.mark.skipif(not os.environ.get('TEST_REDIS_URL'), reason='needs Redis')
+def test_buckets_in_redis():
+    limiter = RedisTokenBuckets(os.environ['TEST_REDIS_URL'], rate=0.5, burst=2)
+    key = uuid.uuid4().hex
+
+    assert [acquire(limiter, key) for _ in range(2)] == [0, 0]
+    assert 1.9 < acquire(limiter, key) <= 2
@@ -0,0 +1,199 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from app.db.models import Film, ScoreStats
+from app.db.ratings import rate_all_films, rate_periodically
+from app.main import prepare_db
+from app.routers.films import update_rated_films
+from tests.conftest import create_test_session, test_engine
+
+
+def post_score(client, credentials, film_id, score):
+    resp = client.post(
+        url=f'/films/{film_id}/scores',
+        headers={'Authorization': f'Basic {credentials}'},
+        json={'score': score},
+    )
+    assert resp.status_code == 200
+
+
+def rate(force=False):
+    with test_engine.begin() as connection:
+        return rate_all_films(connection, force)
+
+
+def get_stats(session):
+    stats = session.execute(
+        select(ScoreStats).execution_options(populate_existing=True)
+    ).scalar_one()
+    return stats.sum_scores, stats.total_scores, stats.rated_mean
+
+
+@pytest.fixture
+def scores(client, credentials, voters):
+    post_score(client, credentials, 1, 10)
+    for voter in voters:
+        post_score(client, voter, 2, 9)
+    post_score(client, voters[0], 3, 8)
+    post_score(client, voters[1], 4, 0)
+    rate()
+
+
+def get_ratings(session):
+    return session.execute(
+        select(Film.id, Film.weighted_rating)
+        .order_by(Film.id)
+        .execution_options(populate_existing=True)
+    ).all()
+
+
+@pytest.mark.usefixtures('scores')
+def test_ratings_use_mean_of_all_scores(session):
+    assert get_stats(session) == (45, 6, 7.5)
+    assert get_ratings(session) == [
+        (1, pytest.approx(47.5 / 6)),
+        (2, pytest.approx(64.5 / 8)),
+        (3, pytest.approx(45.5 / 6)),
+        (4, pytest.approx(37.5 / 6)),
+    ]
+
+
+@pytest.mark.usefixtures('user')
+def test_scores_rate_their_film_with_stored_mean(client, credentials, voters, session):
+    post_score(client, credentials, 1, 10)
+    assert get_ratings(session)[0] == (1, None)
+    assert rate()
+    post_score(client, voters[0], 2, 6)
+    post_score(client, credentials, 1, 8)
+
+    assert get_stats(session) == (10, 1, 10)
+    assert get_ratings(session) == [
+        (1, pytest.approx(58 / 6)),
+        (2, pytest.approx(56 / 6)),
+        (3, None),
+        (4, None),
+    ]
+
+
+@pytest.mark.usefixtures('scores')
+def test_films_are_rated_again_once_mean_moves(client, voters, session, mocker):
+    post_score(client, voters[2], 1, 8)
+    mocker.patch('app.db.ratings.RATING_MEAN_TOLERANCE', 1)
+
+    assert not rate()
+    assert get_stats(session) == (53, 7, 7.5)
+
+    mocker.patch('app.db.ratings.RATING_MEAN_TOLERANCE', 0.01)
+    assert rate()
+    assert get_stats(session) == (53, 7, pytest.approx(53 / 7))
+    assert get_ratings(session)[0] == (1, pytest.approx((18 + 5 * 53 / 7) / 7))
+    assert rate(force=True)
+
+
+@pytest.mark.usefixtures('user')
+def test_films_are_rated_on_start(client, credentials, session, mocker):
+    post_score(client, credentials, 1, 10)
+    assert get_ratings(session)[0] == (1, None)
+    mocker.patch('app.main.init_db')
+    mocker.patch('app.main.create_session', create_test_session)
+
+    prepare_db()
+
+    assert get_ratings(session)[0] == (1, 10)
+
+
+def test_rating_periodically(mocker):
+    rated = mocker.Mock()
+    rate_all = mocker.patch(
+        'app.db.ratings.rate_all_films',
+        side_effect=[RuntimeError, True, *[False] * 100],
+    )
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.new_event_loop().run_until_complete(
+            asyncio.wait_for(rate_periodically(0.01, create_test_session, rated), 0.2)
+        )
+
+    assert rate_all.call_count > 2
+    rated.assert_called_once_with()
+
+
+@pytest.mark.usefixtures('scores')
+@pytest.mark.parametrize(
+    'sort, film_ids', [('desc', [2, 1, 3, 4]), ('asc', [4, 3, 1, 2])]
+)
+def test_sorting_films_by_weighted_rating(client, credentials, sort, film_ids):
+    resp = client.get(
+        url=f'/films?sort_by_weighted_rating={sort}&top=4',
+        headers={'Authorization': f'Basic {credentials}'},
+    )
+
+    assert resp.status_code == 200
+    films = resp.json()['films']
+    assert [film['film_id'] for film in films] == film_ids
+    ratings = [film['weighted_rating'] for film in films]
+    assert ratings == sorted(ratings, reverse=sort == 'desc')
+
+
+def get_listed_ratings(client, credentials):
+    resp = client.get(
+        url='/films?sort_by_avg_score=desc&top=2',
+        headers={'Authorization': f'Basic {credentials}'},
+    )
+    return [(film['film_id'], film['weighted_rating']) for film in resp.json()['films']]
+
+
+@pytest.mark.usefixtures('scores')
+def test_listed_films_show_ratings_of_last_mean(client, credentials, voters):
+    assert get_listed_ratings(client, credentials) == [
+        (1, pytest.approx(47.5 / 6)),
+        (2, pytest.approx(64.5 / 8)),
+    ]
+
+    post_score(client, voters[2], 4, 10)
+    rate(force=True)
+    update_rated_films()
+
+    mean = 55 / 7
+    assert get_listed_ratings(client, credentials) == [
+        (1, pytest.approx((10 + 5 * mean) / 6)),
+        (2, pytest.approx((27 + 5 * mean) / 8)),
+    ]
+
+
+@pytest.mark.usefixtures('scores')
+def test_film_info_shows_weighted_rating(client, credentials):
+    resp = client.get(url='/films/1', headers={'Authorization': f'Basic {credentials}'})
+
+    assert resp.json()['weighted_rating'] == pytest.approx(47.5 / 6)
+
+
+def test_sorting_by_two_fields(client, credentials):
+    resp = client.get(
+        url='/films?sort_by_avg_score=desc&sort_by_weighted_rating=desc',
+        headers={'Authorization': f'Basic {credentials}'},
+    )
+
+    assert resp.status_code == 400
+
+
+@pytest.mark.usefixtures('scores', 'page_size_3')
+def test_paging_films_by_weighted_rating_with_cursor(client, credentials):
+    headers = {'Authorization': f'Basic {credentials}'}
+    first = client.get(
+        url='/films?sort_by_weighted_rating=desc&page=1', headers=headers
+    ).json()
+    second = client.get(
+        url=f'/films?sort_by_weighted_rating=desc&cursor={first["next_cursor"]}',
+        headers=headers,
+    ).json()
+
+    assert [film['film_id'] for film in first['films'] + second['films']] == [
+        2,
+        1,
+        3,
+        4,
+    ]
+    assert second['next_cursor'] is None
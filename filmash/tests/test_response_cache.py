@@ -0,0 +1,120 @@
+import pytest
+
+import app.utils as utils_module
+
+TOP_2 = '/films?sort_by_avg_score=desc&top=2'
+
+
+def get(client, credentials, url, **headers):
+    return client.get(
+        url=url, headers={'Authorization': f'Basic {credentials}', **headers}
+    )
+
+
+def is_cached(key):
+    return utils_module.response_cache.entries.get(key) is not None
+
+
+@pytest.mark.usefixtures('reviews')
+def test_film_info_is_cached_with_etag(client, credentials, film):
+    first = get(client, credentials, f'/films/{film.id}')
+    second = get(client, credentials, f'/films/{film.id}')
+
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json()
+    assert first.headers['ETag'] == second.headers['ETag']
+    assert utils_module.response_cache.entries.stats() == {
+        'hits': 1,
+        'misses': 1,
+        'size': 1,
+    }
+
+
+@pytest.mark.usefixtures('reviews')
+def test_not_modified_film_info(client, credentials, film):
+    etag = get(client, credentials, f'/films/{film.id}').headers['ETag']
+
+    resp = get(client, credentials, f'/films/{film.id}', **{'If-None-Match': etag})
+
+    assert resp.status_code == 304
+    assert resp.headers['ETag'] == etag
+    assert not resp.content
+
+
+@pytest.mark.usefixtures('reviews')
+def test_posting_score_evicts_film_info(client, credentials, film):
+    etag = get(client, credentials, f'/films/{film.id}').headers['ETag']
+
+    client.post(
+        url=f'/films/{film.id}/scores',
+        json={'score': 10},
+        headers={'Authorization': f'Basic {credentials}'},
+    )
+    resp = get(client, credentials, f'/films/{film.id}', **{'If-None-Match': etag})
+
+    assert resp.status_code == 200
+    assert resp.headers['ETag'] != etag
+    assert resp.json()['avg_score'] == 7.8
+    assert resp.json()['total_scores'] == 5
+
+
+@pytest.mark.usefixtures('reviews')
+def test_posting_comment_keeps_top_films_cached(client, credentials, film):
+    get(client, credentials, TOP_2)
+    get(client, credentials, f'/films/{film.id}')
+
+    client.post(
+        url=f'/films/{film.id}/comments',
+        json={'comment': 'Mind-bending'},
+        headers={'Authorization': f'Basic {credentials}'},
+    )
+
+    assert is_cached(('top', None, 2, None))
+    assert not is_cached(('film', film.id))
+    assert get(client, credentials, f'/films/{film.id}').json()['total_comments'] == 4
+
+
+@pytest.mark.usefixtures('reviews')
+def test_top_films_are_evicted_only_when_affected(client, credentials):
+    assert [
+        item['film_id'] for item in get(client, credentials, TOP_2).json()['films']
+    ] == [1, 5]
+
+    client.post(
+        url='/films/4/scores',
+        json={'score': 0},
+        headers={'Authorization': f'Basic {credentials}'},
+    )
+    assert is_cached(('top', None, 2, None))
+
+    client.post(
+        url='/films/2/scores',
+        json={'score': 10},
+        headers={'Authorization': f'Basic {credentials}'},
+    )
+    assert not is_cached(('top', None, 2, None))
+    assert [
+        item['film_id'] for item in get(client, credentials, TOP_2).json()['films']
+    ] == [2, 1]
+
+
+@pytest.mark.usefixtures('reviews')
+def test_top_films_of_other_year_stay_cached(client, credentials):
+    get(client, credentials, f'{TOP_2}&year=1999')
+
+    client.post(
+        url='/films/2/scores',
+        json={'score': 10},
+        headers={'Authorization': f'Basic {credentials}'},
+    )
+
+    assert is_cached(('top', 1999, 2, None))
+
+
+@pytest.mark.usefixtures('reviews')
+def test_paginated_films_are_not_cached(client, credentials):
+    resp = get(client, credentials, f'{TOP_2}&page=1')
+
+    assert resp.status_code == 200
+    assert 'ETag' not in resp.headers
+    assert len(utils_module.response_cache.entries) == 0
@@ -1,5 +1,11 @@
+import threading
+import time
+
 import pytest
 
+from app.db.utils import apply_score, save_score
+from tests.conftest import TestingSessionLocal
+
 
 @pytest.mark.usefixtures('user')
 def test_posting_score(client, credentials, film):
@@ -174,3 +180,61 @@ def test_posting_score_for_nonexistent_film(client, credentials):
 
     assert resp.status_code == 404
     assert data['detail'] == 'Film with specified id = 1000 does not exist'
+
+
+def test_posting_scores_from_many_users(client, film, voters, session):
+    for credentials, score in zip(voters, [10, 9, 4]):
+        client.post(
+            url=f'/films/{film.id}/scores',
+            headers={'Authorization': f'Basic {credentials}'},
+            json={'score': score},
+        )
+    resp = client.post(
+        url=f'/films/{film.id}/scores',
+        headers={'Authorization': f'Basic {voters[0]}'},
+        json={'score': 1},
+    )
+    data = resp.json()
+    session.refresh(film)
+
+    assert resp.status_code == 200
+    assert data['avg_score'] == 14 / 3
+    assert data['total_scores'] == 3
+    assert film.sum_scores == 14
+
+
+@pytest.mark.usefixtures('user')
+def test_posting_score_after_comment(client, credentials, film):
+    client.post(
+        url=f'/films/{film.id}/comments',
+        headers={'Authorization': f'Basic {credentials}'},
+        json={'comment': 'Nice!'},
+    )
+    resp = client.post(
+        url=f'/films/{film.id}/scores',
+        headers={'Authorization': f'Basic {credentials}'},
+        json={'score': 8},
+    )
+    info = client.get(
+        url=f'/films/{film.id}',
+        headers={'Authorization': f'Basic {credentials}'},
+    ).json()
+
+    assert resp.json()['total_scores'] == 1
+    assert info['total_comments'] == 1
+    assert info['avg_score'] == 8
+
+
+def test_concurrent_first_scores_of_user_count_once(user, film, session):
+    first, second = TestingSessionLocal(), TestingSessionLocal()
+    apply_score(first, user.id, film.id, 4)
+    thread = threading.Thread(target=save_score, args=(second, user.id, film.id, 6))
+    thread.start()
+    time.sleep(0.2)
+    first.commit()
+    thread.join()
+    first.close()
+    second.close()
+
+    session.refresh(film)
+    assert (film.total_scores, film.sum_scores, film.avg_score) == (1, 6, 6)
@@ -0,0 +1,182 @@
+import random
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, delete, func, select, update
+
+from app.db.models import Film, Review, SimilarFilm, SimilarityInput
+from app.similarity import RefreshStats, main, refresh_similar_films, select_top
+from tests.conftest import test_engine
+
+FILMS = [1, 2, 3, 4]
+
+
+@pytest.fixture
+def incremental_only(mocker):
+    # Small test data would otherwise always be refreshed in full
+    mocker.patch('app.similarity.FULL_REFRESH_SHARE', 10)
+
+
+def add_scores(session, users, scores):
+    session.bulk_save_objects(
+        [
+            Review(user_id=users[i].id, film_id=film_id, score=score)
+            for (i, film_id), score in scores.items()
+        ]
+    )
+    session.commit()
+
+
+def get_similar(client, credentials, film_id, **params):
+    return client.get(
+        url=f'/films/{film_id}/similar',
+        headers={'Authorization': f'Basic {credentials}'},
+        params=params,
+    )
+
+
+def stored_neighbours(session):
+    return session.execute(
+        select(
+            SimilarFilm.film_id,
+            SimilarFilm.rank,
+            SimilarFilm.similar_film_id,
+            SimilarFilm.similarity,
+        ).order_by(SimilarFilm.film_id, SimilarFilm.rank)
+    ).all()
+
+
+@pytest.mark.usefixtures('user')
+def test_similar_films_by_cosine_of_scores(client, credentials, session, six_users):
+    add_scores(
+        session,
+        six_users,
+        {(0, 1): 5, (1, 1): 5, (0, 2): 4, (1, 2): 4, (0, 3): 10, (2, 4): 7},
+    )
+
+    assert refresh_similar_films(test_engine)[:3] == (4, 4, 4)
+
+    resp = get_similar(client, credentials, 1)
+    assert resp.status_code == 200
+    assert resp.json()['film_id'] == 1
+    similar = resp.json()['similar_films']
+    assert [(film['film_id'], film['film_name']) for film in similar] == [
+        (2, 'Harry Potter'),
+        (3, 'Harry Potter 2'),
+    ]
+    assert [film['similarity'] for film in similar] == pytest.approx([1, 2 ** -0.5])
+    assert [
+        film['film_id']
+        for film in get_similar(client, credentials, 1, top=1).json()['similar_films']
+    ] == [2]
+    assert get_similar(client, credentials, 4).json()['similar_films'] == []
+
+
+def test_similar_films_of_missing_film(client, credentials):
+    resp = get_similar(client, credentials, 100)
+
+    assert resp.status_code == 404
+    assert resp.json()['detail'] == 'Film with specified id = 100 does not exist'
+
+
+def test_unchanged_scores_are_not_refreshed(session, six_users):
+    add_scores(session, six_users, {(0, 1): 5, (0, 2): 6, (1, 3): 7})
+    refresh_similar_films(test_engine)
+
+    stats = refresh_similar_films(test_engine)
+
+    assert (stats.films, stats.changed, stats.refreshed) == (3, 0, 0)
+
+
+@pytest.mark.usefixtures('incremental_only')
+def test_refresh_updates_only_affected_films(session, six_users):
+    add_scores(session, six_users, {(0, 1): 5, (0, 2): 6, (1, 3): 7, (1, 4): 2})
+    refresh_similar_films(test_engine)
+
+    add_scores(session, six_users, {(2, 3): 9})
+    stats = refresh_similar_films(test_engine)
+
+    assert (stats.changed, stats.refreshed) == (1, 2)
+
+
+def test_refresh_affecting_many_films_is_full(session, six_users):
+    add_scores(session, six_users, {(0, 1): 5, (0, 2): 6, (1, 3): 7, (1, 4): 2})
+    refresh_similar_films(test_engine)
+
+    add_scores(session, six_users, {(2, 3): 9, (2, 1): 3})
+    stats = refresh_similar_films(test_engine)
+    neighbours = stored_neighbours(session)
+    refresh_similar_films(test_engine, full=True)
+
+    assert (stats.changed, stats.refreshed) == (2, 4)
+    assert neighbours == stored_neighbours(session)
+    assert refresh_similar_films(test_engine).changed == 0
+
+
+@pytest.mark.usefixtures('film', 'incremental_only')
+@pytest.mark.parametrize('seed', range(3))
+def test_incremental_refresh_matches_full_refresh(session, six_users, seed):
+    rng = random.Random(seed)
+    films = [*FILMS, 5]
+    add_scores(
+        session,
+        six_users,
+        {
+            (i, film_id): rng.randint(0, 10)
+            for i in range(6)
+            for film_id in rng.sample(films, 3)
+        },
+    )
+    refresh_similar_films(test_engine, top=2)
+
+    reviews = session.execute(select(Review.user_id, Review.film_id)).all()
+    for user_id, film_id in rng.sample(reviews, 3):
+        session.execute(
+            update(Review)
+            .where(Review.user_id == user_id, Review.film_id == film_id)
+            .values(score=rng.randint(0, 10))
+        )
+    user_id, film_id = rng.choice(reviews)
+    session.execute(
+        delete(Review).where(Review.user_id == user_id, Review.film_id == film_id)
+    )
+    session.execute(delete(Review).where(Review.film_id == rng.choice(films)))
+    session.commit()
+
+    refresh_similar_films(test_engine, top=2)
+    incremental = stored_neighbours(session)
+    refresh_similar_films(test_engine, top=2, full=True)
+
+    assert incremental == stored_neighbours(session)
+
+
+def test_ties_are_broken_by_film_id():
+    neighbours = np.array([5, 3, 4, 2])
+    similarities = np.array([0.5, 0.9, 0.5, 0.5])
+
+    assert select_top(neighbours, similarities, 2).tolist() == [1, 3]
+
+
+def test_refreshing_from_command_line(tmp_path, capsys):
+    url = f'sqlite:///{tmp_path / "similarity.db"}'
+    main(['--top', '5', '--db-url', url])
+
+    assert capsys.readouterr().out == str(RefreshStats()) + '\n'
+    engine = create_engine(url)
+    with engine.connect() as connection:
+        assert connection.execute(select(func.count(Film.id))).scalar_one() == 0
+    engine.dispose()
+
+
+@pytest.mark.usefixtures('incremental_only')
+def test_films_without_scores_lose_neighbours(session, six_users):
+    add_scores(session, six_users, {(0, 1): 5, (0, 2): 6})
+    refresh_similar_films(test_engine)
+
+    session.execute(delete(Review).where(Review.film_id == 2))
+    session.commit()
+    stats = refresh_similar_films(test_engine)
+
+    assert (stats.changed, stats.refreshed) == (1, 2)
+    assert stored_neighbours(session) == []
+    assert session.execute(select(SimilarityInput.film_id)).scalars().all() == [1]
@@ -0,0 +1,76 @@
+import bcrypt
+import pytest
+
+import app.utils as utils_module
+from app.tokens import InvalidToken, create_token, get_token_user, sign
+from tests.test_query_plans import capture_statements
+
+
+def issue_token(client, credentials):
+    resp = client.post(url='/token', headers={'Authorization': f'Basic {credentials}'})
+    assert resp.status_code == 200
+    assert resp.json()['token_type'] == 'bearer'
+    return resp.json()['access_token']
+
+
+def test_token_authenticates_without_database(client, user, credentials, film, mocker):
+    access_token = issue_token(client, credentials)
+    checkpw = mocker.spy(bcrypt, 'checkpw')
+    get_user = mocker.spy(utils_module, 'get_user_by_login')
+
+    with capture_statements() as statements:
+        resp = client.post(
+            url=f'/films/{film.id}/scores',
+            headers={'Authorization': f'Bearer {access_token}'},
+            json={'score': 7},
+        )
+
+    assert resp.status_code == 200
+    assert not [statement for statement, _ in statements if '"User"' in statement]
+    assert checkpw.call_count == 0
+    assert get_user.call_count == 0
+    assert get_token_user(access_token) == user.id
+
+
+def test_token_is_not_issued_for_wrong_password(client, user):
+    resp = client.post(url='/token', auth=(user.login, 'wrong'))
+
+    assert resp.status_code == 401
+    assert resp.json()['detail'] == 'Incorrect login or password'
+
+
+@pytest.mark.parametrize(
+    'token',
+    [
+        'abc',
+        'a.b.c',
+        create_token(1, ttl=-1),
+        create_token(1) + 'x',
+        create_token(1).rsplit('.', 1)[0] + '.' + create_token(2).rsplit('.', 1)[1],
+    ],
+)
+def test_invalid_tokens_are_rejected(client, film, token):
+    resp = client.get(
+        url=f'/films/{film.id}', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert resp.status_code == 401
+    assert resp.json()['detail'] == 'Invalid or expired token'
+    assert resp.headers['WWW-Authenticate'] == 'Bearer'
+
+
+def test_tokens_expire():
+    token = create_token(3, ttl=60, now=1000)
+
+    assert get_token_user(token, now=1059) == 3
+    with pytest.raises(InvalidToken):
+        get_token_user(token, now=1060)
+
+
+@pytest.mark.parametrize('payload', ['!!!', 'W10', 'eyJzdWIiOiJ4In0'])
+def test_tokens_with_malformed_payload_are_invalid(payload):
+    header = create_token(1).split('.')[0]
+    message = f'{header}.{payload}'.encode()
+
+    with pytest.raises(InvalidToken):
+        get_token_user(f'{message.decode()}.{sign(message).decode()}')
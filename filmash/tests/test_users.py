@@ -1,3 +1,5 @@
+import base64
+
 import pytest
 
 
@@ -44,3 +46,75 @@ def test_registering_user_login_with_spaces(client):
             'type': 'value_error',
         }
     ]
+
+
+@pytest.mark.usefixtures('bcrypt_process_pool')
+def test_registering_user_with_bcrypt_process_pool(client):
+    resp = client.post(url='/users', json={'login': 'user', 'password': '12345'})
+    credentials = base64.b64encode(b'user:12345').decode()
+
+    assert resp.status_code == 200
+    assert resp.json()['registered_login'] == 'user'
+    assert (
+        client.get(
+            url='/films/1', headers={'Authorization': f'Basic {credentials}'}
+        ).status_code
+        == 200
+    )
+
+
+@pytest.mark.usefixtures('reviews', 'page_size_3')
+def test_listing_reviews_of_user(client, credentials):
+    headers = {'Authorization': f'Basic {credentials}'}
+    first = client.get(url='/users/user/reviews?page=1', headers=headers).json()
+    second = client.get(
+        url=f'/users/user/reviews?cursor={first["next_cursor"]}', headers=headers
+    ).json()
+
+    assert first['reviews'] == [
+        {'film_id': 1, 'film_name': 'Lord of the Rings', 'score': 10, 'comment': None},
+        {'film_id': 2, 'film_name': 'Harry Potter', 'score': 3, 'comment': None},
+        {'film_id': 3, 'film_name': 'Harry Potter 2', 'score': 6, 'comment': None},
+    ]
+    assert (first['login'], first['page'], first['total_pages']) == ('user', 1, 2)
+    assert second['reviews'] == [
+        {'film_id': 4, 'film_name': 'The Matrix', 'score': 1, 'comment': None}
+    ]
+    assert second['next_cursor'] is None
+
+
+@pytest.mark.usefixtures('reviews')
+def test_listing_commented_reviews_of_user(client, credentials):
+    resp = client.get(
+        url='/users/user_4/reviews', headers={'Authorization': f'Basic {credentials}'}
+    )
+
+    assert resp.status_code == 200
+    assert resp.json()['reviews'] == [
+        {'film_id': 5, 'film_name': 'Inception', 'score': 2, 'comment': 'Bad..'}
+    ]
+
+
+@pytest.mark.usefixtures('user')
+def test_listing_reviews_of_user_without_reviews(client, credentials):
+    resp = client.get(
+        url='/users/user/reviews?page=1',
+        headers={'Authorization': f'Basic {credentials}'},
+    )
+
+    assert resp.json() == {
+        'login': 'user',
+        'reviews': [],
+        'page': 1,
+        'total_pages': 1,
+        'next_cursor': None,
+    }
+
+
+def test_listing_reviews_of_unknown_user(client, credentials):
+    resp = client.get(
+        url='/users/nobody/reviews', headers={'Authorization': f'Basic {credentials}'}
+    )
+
+    assert resp.status_code == 404
+    assert resp.json()['detail'] == 'User with specified login = nobody does not exist'
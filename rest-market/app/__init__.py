@@ -1,17 +1,21 @@
+import atexit
 from multiprocessing.context import Process
 from typing import Any
 
 from flask import Flask, jsonify
 
-from app.config import WORKER_UPDATE_DELAY
+from app.config import MARKET_ENGINE, WORKER_UPDATE_DELAY
 from app.crypto import crypto as crypto_bp
 from app.db.types import DecimalJSONEncoder
 from app.db.utils import init_db, update_prices_permanently
 from app.exceptions import InvalidUsage
+from app.market import Market
 from app.users import users as users_bp
 
 
-def create_app(should_init_db: bool = True) -> Flask:
+def create_app(
+    should_init_db: bool = True, use_market_engine: bool = MARKET_ENGINE
+) -> Flask:
     app = Flask(__name__)
     app.json_encoder = DecimalJSONEncoder
 
@@ -30,7 +34,17 @@ def create_app(should_init_db: bool = True) -> Flask:
     if should_init_db:
         init_db()
 
-    app.worker = Process(target=update_prices_permanently, args=(WORKER_UPDATE_DELAY,))
-    app.worker.start()
+    if use_market_engine:
+        # The engine updates prices itself, in memory
+        app.market = Market()
+        app.market.start(WORKER_UPDATE_DELAY)
+        atexit.register(app.market.stop)
+        app.worker = None
+    else:
+        app.market = None
+        app.worker = Process(
+            target=update_prices_permanently, args=(WORKER_UPDATE_DELAY,)
+        )
+        app.worker.start()
 
     return app
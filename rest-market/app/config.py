@@ -3,8 +3,20 @@ import decimal
 WORKER_UPDATE_DELAY = 10
 
 SQLITE_DECIMAL_SCALE = 5
+BALANCE_DECIMAL_SCALE = 2
 decimal.getcontext().prec = SQLITE_DECIMAL_SCALE
 
 PRICE_SCALE_FACTOR_IN_PERCENTS = 10
 
 TRANSACTIONS_PER_PAGE = 2
+
+# Trades are validated and applied in memory by app.market and written to the
+# database from the journal in batches. Without it every trade is a transaction
+# of the database, so several processes may serve the app
+MARKET_ENGINE = True
+JOURNAL_PATH = 'market.journal'
+JOURNAL_BATCH_SIZE = 1000
+JOURNAL_FLUSH_DELAY = 1
+# Sync the journal to disk on every entry. Otherwise entries survive a crash
+# of the process, but not of the machine
+JOURNAL_FSYNC = False
@@ -1,5 +1,6 @@
 from datetime import datetime
-from typing import Any
+from functools import wraps
+from typing import Any, Callable
 
 from flask import Blueprint, jsonify
 from flask_pydantic import validate
@@ -12,8 +13,9 @@ from app.db.models import (
     TransactionType,
     User,
 )
-from app.db.utils import create_session, get_user_by_login
+from app.db.utils import create_session, get_cryptocurrency_by_name, get_user_by_login
 from app.exceptions import InvalidUsage
+from app.market import get_market
 from app.pydantic_models import (
     CryptoTransactionRequestBodyModel,
     NewCryptoRequestBodyModel,
@@ -24,16 +26,19 @@ crypto = Blueprint('crypto', __name__, url_prefix='/cryptocurrencies')
 
 @crypto.route('/<string:crypto_name>/prices', methods=['GET'])
 def get_cryptocurrency_prices(crypto_name: str) -> Any:
-    with create_session() as session:
-        cryptocurrency = (
-            session.query(CryptoCurrency)
-            .filter(CryptoCurrency.name == crypto_name)
-            .first()
+    market = get_market()
+    if market:
+        quote = market.get_quote(crypto_name)
+        return jsonify(
+            {
+                'crypto_name': crypto_name,
+                'sale_price': quote.sale_price,
+                'purchase_price': quote.purchase_price,
+            }
         )
-        if not cryptocurrency:
-            raise InvalidUsage(
-                'Cryptocurrency with specified name does not exist', status_code=404
-            )
+
+    with create_session() as session:
+        cryptocurrency = get_cryptocurrency_by_name(session, crypto_name)
         sale_price = cryptocurrency.sale_price
         purchase_price = cryptocurrency.purchase_price
 
@@ -77,8 +82,36 @@ def create_new_cryptocurrency(body: NewCryptoRequestBodyModel) -> Any:
     )
 
 
+def in_market(
+    transaction_type: PredefinedTransactionTypes,
+) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Trade in the market engine instead of the database, if the app runs it."""
+
+    def decorator(view: Callable[..., Any]) -> Callable[..., Any]:
+        @wraps(view)
+        def trade(body: CryptoTransactionRequestBodyModel) -> Any:
+            market = get_market()
+            if not market:
+                return view(body=body)
+            utc_datetime = body.utc_datetime if body.utc_datetime else datetime.utcnow()
+            apply_trade = (
+                market.buy
+                if transaction_type == PredefinedTransactionTypes.BUY
+                else market.sell
+            )
+            transaction_id = apply_trade(
+                body.login, body.crypto_name, body.amount, utc_datetime
+            )
+            return jsonify({'login': body.login, 'transaction_id': transaction_id})
+
+        return trade
+
+    return decorator
+
+
 @crypto.route('/buy', methods=['PUT'])
 @validate()
+@in_market(PredefinedTransactionTypes.BUY)
 def buy_cryptocurrency(body: CryptoTransactionRequestBodyModel) -> Any:
     utc_datetime = body.utc_datetime if body.utc_datetime else datetime.utcnow()
     login, crypto_name = body.login, body.crypto_name
@@ -92,15 +125,7 @@ def buy_cryptocurrency(body: CryptoTransactionRequestBodyModel) -> Any:
             .filter(TransactionType.name == transaction_type_name)
             .first()
         )
-        cryptocurrency = (
-            session.query(CryptoCurrency)
-            .filter(CryptoCurrency.name == crypto_name)
-            .first()
-        )
-        if not cryptocurrency:
-            raise InvalidUsage(
-                'Cryptocurrency with specified name does not exist', status_code=404
-            )
+        cryptocurrency = get_cryptocurrency_by_name(session, crypto_name)
 
         if cryptocurrency.last_update >= utc_datetime:
             raise InvalidUsage('Price of the specified cryptocurrency was updated')
@@ -136,6 +161,7 @@ def buy_cryptocurrency(body: CryptoTransactionRequestBodyModel) -> Any:
 
 @crypto.route('/sell', methods=['PUT'])
 @validate()
+@in_market(PredefinedTransactionTypes.SELL)
 def sell_cryptocurrency(body: CryptoTransactionRequestBodyModel) -> Any:
     utc_datetime = body.utc_datetime if body.utc_datetime else datetime.utcnow()
     login = body.login
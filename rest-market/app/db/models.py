@@ -6,7 +6,7 @@ from sqlalchemy.ext.declarative import DeclarativeMeta, declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
-from app.config import SQLITE_DECIMAL_SCALE
+from app.config import BALANCE_DECIMAL_SCALE, SQLITE_DECIMAL_SCALE
 from app.db.types import SqliteDecimal
 
 Base: DeclarativeMeta = declarative_base()
@@ -17,7 +17,7 @@ class User(Base):
     id = Column(Integer, primary_key=True)
     login = Column(String, unique=True, nullable=False)
     balance = Column(
-        SqliteDecimal(2),
+        SqliteDecimal(BALANCE_DECIMAL_SCALE),
         CheckConstraint('balance >= 0'),
         nullable=False,
         default=Decimal('1000'),
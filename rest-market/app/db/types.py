@@ -47,6 +47,12 @@ class SqliteDecimal(TypeDecorator):
         return Decimal
 
 
+def truncate_decimal(value: Decimal, scale: int) -> Decimal:
+    """The value as it is stored in a column of SqliteDecimal(scale)."""
+    multiplier = 10 ** scale
+    return Decimal(int(value * multiplier)) / multiplier
+
+
 class DecimalJSONEncoder(JSONEncoder):
     def default(self, o: Any) -> str:
         if isinstance(o, Decimal):
@@ -60,23 +60,21 @@ def insert_initial_cryptocurrencies() -> None:
             )
 
 
+def scale_price(price: Decimal) -> Decimal:
+    factor = Decimal(
+        random.randrange(
+            -PRICE_SCALE_FACTOR_IN_PERCENTS, PRICE_SCALE_FACTOR_IN_PERCENTS
+        )
+    )
+    return price + price * factor / 100
+
+
 def update_purchase_and_sale_prices() -> None:
     with create_session() as session:
         cryptocurrencies = session.query(CryptoCurrency).with_for_update().all()
         for crypto in cryptocurrencies:
-            sale_factor = Decimal(
-                random.randrange(
-                    -PRICE_SCALE_FACTOR_IN_PERCENTS, PRICE_SCALE_FACTOR_IN_PERCENTS
-                )
-            )
-            crypto.sale_price += crypto.sale_price * sale_factor / 100
-
-            purchase_factor = Decimal(
-                random.randrange(
-                    -PRICE_SCALE_FACTOR_IN_PERCENTS, PRICE_SCALE_FACTOR_IN_PERCENTS
-                )
-            )
-            crypto.purchase_price += crypto.purchase_price * purchase_factor / 100
+            crypto.sale_price = scale_price(crypto.sale_price)
+            crypto.purchase_price = scale_price(crypto.purchase_price)
 
 
 def update_prices_permanently(delay_in_seconds: int) -> None:
@@ -119,3 +117,14 @@ def get_user_by_login(session: Any, login: str) -> Any:
     if not user:
         raise InvalidUsage('User with specified login does not exist', status_code=404)
     return user
+
+
+def get_cryptocurrency_by_name(session: Any, crypto_name: str) -> Any:
+    cryptocurrency = (
+        session.query(CryptoCurrency).filter(CryptoCurrency.name == crypto_name).first()
+    )
+    if not cryptocurrency:
+        raise InvalidUsage(
+            'Cryptocurrency with specified name does not exist', status_code=404
+        )
+    return cryptocurrency
@@ -0,0 +1,232 @@
+"""Append-only journal of the market engine.
+
+Every trade and price change is appended to the journal file before the
+engine applies it and is written to the database later, in batches. Entries
+hold the resulting balance, holding and prices rather than their changes,
+so writing a batch once more, e.g. after a crash in the middle of it, leaves
+the database the same.
+"""
+import json
+import os
+import threading
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple, Union
+
+from sqlalchemy import and_, bindparam, insert, update
+
+from app.config import JOURNAL_FSYNC
+from app.db.models import CryptoCurrency, Portfolio, Transaction, User
+
+
+class Trade(NamedTuple):
+    transaction_id: int
+    user_id: int
+    type_id: int
+    cryptocurrency_id: int
+    amount: Decimal
+    balance: Decimal
+    holding: Decimal
+
+
+class PriceChange(NamedTuple):
+    cryptocurrency_id: int
+    sale_price: Decimal
+    purchase_price: Decimal
+    last_update: datetime
+
+
+Entry = Union[Trade, PriceChange]
+
+ENTRY_TYPES = {entry_type.__name__: entry_type for entry_type in (Trade, PriceChange)}
+PARSERS: Dict[Any, Callable[[Any], Any]] = {
+    int: int,
+    Decimal: Decimal,
+    datetime: datetime.fromisoformat,
+}
+
+
+def dump_entry(entry: Entry) -> str:
+    return json.dumps([type(entry).__name__, *entry], default=str)
+
+
+def load_entry(line: str) -> Entry:
+    name, *values = json.loads(line)
+    entry_type = ENTRY_TYPES[name]
+    return entry_type(  # type: ignore
+        *(
+            PARSERS[field_type](value)
+            for field_type, value in zip(entry_type.__annotations__.values(), values)
+        )
+    )
+
+
+def split_torn_line(path: str) -> Tuple[bytes, bytes]:
+    """Complete lines of the file and the last line, if a crash cut it short."""
+    with open(path, 'rb') as file:
+        content = file.read()
+    end = content.rfind(b'\n') + 1
+    return content[:end], content[end:]
+
+
+def read_entries(path: str) -> List[Entry]:
+    if not os.path.exists(path):
+        return []
+    # The torn line was not applied, any other unreadable one is an error
+    lines, _ = split_torn_line(path)
+    entries = []
+    for number, line in enumerate(lines.decode().splitlines(), start=1):
+        try:
+            entries.append(load_entry(line))
+        except (ValueError, KeyError, TypeError) as e:
+            raise ValueError(f'Invalid entry at line {number} of {path}') from e
+    return entries
+
+
+def cut_torn_line(path: str) -> None:
+    """Entries appended next must not continue the torn line."""
+    if os.path.exists(path):
+        lines, torn_line = split_torn_line(path)
+        if torn_line:
+            os.truncate(path, len(lines))
+
+
+class Journal:
+    """Entries appended to the file at `path` and not written to the
+    database yet.
+
+    A batch being written is moved to `<path>.batch`, so that entries
+    appended meanwhile go to a new file. A batch that failed to be written
+    stays there and is written again with the next one.
+    """
+
+    def __init__(self, path: str, fsync: bool = JOURNAL_FSYNC) -> None:
+        self.path = path
+        self.batch_path = f'{path}.batch'
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        cut_torn_line(self.batch_path)
+        cut_torn_line(self.path)
+        self._batch = read_entries(self.batch_path)
+        self._entries = read_entries(self.path)
+        self._file = open(self.path, 'a')
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def append(self, entry: Entry) -> None:
+        line = dump_entry(entry) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._entries.append(entry)
+
+    def take_batch(self) -> List[Entry]:
+        """Entries to write to the database, followed by `commit_batch`."""
+        with self._lock:
+            if self._entries:
+                self._file.close()
+                if self._batch:
+                    with open(self.path) as new, open(self.batch_path, 'a') as batch:
+                        batch.write(new.read())
+                    os.remove(self.path)
+                else:
+                    os.replace(self.path, self.batch_path)
+                self._file = open(self.path, 'a')
+                self._batch += self._entries
+                self._entries = []
+            return list(self._batch)
+
+    def commit_batch(self) -> None:
+        with self._lock:
+            if self._batch:
+                os.remove(self.batch_path)
+                self._batch = []
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def write_entries(session: Any, entries: List[Entry]) -> None:
+    trades = [entry for entry in entries if isinstance(entry, Trade)]
+    # Only the last balance, holding and prices matter
+    balances = {trade.user_id: trade.balance for trade in trades}
+    holdings = {
+        (trade.user_id, trade.cryptocurrency_id): trade.holding for trade in trades
+    }
+    prices = {
+        entry.cryptocurrency_id: entry
+        for entry in entries
+        if isinstance(entry, PriceChange)
+    }
+
+    if trades:
+        session.execute(
+            insert(Transaction).prefix_with('OR IGNORE'),
+            [
+                {
+                    'id': trade.transaction_id,
+                    'user_id': trade.user_id,
+                    'type_id': trade.type_id,
+                    'cryptocurrency_id': trade.cryptocurrency_id,
+                    'amount': trade.amount,
+                }
+                for trade in trades
+            ],
+        )
+        session.execute(
+            update(User)
+            .where(User.id == bindparam('user_id'))
+            .values(balance=bindparam('new_balance')),
+            [
+                {'user_id': user_id, 'new_balance': balance}
+                for user_id, balance in balances.items()
+            ],
+        )
+        # Existing records are updated in place to keep the order of portfolios
+        holding_params = [
+            {'holder_id': user_id, 'crypto_id': crypto_id, 'new_amount': amount}
+            for (user_id, crypto_id), amount in holdings.items()
+        ]
+        session.execute(
+            insert(Portfolio)
+            .prefix_with('OR IGNORE')
+            .values(
+                user_id=bindparam('holder_id'),
+                cryptocurrency_id=bindparam('crypto_id'),
+                amount=bindparam('new_amount'),
+            ),
+            holding_params,
+        )
+        session.execute(
+            update(Portfolio)
+            .where(
+                and_(
+                    Portfolio.user_id == bindparam('holder_id'),
+                    Portfolio.cryptocurrency_id == bindparam('crypto_id'),
+                )
+            )
+            .values(amount=bindparam('new_amount')),
+            holding_params,
+        )
+    if prices:
+        session.execute(
+            update(CryptoCurrency)
+            .where(CryptoCurrency.id == bindparam('crypto_id'))
+            .values(
+                sale_price=bindparam('new_sale_price'),
+                purchase_price=bindparam('new_purchase_price'),
+                last_update=bindparam('new_last_update'),
+            ),
+            [
+                {
+                    'crypto_id': crypto_id,
+                    'new_sale_price': change.sale_price,
+                    'new_purchase_price': change.purchase_price,
+                    'new_last_update': change.last_update,
+                }
+                for crypto_id, change in prices.items()
+            ],
+        )
@@ -0,0 +1,277 @@
+"""In-memory market engine.
+
+Prices and portfolios are held in memory, so trades are validated and
+applied without queries, under a lock of the user. Every trade and price
+change is appended to the journal first and is written to the database by a
+background thread, in batches of up to JOURNAL_BATCH_SIZE entries every
+JOURNAL_FLUSH_DELAY seconds. The engine must be the only one to change
+balances, portfolios and prices, so the app runs in a single process with it.
+"""
+import itertools
+import logging
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, NamedTuple, Optional
+
+from flask import current_app
+from sqlalchemy import func
+
+from app.config import (
+    BALANCE_DECIMAL_SCALE,
+    JOURNAL_BATCH_SIZE,
+    JOURNAL_FLUSH_DELAY,
+    JOURNAL_PATH,
+    SQLITE_DECIMAL_SCALE,
+)
+from app.db.models import (
+    CryptoCurrency,
+    PredefinedTransactionTypes,
+    Transaction,
+    TransactionType,
+)
+from app.db.types import truncate_decimal
+from app.db.utils import (
+    create_session,
+    get_cryptocurrency_by_name,
+    get_user_by_login,
+    scale_price,
+)
+from app.exceptions import InvalidUsage
+from app.journal import Journal, PriceChange, Trade, write_entries
+
+logger = logging.getLogger(__name__)
+
+
+class Quote(NamedTuple):
+    cryptocurrency_id: int
+    sale_price: Decimal
+    purchase_price: Decimal
+    last_update: datetime
+
+
+class Account:
+    def __init__(
+        self, user_id: int, balance: Decimal, portfolio: Dict[str, Decimal]
+    ) -> None:
+        self.user_id = user_id
+        self.balance = balance
+        self.portfolio = portfolio
+        self.lock = threading.Lock()
+
+
+def load_account(login: str) -> Account:
+    with create_session() as session:
+        user = get_user_by_login(session, login)
+        portfolio = {
+            record.cryptocurrency.name: record.amount for record in user.portfolio
+        }
+        return Account(user.id, user.balance, portfolio)
+
+
+def load_quote(crypto_name: str) -> Quote:
+    with create_session() as session:
+        cryptocurrency = get_cryptocurrency_by_name(session, crypto_name)
+        return Quote(
+            cryptocurrency.id,
+            cryptocurrency.sale_price,
+            cryptocurrency.purchase_price,
+            cryptocurrency.last_update,
+        )
+
+
+class Market:
+    """Accounts are loaded on their first trade or request, cryptocurrencies
+    on start and after being created."""
+
+    def __init__(self, journal_path: Optional[str] = None) -> None:
+        self.journal = Journal(journal_path or JOURNAL_PATH)
+        self._flush_lock = threading.Lock()
+        # Entries left by the previous run come first
+        self.flush()
+
+        with create_session() as session:
+            self._quotes = {
+                crypto.name: Quote(
+                    crypto.id,
+                    crypto.sale_price,
+                    crypto.purchase_price,
+                    crypto.last_update,
+                )
+                for crypto in session.query(CryptoCurrency)
+            }
+            self._type_ids = {
+                PredefinedTransactionTypes(name): type_id
+                for type_id, name in session.query(
+                    TransactionType.id, TransactionType.name
+                )
+            }
+            last_transaction_id = session.query(func.max(Transaction.id)).scalar()
+        self._transaction_ids = itertools.count((last_transaction_id or 0) + 1)
+        self._accounts: Dict[str, Account] = {}
+        self._accounts_lock = threading.Lock()
+
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def get_quote(self, crypto_name: str) -> Quote:
+        quote = self._quotes.get(crypto_name)
+        if quote is None:
+            quote = self._quotes[crypto_name] = load_quote(crypto_name)
+        return quote
+
+    def get_account(self, login: str) -> Account:
+        account = self._accounts.get(login)
+        if account is None:
+            with self._accounts_lock:
+                account = self._accounts.get(login)
+                if account is None:
+                    account = self._accounts[login] = load_account(login)
+        return account
+
+    def get_portfolio(self, login: str) -> Dict[str, Decimal]:
+        account = self.get_account(login)
+        with account.lock:
+            return dict(account.portfolio)
+
+    def buy(
+        self, login: str, crypto_name: str, amount: Decimal, utc_datetime: datetime
+    ) -> int:
+        account = self.get_account(login)
+        quote = self.get_quote(crypto_name)
+        check_quote_is_actual(quote, utc_datetime)
+
+        with account.lock:
+            cost = amount * quote.purchase_price
+            if account.balance < cost:
+                raise InvalidUsage("You don't have enough credits in the account")
+            balance = truncate_decimal(account.balance - cost, BALANCE_DECIMAL_SCALE)
+            holding = account.portfolio.get(crypto_name, Decimal(0)) + amount
+            return self._apply_trade(
+                account,
+                PredefinedTransactionTypes.BUY,
+                crypto_name,
+                amount,
+                balance,
+                holding,
+            )
+
+    def sell(
+        self, login: str, crypto_name: str, amount: Decimal, utc_datetime: datetime
+    ) -> int:
+        account = self.get_account(login)
+        quote = self.get_quote(crypto_name)
+        check_quote_is_actual(quote, utc_datetime)
+
+        with account.lock:
+            holding = account.portfolio.get(crypto_name)
+            if holding is None:
+                raise InvalidUsage(
+                    "You don't have the specified cryptocurrency in your portfolio"
+                )
+            if holding < amount:
+                raise InvalidUsage("You don't have enough crypto in your portfolio")
+            balance = truncate_decimal(
+                account.balance + amount * quote.sale_price, BALANCE_DECIMAL_SCALE
+            )
+            return self._apply_trade(
+                account,
+                PredefinedTransactionTypes.SELL,
+                crypto_name,
+                amount,
+                balance,
+                holding - amount,
+            )
+
+    def _apply_trade(  # pylint: disable=too-many-arguments
+        self,
+        account: Account,
+        transaction_type: PredefinedTransactionTypes,
+        crypto_name: str,
+        amount: Decimal,
+        balance: Decimal,
+        holding: Decimal,
+    ) -> int:
+        holding = truncate_decimal(holding, SQLITE_DECIMAL_SCALE)
+        transaction_id = next(self._transaction_ids)
+        self.journal.append(
+            Trade(
+                transaction_id,
+                account.user_id,
+                self._type_ids[transaction_type],
+                self._quotes[crypto_name].cryptocurrency_id,
+                amount,
+                balance,
+                holding,
+            )
+        )
+        account.balance = balance
+        account.portfolio[crypto_name] = holding
+        if len(self.journal) >= JOURNAL_BATCH_SIZE:
+            self._wakeup.set()
+        return transaction_id
+
+    def update_prices(self) -> None:
+        for crypto_name, quote in list(self._quotes.items()):
+            change = PriceChange(
+                quote.cryptocurrency_id,
+                truncate_decimal(scale_price(quote.sale_price), SQLITE_DECIMAL_SCALE),
+                truncate_decimal(
+                    scale_price(quote.purchase_price), SQLITE_DECIMAL_SCALE
+                ),
+                datetime.utcnow(),
+            )
+            self.journal.append(change)
+            self._quotes[crypto_name] = Quote(*change)
+
+    def flush(self) -> None:
+        """Write the journal to the database."""
+        with self._flush_lock:
+            entries = self.journal.take_batch()
+            if entries:
+                with create_session() as session:
+                    write_entries(session, entries)
+                self.journal.commit_batch()
+
+    def start(self, price_update_delay: Optional[float] = None) -> None:
+        """Flush the journal and update prices every `price_update_delay`
+        seconds in the background."""
+        self._thread = threading.Thread(
+            target=self._run, args=(price_update_delay,), daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join()
+        self.flush()
+        self.journal.close()
+
+    def _run(self, price_update_delay: Optional[float]) -> None:
+        last_price_update = time.monotonic()
+        while not self._stopped.is_set():
+            self._wakeup.wait(JOURNAL_FLUSH_DELAY)
+            self._wakeup.clear()
+            if (
+                price_update_delay is not None
+                and time.monotonic() - last_price_update >= price_update_delay
+            ):
+                self.update_prices()
+                last_price_update = time.monotonic()
+            try:
+                self.flush()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception('Failed to write the journal to the database')
+
+
+def check_quote_is_actual(quote: Quote, utc_datetime: datetime) -> None:
+    if quote.last_update >= utc_datetime:
+        raise InvalidUsage('Price of the specified cryptocurrency was updated')
+
+
+def get_market() -> Optional[Market]:
+    return current_app.market
@@ -7,6 +7,7 @@ from app.config import TRANSACTIONS_PER_PAGE
 from app.db.models import Transaction, User
 from app.db.utils import create_session, get_user_by_login
 from app.exceptions import InvalidUsage
+from app.market import get_market
 from app.pydantic_models import LoginRequestBodyModel, PaginationQueryModel
 
 users = Blueprint('users', __name__, url_prefix='/users')
@@ -32,6 +33,10 @@ def register_new_user(body: LoginRequestBodyModel) -> Any:
 
 @users.route('/<string:login>/balance', methods=['GET'])
 def get_balance(login: str) -> Any:
+    market = get_market()
+    if market:
+        return jsonify({'login': login, 'balance': market.get_account(login).balance})
+
     with create_session() as session:
         user = get_user_by_login(session, login)
         balance = user.balance
@@ -41,6 +46,14 @@ def get_balance(login: str) -> Any:
 
 @users.route('/<string:login>/portfolio')
 def get_portfolio(login: str) -> Any:
+    market = get_market()
+    if market:
+        portfolio = [
+            {'cryptocurrency': crypto_name, 'amount': amount}
+            for crypto_name, amount in market.get_portfolio(login).items()
+        ]
+        return jsonify({'login': login, 'portfolio': portfolio})
+
     with create_session() as session:
         user = get_user_by_login(session, login)
         user_cryptocurrencies = user.portfolio
@@ -57,6 +70,10 @@ def get_portfolio(login: str) -> Any:
 @validate()
 def get_transactions_history(login: str, query: PaginationQueryModel) -> Any:
     page = query.page - 1
+    market = get_market()
+    if market:
+        # History is read from the database, along with the latest trades
+        market.flush()
 
     with create_session() as session:
         user = get_user_by_login(session, login)
@@ -9,7 +9,7 @@ from app.db.utils import create_session, init_db, teardown_db
 
 @pytest.fixture()
 def app():
-    return create_app(should_init_db=False)
+    return create_app(should_init_db=False, use_market_engine=False)
 
 
 @pytest.fixture()
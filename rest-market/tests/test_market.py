@@ -0,0 +1,271 @@
+# pylint: disable=redefined-outer-name
+
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+from typing import List
+
+import pytest
+
+from app import create_app
+from app.db.models import CryptoCurrency, Transaction, User
+from app.db.utils import create_session
+from app.exceptions import InvalidUsage
+from app.journal import Entry, Journal, PriceChange, Trade, dump_entry, read_entries
+from app.market import Market
+
+
+@pytest.fixture()
+def journal_path(mocker, tmp_path):
+    path = str(tmp_path / 'market.journal')
+    mocker.patch('app.market.JOURNAL_PATH', path)
+    return path
+
+
+@pytest.fixture()
+def market(journal_path):  # pylint: disable=unused-argument
+    new_market = Market()
+    yield new_market
+    new_market.stop()
+
+
+@pytest.fixture()
+def market_client(app, market):
+    app.config['TESTING'] = True
+    app.worker.terminate()
+    app.market = market
+    with app.test_client() as test_client:
+        yield test_client
+
+
+def trade(client, user, operation, crypto_name='bitcoin', amount=1, **params):
+    return client.put(
+        f'/cryptocurrencies/{operation}',
+        json=dict(login=user.login, crypto_name=crypto_name, amount=amount, **params),
+        follow_redirects=True,
+    )
+
+
+def stored_transactions():
+    with create_session() as session:
+        return session.query(Transaction.id, Transaction.amount).all()
+
+
+def test_trades_are_written_in_batches(market_client, market, user, bitcoin):
+    assert trade(market_client, user, 'buy', amount=2).get_json() == {
+        'login': user.login,
+        'transaction_id': 1,
+    }
+    assert trade(market_client, user, 'sell').get_json()['transaction_id'] == 2
+
+    balance = Decimal('1000') - 2 * bitcoin.purchase_price + bitcoin.sale_price
+    resp = market_client.get(f'/users/{user.login}/balance', follow_redirects=True)
+    assert resp.get_json()['balance'] == str(balance)
+    assert stored_transactions() == []
+
+    market.flush()
+
+    assert stored_transactions() == [(1, 2), (2, 1)]
+    with create_session() as session:
+        stored_user = session.query(User).get(user.id)
+        assert stored_user.balance == balance
+        assert [
+            (it.cryptocurrency.name, it.amount) for it in stored_user.portfolio
+        ] == [('bitcoin', 1)]
+
+
+@pytest.mark.parametrize(
+    'order, message',
+    [
+        (('buy', 'bitcoin', 1000), "You don't have enough credits in the account"),
+        (('sell', 'bitcoin', 3), "You don't have enough crypto in your portfolio"),
+        (
+            ('sell', 'dogecoin', 1),
+            "You don't have the specified cryptocurrency in your portfolio",
+        ),
+    ],
+)
+def test_invalid_trades(market_client, user, order, message):
+    trade(market_client, user, 'buy', amount=2)
+
+    resp = trade(market_client, user, *order)
+
+    assert resp.status_code == 400
+    assert resp.get_json()['message'] == message
+
+
+def test_trades_at_outdated_prices(market_client, user):
+    resp = trade(market_client, user, 'buy', utc_datetime='2000-01-01T00:00:00')
+
+    assert resp.status_code == 400
+    assert (
+        resp.get_json()['message']
+        == 'Price of the specified cryptocurrency was updated'
+    )
+
+
+def test_missing_user_and_cryptocurrency(market_client, user):
+    resp = market_client.get('/users/ABC/portfolio', follow_redirects=True)
+    assert resp.status_code == 404
+    assert resp.get_json()['message'] == 'User with specified login does not exist'
+
+    resp = trade(market_client, user, 'buy', crypto_name='ABC')
+    assert resp.status_code == 404
+    assert (
+        resp.get_json()['message']
+        == 'Cryptocurrency with specified name does not exist'
+    )
+
+
+def test_portfolio_and_history(market_client, user):
+    for crypto_name in ('bitcoin', 'ethereum', 'bitcoin'):
+        trade(market_client, user, 'buy', crypto_name)
+
+    resp = market_client.get(f'/users/{user.login}/portfolio', follow_redirects=True)
+    assert resp.get_json()['portfolio'] == [
+        {'cryptocurrency': 'bitcoin', 'amount': '2'},
+        {'cryptocurrency': 'ethereum', 'amount': '1'},
+    ]
+    resp = market_client.get(f'/users/{user.login}/history?page=2')
+    assert resp.get_json()['history'] == [
+        {'crypto_name': 'bitcoin', 'operation_type': 'buy', 'amount': '1'}
+    ]
+
+
+def test_new_cryptocurrency_is_traded(market_client, user):
+    market_client.post(
+        '/cryptocurrencies',
+        json=dict(crypto_name='testcoin', sale_price='10', purchase_price='20'),
+        follow_redirects=True,
+    )
+
+    assert trade(market_client, user, 'buy', 'testcoin').status_code == 200
+    resp = market_client.get(f'/users/{user.login}/balance', follow_redirects=True)
+    assert resp.get_json()['balance'] == '980'
+
+
+def test_prices_are_updated_in_memory(market_client, market, bitcoin):
+    market.update_prices()
+
+    resp = market_client.get('/cryptocurrencies/bitcoin/prices', follow_redirects=True)
+    quote = market.get_quote('bitcoin')
+    assert resp.get_json()['sale_price'] == str(quote.sale_price)
+    assert quote.last_update > bitcoin.last_update
+
+    market.flush()
+    with create_session() as session:
+        stored = session.query(CryptoCurrency).filter_by(name='bitcoin').one()
+        assert (stored.sale_price, stored.purchase_price, stored.last_update) == (
+            quote.sale_price,
+            quote.purchase_price,
+            quote.last_update,
+        )
+
+
+def test_concurrent_trades_of_user(market, user, bitcoin):
+    login = user.login
+    errors = []
+
+    def buy():
+        try:
+            market.buy(login, 'bitcoin', Decimal(1), datetime.utcnow())
+        except InvalidUsage as e:
+            errors.append(e.message)
+
+    threads = [threading.Thread(target=buy) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    bought = int(Decimal('1000') / bitcoin.purchase_price)
+    account = market.get_account(login)
+    assert errors == ["You don't have enough credits in the account"] * (20 - bought)
+    assert account.portfolio == {'bitcoin': bought}
+    assert account.balance == Decimal('1000') - bought * bitcoin.purchase_price
+
+
+def test_journal_is_replayed_after_crash(journal_path, user, bitcoin):
+    market = Market()
+    market.buy(user.login, 'bitcoin', Decimal(1), datetime.utcnow())
+    market.journal.close()
+    with open(journal_path, 'a') as journal:
+        journal.write('["Trade", 2, ')
+
+    market = Market()
+
+    assert stored_transactions() == [(1, 1)]
+    assert market.get_account(user.login).balance + bitcoin.purchase_price == 1000
+    assert market.buy(user.login, 'bitcoin', Decimal(1), datetime.utcnow()) == 2
+    market.stop()
+
+
+def test_failed_batch_is_written_with_next_one(mocker, market, user):
+    write_entries = mocker.patch(
+        'app.market.write_entries', side_effect=[RuntimeError, None]
+    )
+    market.buy(user.login, 'bitcoin', Decimal(1), datetime.utcnow())
+    with pytest.raises(RuntimeError):
+        market.flush()
+    market.buy(user.login, 'bitcoin', Decimal(1), datetime.utcnow())
+
+    market.flush()
+
+    assert [entry.transaction_id for entry in write_entries.call_args.args[1]] == [1, 2]
+    assert read_entries(market.journal.batch_path) == []
+
+
+def test_journal_entries_are_read_back(tmp_path):
+    entries: List[Entry] = [
+        Trade(1, 2, 3, 4, Decimal('0.5'), Decimal('938.27'), Decimal('1.5')),
+        PriceChange(4, Decimal('1.2'), Decimal('1.3'), datetime(2021, 3, 1, 12)),
+    ]
+    journal = Journal(str(tmp_path / 'market.journal'), fsync=True)
+    for entry in entries:
+        journal.append(entry)
+    journal.close()
+
+    assert Journal(journal.path).take_batch() == entries
+
+
+@pytest.mark.parametrize('torn_file', ['market.journal', 'market.journal.batch'])
+def test_entries_appended_after_torn_line_are_kept(tmp_path, torn_file):
+    entries: List[Entry] = [
+        Trade(5, 1, 1, 1, Decimal(1), Decimal(900), Decimal(1)),
+        Trade(6, 1, 1, 1, Decimal(1), Decimal(800), Decimal(2)),
+        Trade(7, 1, 1, 1, Decimal(1), Decimal(700), Decimal(3)),
+    ]
+    (tmp_path / torn_file).write_text(dump_entry(entries[0]) + '\n["Trade", 6, 1, ')
+    journal = Journal(str(tmp_path / 'market.journal'))
+    journal.append(entries[1])
+    journal.take_batch()
+    journal.append(entries[2])
+    journal.close()
+
+    assert Journal(journal.path).take_batch() == entries
+
+
+def test_invalid_entry_inside_journal(tmp_path):
+    path = tmp_path / 'market.journal'
+    path.write_text('["Trade", 5, 1, \n["PriceChange", 1, "1", "1", "2021-03-01"]\n')
+
+    with pytest.raises(ValueError, match='Invalid entry at line 1'):
+        Journal(str(path))
+
+
+def test_app_runs_market_engine(journal_path, mocker, user, bitcoin):
+    mocker.patch('app.WORKER_UPDATE_DELAY', 0)
+    mocker.patch('app.market.JOURNAL_FLUSH_DELAY', 0.01)
+    app = create_app(should_init_db=False, use_market_engine=True)
+    app.market.buy(user.login, 'bitcoin', Decimal(1), datetime.utcnow())
+
+    for _ in range(100):
+        if stored_transactions():
+            break
+        time.sleep(0.01)
+    app.market.stop()
+
+    assert stored_transactions() == [(1, 1)]
+    assert app.market.get_quote('bitcoin').last_update > bitcoin.last_update
+    assert read_entries(journal_path) == []